@@ -0,0 +1,211 @@
+import gzip
+import json
+import os
+import hashlib
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import delete, func, select
+
+from ..database.models import AuditLog
+from ..locks import file_lock
+
+DEFAULT_HOT_DAYS = 30
+SEAL_CHUNK_ROWS = 10_000
+MANIFEST_NAME = "manifest.jsonl"
+GENESIS = "0" * 64
+
+audit_table = AuditLog.__table__
+
+
+class AuditChainError(ValueError):
+    """A sealed audit segment or the manifest does not match the hash chain."""
+
+
+def _chain(prev: str, entry: Dict[str, Any]) -> str:
+    return hashlib.sha256((prev + json.dumps(entry, sort_keys=True, separators=(",", ":"))).encode()).hexdigest()
+
+
+def _record_line(row) -> bytes:
+    record = dict(row._mapping)
+    if record["timestamp"] is not None:
+        record["timestamp"] = record["timestamp"].isoformat()
+    return json.dumps(record, sort_keys=True, separators=(",", ":")).encode() + b"\n"
+
+
+class _HashingWriter:
+    """File wrapper hashing everything written through it."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data) -> int:
+        self.sha256.update(data)
+        return self.raw.write(data)
+
+    def flush(self):
+        self.raw.flush()
+
+
+class AuditArchive:
+    """
+    Day partitions of the audit log. Records stay in the audit_records table while they
+    are less than `hot_days` old; seal() then moves each older UTC day into a gzip JSONL
+    segment file (ordered by id) and deletes it from the table, so the table only ever
+    holds the recent window and its indexes stay small however long the ledger gets.
+
+    Every seal, and every segment dropped after `retention_days`, is an entry in an
+    append-only manifest where each entry carries the SHA-256 of its segment and of the
+    previous entry. verify() replays that chain: a modified, removed or reordered segment
+    or manifest line is detected. Expired segments keep their manifest entries, so the
+    chain stays verifiable after their data is gone.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        hot_days: int = DEFAULT_HOT_DAYS,
+        retention_days: Optional[int] = None,
+        chunk_rows: int = SEAL_CHUNK_ROWS,
+    ):
+        if retention_days is not None and retention_days < hot_days:
+            raise ValueError("retention_days must be at least hot_days")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.directory / MANIFEST_NAME
+        self.hot_days = hot_days
+        self.retention_days = retention_days
+        self.chunk_rows = chunk_rows
+
+    def entries(self) -> List[Dict[str, Any]]:
+        if not self.manifest_path.exists():
+            return []
+        with open(self.manifest_path, "rb") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def segments(self, entries: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """Manifest entries of the segments still on disk, oldest first."""
+        entries = self.entries() if entries is None else entries
+        expired = {e["segment"] for e in entries if e["type"] == "expire"}
+        return [e for e in entries if e["type"] == "seal" and e["segment"] not in expired]
+
+    def _append(self, entries: List[Dict[str, Any]], entry: Dict[str, Any]) -> Dict[str, Any]:
+        entry["prev"] = entries[-1]["chain"] if entries else GENESIS
+        entry["chain"] = _chain(entry["prev"], entry)
+        with open(self.manifest_path, "ab") as f:
+            f.write(json.dumps(entry, sort_keys=True).encode() + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+        entries.append(entry)
+        return entry
+
+    async def seal(self, session_factory, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Seals every day older than hot_days and drops expired segments; returns the new manifest entries."""
+        now = now or datetime.utcnow()
+        cutoff = datetime.combine(now.date() - timedelta(days=self.hot_days), time())
+        added = []
+        with file_lock(self.directory / (MANIFEST_NAME + ".lock")):
+            entries = self.entries()
+            while True:
+                async with session_factory() as session:
+                    oldest = (await session.execute(
+                        select(func.min(audit_table.c.timestamp)).where(audit_table.c.timestamp < cutoff)
+                    )).scalar()
+                if oldest is None:
+                    break
+                entry = await self._seal_day(session_factory, entries, oldest.date())
+                if entry is not None:
+                    added.append(entry)
+            added.extend(self._expire(entries, now))
+        return added
+
+    async def _seal_day(self, session_factory, entries: List[Dict[str, Any]], day: date) -> Optional[Dict[str, Any]]:
+        start = datetime.combine(day, time())
+        in_day = (audit_table.c.timestamp >= start, audit_table.c.timestamp < start + timedelta(days=1))
+        earlier = [e for e in entries if e["type"] == "seal" and e["day"] == day.isoformat()]
+        sealed_up_to = max((e["last_id"] for e in earlier), default=0)
+
+        async with session_factory() as session:
+            if sealed_up_to:
+                # A previous run sealed these rows but did not get to delete them
+                await session.execute(delete(audit_table).where(*in_day, audit_table.c.id <= sealed_up_to))
+                await session.commit()
+
+            name = f"audit-{day.isoformat()}-{len(earlier)}.jsonl.gz"
+            partial = self.directory / (name + ".partial")
+            rows = 0
+            first_id = last_id = None
+            stmt = select(audit_table).where(*in_day, audit_table.c.id > sealed_up_to).order_by(audit_table.c.id)
+            with open(partial, "wb") as raw:
+                hashing = _HashingWriter(raw)
+                with gzip.GzipFile(fileobj=hashing, mode="wb", mtime=0) as gz:
+                    result = await session.stream(stmt.execution_options(yield_per=self.chunk_rows))
+                    async for chunk in result.partitions():
+                        gz.write(b"".join(_record_line(row) for row in chunk))
+                        first_id = chunk[0].id if first_id is None else first_id
+                        last_id = chunk[-1].id
+                        rows += len(chunk)
+                raw.flush()
+                os.fsync(raw.fileno())
+            if rows == 0:
+                partial.unlink()
+                return None
+            os.replace(partial, self.directory / name)
+
+            entry = self._append(entries, {
+                "type": "seal", "segment": name, "day": day.isoformat(), "rows": rows,
+                "first_id": first_id, "last_id": last_id, "sha256": hashing.sha256.hexdigest(),
+            })
+            await session.execute(delete(audit_table).where(*in_day, audit_table.c.id <= last_id))
+            await session.commit()
+        print(f"Sealed {rows} audit records of {day.isoformat()} into {name}")
+        return entry
+
+    def _expire(self, entries: List[Dict[str, Any]], now: datetime) -> List[Dict[str, Any]]:
+        if self.retention_days is None:
+            return []
+        oldest_kept = (now.date() - timedelta(days=self.retention_days)).isoformat()
+        added = []
+        for segment in self.segments(entries):
+            if segment["day"] < oldest_kept:
+                path = self.directory / segment["segment"]
+                if path.exists():
+                    path.unlink()
+                added.append(self._append(entries, {"type": "expire", "segment": segment["segment"], "day": segment["day"]}))
+        return added
+
+    def verify(self) -> int:
+        """Checks the manifest chain and every segment on disk; returns the number of entries."""
+        entries = self.entries()
+        prev = GENESIS
+        for i, entry in enumerate(entries):
+            body = {k: v for k, v in entry.items() if k != "chain"}
+            if entry.get("prev") != prev or _chain(prev, body) != entry.get("chain"):
+                raise AuditChainError(f"Manifest entry {i} ({entry.get('segment')}) breaks the hash chain")
+            prev = entry["chain"]
+        for segment in self.segments(entries):
+            path = self.directory / segment["segment"]
+            if not path.exists():
+                raise AuditChainError(f"Sealed segment {segment['segment']} is missing")
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+            if digest.hexdigest() != segment["sha256"]:
+                raise AuditChainError(f"Sealed segment {segment['segment']} does not match its hash")
+        return len(entries)
+
+    def read(self, start: Optional[date] = None, end: Optional[date] = None) -> Iterator[Dict[str, Any]]:
+        """Sealed records of the days in [start, end), streamed from the segments."""
+        for segment in self.segments():
+            day = date.fromisoformat(segment["day"])
+            if (start is not None and day < start) or (end is not None and day >= end):
+                continue
+            with gzip.open(self.directory / segment["segment"], "rb") as f:
+                for line in f:
+                    record = json.loads(line)
+                    if record["timestamp"] is not None:
+                        record["timestamp"] = datetime.fromisoformat(record["timestamp"])
+                    yield record
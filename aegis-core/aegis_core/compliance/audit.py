@@ -0,0 +1,191 @@
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database.models import AuditLog, AuditRollup, increment_rollups
+
+# Durability modes of AuditSink
+SYNC = "sync"            # one transaction per record, committed before submit() returns
+GROUP_COMMIT = "group"   # records share a batch transaction; submit() returns once it committed
+ASYNC = "async"          # submit() returns once queued; a crash can lose the unflushed tail
+
+DEFAULT_MAX_BATCH = 1000
+DEFAULT_FLUSH_INTERVAL = 0.01
+DEFAULT_MAX_QUEUE = 10_000
+
+rollup_table = AuditRollup.__table__
+
+
+async def write_records(session: AsyncSession, records: List[Dict[str, Any]]):
+    """Inserts audit_records rows and counts them into audit_rollups; the caller commits."""
+    # Core insert on the table: the ORM bulk path would split the batch into one
+    # statement per run of rows with the same non-null keys (policy_id is often None)
+    await session.execute(insert(AuditLog.__table__), records)
+    connection = await session.connection(bind_arguments={"clause": insert(rollup_table)})
+    await connection.run_sync(increment_rollups, records)
+
+
+class AuditSink:
+    """
+    Buffered writer for AuditLog records. Records go through a bounded queue (submitters
+    wait when it is full) to one writer task that inserts them in multi-row batches:
+    a batch is written when `max_batch` records are waiting or `flush_interval` seconds
+    after its first record, whichever comes first, in a single executemany + commit.
+
+    In GROUP_COMMIT mode a submitter is released only after the transaction holding its
+    record committed, so an access decision is never returned before it is in the
+    ledger, while concurrent decisions share one commit (and one fsync). A failed batch
+    raises in every submitter of that batch. ASYNC mode trades that guarantee for not
+    waiting at all; close() (or flush()) must be awaited on shutdown to persist the tail.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        mode: str = GROUP_COMMIT,
+        max_batch: int = DEFAULT_MAX_BATCH,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+    ):
+        if mode not in (SYNC, GROUP_COMMIT, ASYNC):
+            raise ValueError(f"Unknown audit durability mode: {mode!r}")
+        self.session_factory = session_factory
+        self.mode = mode
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.written = 0
+        self.failed = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._closed = False
+
+    async def __aenter__(self) -> "AuditSink":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    @staticmethod
+    def record(
+        actor_id: str,
+        action_type: str,
+        target_resource: str,
+        verdict: str,
+        policy_id: Optional[int] = None,
+        compliance_check_details: str = "{}",
+        timestamp: Optional[datetime] = None,
+    ) -> Dict[str, Any]:
+        """An audit_records row; the timestamp is taken now, not when the batch is written."""
+        return {
+            "actor_id": actor_id,
+            "action_type": action_type,
+            "target_resource": target_resource,
+            "verdict": verdict,
+            "policy_id": policy_id,
+            "timestamp": timestamp or datetime.utcnow(),
+            "details": "{}",
+            "compliance_check_details": compliance_check_details,
+        }
+
+    async def submit(self, record: Dict[str, Any]):
+        await self.submit_many([record])
+
+    async def submit_many(self, records: List[Dict[str, Any]]):
+        """Queues records (kept together in one batch where they fit) per the durability mode."""
+        if self._closed:
+            raise RuntimeError("AuditSink is closed")
+        if not records:
+            return
+        if self.mode == SYNC:
+            await self._write(records)
+            return
+
+        self._ensure_writer()
+        done = asyncio.get_running_loop().create_future() if self.mode == GROUP_COMMIT else None
+        # Blocks while the queue is full: back-pressure instead of unbounded memory
+        await self._queue.put((records, done))
+        if done is not None:
+            await done
+
+    async def flush(self):
+        """Returns once everything submitted so far has been written."""
+        if self._writer is None:
+            return
+        done = asyncio.get_running_loop().create_future()
+        await self._queue.put(([], done))
+        await done
+
+    async def close(self):
+        """Writes the remaining records and stops the writer task."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._writer is not None:
+            await self._queue.put(None)
+            await self._writer
+            self._writer = None
+
+    def _ensure_writer(self):
+        if self._writer is None:
+            self._queue = asyncio.Queue(self.max_queue)
+            self._writer = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            pending: List[Tuple[List[Dict[str, Any]], Optional[asyncio.Future]]] = [item]
+            size = len(item[0])
+            deadline = loop.time() + self.flush_interval
+            while size and size < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                pending.append(item)
+                if not item[0]:
+                    break  # flush(): write what is pending now
+                size += len(item[0])
+            await self._write_batch(pending)
+
+    async def _write_batch(self, pending: List[Tuple[List[Dict[str, Any]], Optional[asyncio.Future]]]):
+        records = [record for batch, _ in pending for record in batch]
+        error: Optional[BaseException] = None
+        try:
+            await self._write(records)
+        except Exception as e:
+            error = e
+            self.failed += len(records)
+            if self.mode == ASYNC:
+                # Nobody is waiting to receive the error
+                print(f"Failed to write {len(records)} audit records: {e}")
+        for _, done in pending:
+            if done is not None and not done.done():
+                if error is None:
+                    done.set_result(None)
+                else:
+                    done.set_exception(error)
+
+    async def _write(self, records: List[Dict[str, Any]]):
+        if not records:
+            return
+        async with self.session_factory() as session:
+            await write_records(session, records)
+            await session.commit()
+        self.written += len(records)
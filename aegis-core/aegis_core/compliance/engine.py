@@ -1,109 +1,146 @@
 import json
+import sys
+import time
 from datetime import datetime
-from typing import Optional, List, Dict, Any
-from sqlalchemy import select
+from typing import TYPE_CHECKING, Optional, List, Dict, Any, Iterable, Tuple, Union
 from sqlalchemy.ext.asyncio import AsyncSession
-from ..database.models import ConsentPolicy, AuditLog
+from ..database.models import ConsentPolicy
+from .audit import AuditSink, write_records
+from .filters import compile_minimization
+from .policy_index import EntityPolicies, PolicyIndex, policy_index
+
+if TYPE_CHECKING:
+    from ..ingestion.columnar import ColumnBatch
+
+
+def _is_column_batch(data: Any) -> bool:
+    # A ColumnBatch can only exist once its module (and numpy) is loaded: don't import it here
+    columnar = sys.modules.get("aegis_core.ingestion.columnar")
+    return columnar is not None and isinstance(data, columnar.ColumnBatch)
 
 class ComplianceEngine:
-    def __init__(self, db_session: AsyncSession):
+    def __init__(self, db_session: AsyncSession, policies: Optional[PolicyIndex] = None, audit: Optional[AuditSink] = None):
         self.db = db_session
+        # Compiled, cached policies (shared process-wide by default)
+        self.policies = policies if policies is not None else policy_index
+        # Batched audit writer; without one, every record is committed on db_session
+        self.audit = audit
 
     async def check_consent(self, entity_id: str, action: str, tags: List[str]) -> bool:
         """
         Checks if a valid, non-expired, non-revoked policy exists for the requested action on the given tags.
         """
-        # 1. Fetch active policies for this entity
-        stmt = select(ConsentPolicy).where(
-            ConsentPolicy.entity_id == entity_id,
-            ConsentPolicy.revoked == False
-        )
-        result = await self.db.execute(stmt)
-        policies = result.scalars().all()
-
-        # 2. Filter match
-        allowed = False
-        justifying_policy_id = None
-        compliance_details = {}
+        # 1. Compiled active policies for this entity (queried only on a cache miss)
+        entry = await self.policies.get(self.db, entity_id)
+
+        # 2. Filter match: expiry, action bit, tags subset
+        allowed, record = self._decide(entry, entity_id, action, tags)
 
-        for policy in policies:
-            # Check expiration
-            if policy.expiry and policy.expiry < datetime.utcnow():
-                continue
-            
-            # Check Action
-            if action not in policy.allowed_actions.split(","):
-                continue
-
-            # Check Tags (Simple intersection logic)
-            policy_tags = set(policy.target_tags.split(","))
-            requested_tags = set(tags)
-            
-            if requested_tags.issubset(policy_tags):
-                allowed = True
-                justifying_policy_id = policy.id
-
-                # Capture regulation info if present
-                if policy.regulation_mapping:
-                    try:
-                        compliance_details["regulations"] = json.loads(policy.regulation_mapping)
-                    except:
-                        pass
-                break
-        
         # 3. Audit Log
-        await self.log_access(
-            actor_id=entity_id,
-            action_type=action,
-            target_resource=f"tags:{','.join(tags)}",
-            verdict="ALLOWED" if allowed else "DENIED",
-            policy_id=justifying_policy_id,
-            compliance_details=compliance_details
-        )
+        await self.log_access(**record)
 
         return allowed
 
-    def enforce_minimization(self, data: List[Dict[str, Any]], policy: ConsentPolicy) -> List[Dict[str, Any]]:
+    async def check_consent_many(self, requests: Iterable[Tuple[str, str, List[str]]]) -> List[bool]:
         """
-        Applies data minimization rules from the policy to the dataset.
+        check_consent for many (entity_id, action, tags) requests at once: the policies of
+        all entities come from one query (cache misses only), decisions are made in memory
+        and all audit records are written in one batch. Verdicts are in request order.
+        """
+        requests = list(requests)
+        entries = await self.policies.get_many(self.db, (entity_id for entity_id, _, _ in requests))
+        now = time.time()
+
+        verdicts = []
+        records = []
+        for entity_id, action, tags in requests:
+            allowed, record = self._decide(entries[entity_id], entity_id, action, tags, now)
+            verdicts.append(allowed)
+            records.append(record)
+
+        await self.log_access_many(records)
+        return verdicts
+
+    @staticmethod
+    def _decide(entry: EntityPolicies, entity_id: str, action: str, tags: List[str], now: Optional[float] = None) -> Tuple[bool, Dict[str, Any]]:
+        """The verdict and the log_access arguments recording it."""
+        policy = entry.match(action, tags, now)
+        allowed = policy is not None
+        compliance_details = {}
+
+        # Capture regulation info if present
+        if allowed and policy.regulations is not None:
+            compliance_details["regulations"] = policy.regulations
+
+        return allowed, {
+            "actor_id": entity_id,
+            "action_type": action,
+            "target_resource": f"tags:{','.join(tags)}",
+            "verdict": "ALLOWED" if allowed else "DENIED",
+            "policy_id": policy.id if allowed else None,
+            "compliance_details": compliance_details,
+        }
+
+    def enforce_minimization(self, data: Union[List[Dict[str, Any]], Iterable[Dict[str, Any]], "ColumnBatch"], policy: ConsentPolicy):
+        """
+        Applies data minimization rules (allowed_columns projection, row_filter predicate)
+        from the policy to the dataset. A list gives a list, a ColumnBatch is projected and
+        masked column-wise, and any other iterable of rows is minimized lazily as it streams.
         """
         if not policy or not policy.data_minimization_rules:
             return data
 
         try:
-            rules = json.loads(policy.data_minimization_rules)
-            allowed_cols = rules.get("allowed_columns")
-
-            if not allowed_cols:
-                return data
-
-            minimized_data = []
-            for row in data:
-                filtered_row = {k: v for k, v in row.items() if k in allowed_cols}
-                minimized_data.append(filtered_row)
-
-            return minimized_data
-        except json.JSONDecodeError:
-            # Log error or fail safe? Fail safe -> return original (or empty? Security vs Usability)
-            # Privacy engineer choice: Fail safe -> return empty or raise error.
-            # Here I'll return empty list to prevent leak.
+            minimization = compile_minimization(policy.data_minimization_rules)
+        except ValueError:
+            # Malformed rules: fail closed and release nothing rather than everything
+            if _is_column_batch(data):
+                import numpy as np
+                return data.select([]).filter(np.zeros(data.num_rows, dtype=bool))
             return []
 
+        if minimization.is_noop:
+            return data
+        if _is_column_batch(data):
+            return minimization.apply_batch(data)
+        if isinstance(data, list):
+            return list(minimization.apply_rows(data))
+        return minimization.apply_rows(data)
+
     async def log_access(self, actor_id: str, action_type: str, target_resource: str, verdict: str, policy_id: Optional[int] = None, compliance_details: dict = None):
-        """Writes to the immutable audit log."""
-
-        details_json = "{}"
-        if compliance_details:
-             details_json = json.dumps(compliance_details)
-
-        log_entry = AuditLog(
-            actor_id=actor_id,
-            action_type=action_type,
-            target_resource=target_resource,
-            verdict=verdict,
-            policy_id=policy_id,
-            timestamp=datetime.utcnow(),
-            compliance_check_details=details_json
-        )
-        self.db.add(log_entry)
+        """Writes to the immutable audit log (through the AuditSink, if the engine has one)."""
+        await self.log_access_many([{
+            "actor_id": actor_id,
+            "action_type": action_type,
+            "target_resource": target_resource,
+            "verdict": verdict,
+            "policy_id": policy_id,
+            "compliance_details": compliance_details,
+        }])
+
+    async def log_access_many(self, entries: List[Dict[str, Any]]):
+        """Writes several log_access records in one batch / transaction."""
+        if not entries:
+            return
+        timestamp = datetime.utcnow()
+        records = []
+        for entry in entries:
+            details_json = "{}"
+            if entry.get("compliance_details"):
+                 details_json = json.dumps(entry["compliance_details"])
+            records.append(AuditSink.record(
+                actor_id=entry["actor_id"],
+                action_type=entry["action_type"],
+                target_resource=entry["target_resource"],
+                verdict=entry["verdict"],
+                policy_id=entry.get("policy_id"),
+                compliance_check_details=details_json,
+                timestamp=timestamp
+            ))
+
+        if self.audit is not None:
+            await self.audit.submit_many(records)
+            return
+
+        await write_records(self.db, records)
         await self.db.commit()
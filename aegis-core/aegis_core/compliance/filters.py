@@ -0,0 +1,284 @@
+import re
+import ast
+import json
+import operator
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+    from ..ingestion.columnar import ColumnBatch
+
+# Row filters in minimization rules are small boolean expressions over column values:
+#   "age > 18", "country == 'DE' and age >= 21", "status != 'deleted' or admin == true"
+# Comparisons are combined with `and` (binding tighter) and `or`; there are no
+# parentheses, so every filter is already in disjunctive normal form, which is also
+# what columnar readers (pyarrow) accept for predicate pushdown.
+# Compared with a number, boolean or null, an empty value (an empty CSV cell, which a
+# numeric column of a ColumnBatch holds as NaN) is missing, like null.
+
+_OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+
+_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+      | (?P<number>-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)
+      | (?P<op>==|!=|>=|<=|=|>|<)
+      | (?P<word>[A-Za-z_][A-Za-z0-9_.]*)
+    )""", re.VERBOSE)
+
+Comparison = Tuple[str, str, Any]
+
+
+def _tokenize(expression: str) -> List[Tuple[str, str]]:
+    tokens = []
+    pos = 0
+    expression = expression.rstrip()
+    while pos < len(expression):
+        match = _TOKEN.match(expression, pos)
+        if match is None:
+            raise ValueError(f"Invalid row filter near: {expression[pos:]!r}")
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        pos = match.end()
+    return tokens
+
+
+def _literal(kind: str, text: str) -> Any:
+    if kind == "string":
+        return ast.literal_eval(text)
+    if kind == "number":
+        return float(text) if any(c in text for c in ".eE") else int(text)
+    lowered = text.lower()
+    if lowered in ("true", "false"):
+        return lowered == "true"
+    if lowered in ("null", "none"):
+        return None
+    raise ValueError(f"Expected a literal in row filter, got {text!r}")
+
+
+def _coerce(value: Any, literal: Any) -> Any:
+    """Text values (CSV cells) are compared as numbers / booleans when the literal is one."""
+    if isinstance(value, str) and not isinstance(literal, str) and literal is not None:
+        if isinstance(literal, bool):
+            return value.strip().lower() == "true"
+        try:
+            return float(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _compare(value: Any, op: str, literal: Any) -> bool:
+    """One comparison with the row semantics: a missing / null value only equals null."""
+    if value == "" and not isinstance(literal, str):
+        value = None
+    if value is None and literal is not None:
+        return False
+    try:
+        return bool(_OPERATORS[op](_coerce(value, literal), literal))
+    except TypeError:
+        return False
+
+
+def _compare_array(batch: "ColumnBatch", column: str, op: str, literal: Any) -> "np.ndarray":
+    """Vectorized _compare over one column of a ColumnBatch."""
+    import numpy as np
+
+    codes = batch.columns[column]
+    dictionary = batch.dictionaries.get(column)
+    if dictionary is not None:
+        # Compare each distinct value once, then look the results up by code
+        hits = np.fromiter((_compare(v, op, literal) for v in dictionary.tolist()), dtype=bool, count=len(dictionary))
+        return hits[codes]
+    nulls = np.isnan(codes) if codes.dtype.kind == "f" else np.zeros(len(codes), dtype=bool)
+    if literal is None:
+        if op == "==":
+            return nulls
+        return ~nulls if op == "!=" else np.zeros(len(codes), dtype=bool)
+    if isinstance(literal, str):
+        # A number never equals text; ordering against text is a TypeError (False)
+        return ~nulls if op == "!=" else np.zeros(len(codes), dtype=bool)
+    return _OPERATORS[op](codes, literal) & ~nulls
+
+
+class RowFilter:
+    """A parsed row filter: `clauses` is a list (OR) of lists (AND) of (column, op, literal)."""
+
+    def __init__(self, clauses: Sequence[Sequence[Comparison]], expression: str = ""):
+        self.clauses = [list(clause) for clause in clauses]
+        self.expression = expression
+
+    @classmethod
+    def parse(cls, expression: str) -> "RowFilter":
+        tokens = _tokenize(expression)
+        clauses: List[List[Comparison]] = [[]]
+        i = 0
+        while True:
+            if i + 3 > len(tokens) or tokens[i][0] != "word" or tokens[i + 1][0] != "op":
+                raise ValueError(f"Invalid row filter: {expression!r}")
+            column, op = tokens[i][1], tokens[i + 1][1]
+            clauses[-1].append((column, "==" if op == "=" else op, _literal(*tokens[i + 2])))
+            i += 3
+            if i == len(tokens):
+                break
+            joiner = tokens[i][1].lower() if tokens[i][0] == "word" else None
+            if joiner == "and":
+                pass
+            elif joiner == "or":
+                clauses.append([])
+            else:
+                raise ValueError(f"Expected 'and' / 'or' in row filter: {expression!r}")
+            i += 1
+        return cls(clauses, expression)
+
+    @property
+    def columns(self) -> FrozenSet[str]:
+        return frozenset(column for clause in self.clauses for column, _, _ in clause)
+
+    def matches(self, row: Dict[str, Any]) -> bool:
+        """Evaluates the filter on a row dict; a comparison on a missing or null value is False."""
+        for clause in self.clauses:
+            for column, op, literal in clause:
+                if not _compare(row.get(column), op, literal):
+                    break
+            else:
+                return True
+        return False
+
+    def mask(self, batch: "ColumnBatch") -> "np.ndarray":
+        """Boolean mask of the rows of a ColumnBatch that match, computed column-wise."""
+        # numpy is imported on first use, so the row readers load without it
+        import numpy as np
+
+        result = np.zeros(batch.num_rows, dtype=bool)
+        for clause in self.clauses:
+            if any(column not in batch.columns for column, _, _ in clause):
+                continue
+            conjunction = np.ones(batch.num_rows, dtype=bool)
+            for column, op, literal in clause:
+                conjunction &= _compare_array(batch, column, op, literal)
+            result |= conjunction
+        return result
+
+    def pushable(self, schema) -> bool:
+        """
+        Whether to_arrow() gives the same rows as matches() on data with this pyarrow
+        schema. Arrow compute does not coerce like matches() (e.g. a string column against
+        a number, which matches() compares as a number), so such filters are not pushed
+        down; readers evaluate them on the scanned rows instead.
+        """
+        import pyarrow as pa
+
+        for clause in self.clauses:
+            for column, _, literal in clause:
+                if column not in schema.names:
+                    continue
+                field_type = schema.field(column).type
+                if pa.types.is_string(field_type) or pa.types.is_large_string(field_type):
+                    # A null literal also matches empty strings, which is_null() does not
+                    ok = isinstance(literal, str)
+                elif literal is None:
+                    ok = True
+                elif pa.types.is_boolean(field_type):
+                    ok = isinstance(literal, bool)
+                elif pa.types.is_integer(field_type) or pa.types.is_floating(field_type):
+                    ok = isinstance(literal, (int, float)) and not isinstance(literal, bool)
+                else:
+                    ok = False
+                if not ok:
+                    return False
+        return True
+
+    def to_arrow(self, available: Optional[Sequence[str]] = None):
+        """
+        The filter as a pyarrow.compute expression, for predicate pushdown into Parquet
+        scans (see pushable()). A clause on a column missing from `available` can never
+        match, as in matches().
+        """
+        import pyarrow.compute as pc
+
+        expression = None
+        for clause in self.clauses:
+            if available is not None and any(column not in available for column, _, _ in clause):
+                continue
+            conjunction = None
+            for column, op, literal in clause:
+                if literal is None:
+                    # Only null equals null; ordering against null never matches
+                    field = pc.field(column)
+                    comparison = field.is_null() if op == "==" else field.is_valid() if op == "!=" else pc.scalar(False)
+                else:
+                    comparison = _OPERATORS[op](pc.field(column), literal)
+                conjunction = comparison if conjunction is None else conjunction & comparison
+            expression = conjunction if expression is None else expression | conjunction
+        return expression if expression is not None else pc.scalar(False)
+
+    def __repr__(self) -> str:
+        return f"RowFilter({self.expression!r})"
+
+
+class Minimization:
+    """
+    A policy's data_minimization_rules compiled once: `columns` is the projection
+    (None keeps every column) and `row_filter` the row predicate (None keeps every row).
+    The row filter is evaluated before the projection, so it may use dropped columns.
+    """
+
+    def __init__(self, columns: Optional[Sequence[str]] = None, row_filter: Optional[RowFilter] = None):
+        self.columns: Optional[Tuple[str, ...]] = tuple(dict.fromkeys(columns)) if columns else None
+        self.row_filter = row_filter
+
+    @property
+    def is_noop(self) -> bool:
+        return self.columns is None and self.row_filter is None
+
+    def apply_rows(self, rows: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Streaming transform over row dicts."""
+        columns, row_filter = self.columns, self.row_filter
+        if row_filter is not None:
+            rows = filter(row_filter.matches, rows)
+        if columns is None:
+            return iter(rows)
+        return ({k: row[k] for k in columns if k in row} for row in rows)
+
+    def apply_batch(self, batch: "ColumnBatch") -> "ColumnBatch":
+        """Column projection and row mask on a ColumnBatch; no per-row Python work."""
+        if self.row_filter is not None:
+            batch = batch.filter(self.row_filter.mask(batch))
+        if self.columns is not None:
+            batch = batch.select(self.columns)
+        return batch
+
+
+@lru_cache(maxsize=1024)
+def compile_minimization(rules_json: Optional[str]) -> Minimization:
+    """
+    Compiled minimization for a data_minimization_rules string, cached by its text so
+    each policy's rules are parsed once. Malformed rules raise ValueError.
+    """
+    if not rules_json:
+        return Minimization()
+    rules = json.loads(rules_json)
+    if not isinstance(rules, dict):
+        raise ValueError("data_minimization_rules must be a JSON object")
+    allowed = rules.get("allowed_columns") or None
+    row_filter = rules.get("row_filter")
+    return Minimization(allowed, RowFilter.parse(row_filter) if row_filter else None)
+
+
+def minimization_pushdown(rules_json: Optional[str]) -> Tuple[Optional[List[str]], Optional[RowFilter]]:
+    """
+    (allowed_columns, row_filter) from a policy's data_minimization_rules, for readers that
+    can apply them while decoding. Malformed rules raise ValueError: a reader must not
+    fall back to returning everything.
+    """
+    minimization = compile_minimization(rules_json)
+    return (list(minimization.columns) if minimization.columns else None), minimization.row_filter
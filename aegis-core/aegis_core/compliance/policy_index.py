@@ -0,0 +1,253 @@
+import json
+import time
+import asyncio
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Sequence, Set
+
+from sqlalchemy import event, inspect, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from ..database.models import ConsentPolicy, ConsentPolicyAction, ConsentPolicyTag
+
+DEFAULT_POLICY_CACHE_TTL = 30.0
+# Entities per IN (...) query, well below SQLite's bound parameter limit
+LOAD_CHUNK_SIZE = 500
+
+
+class ActionBits:
+    """Assigns each action name a bit, so a policy's allowed actions are one int bitmask."""
+
+    def __init__(self):
+        self._bits: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def bit(self, action: str) -> int:
+        bit = self._bits.get(action)
+        if bit is None:
+            with self._lock:
+                bit = self._bits.setdefault(action, 1 << len(self._bits))
+        return bit
+
+    def mask(self, actions: Iterable[str]) -> int:
+        mask = 0
+        for action in actions:
+            mask |= self.bit(action)
+        return mask
+
+
+action_bits = ActionBits()
+
+
+def _timestamp(value: Optional[datetime]) -> Optional[float]:
+    """Epoch seconds of a naive-UTC (or aware) datetime column."""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class CompiledPolicy:
+    """
+    A ConsentPolicy row compiled once: its actions as a bitmask, its tags as a
+    frozenset, expiry as epoch seconds and regulation_mapping decoded.
+    """
+    __slots__ = ("id", "entity_id", "action_mask", "tags", "expiry", "regulations", "minimization_rules")
+
+    def __init__(self, policy: ConsentPolicy):
+        self.id = policy.id
+        self.entity_id = policy.entity_id
+        self.action_mask = action_bits.mask(a.action for a in policy.actions)
+        self.tags: FrozenSet[str] = frozenset(t.tag for t in policy.tags)
+        self.expiry = _timestamp(policy.expiry)
+        self.regulations: Optional[Dict[str, Any]] = None
+        if policy.regulation_mapping:
+            try:
+                self.regulations = json.loads(policy.regulation_mapping)
+            except ValueError:
+                pass
+        self.minimization_rules = policy.data_minimization_rules
+
+    def allows(self, action_bit: int, tags: FrozenSet[str], now: float) -> bool:
+        if self.expiry is not None and self.expiry < now:
+            return False
+        return bool(self.action_mask & action_bit) and tags <= self.tags
+
+
+class EntityPolicies:
+    """The active (non-revoked, non-expired) compiled policies of one entity, in id order."""
+    __slots__ = ("policies", "loaded_at", "next_expiry")
+
+    def __init__(self, policies: Sequence[CompiledPolicy], loaded_at: float):
+        self.policies = list(policies)
+        self.loaded_at = loaded_at
+        expiries = [p.expiry for p in self.policies if p.expiry is not None]
+        self.next_expiry = min(expiries) if expiries else None
+
+    def match(self, action: str, tags: Iterable[str], now: Optional[float] = None) -> Optional[CompiledPolicy]:
+        """First policy allowing action on all of tags, or None."""
+        now = time.time() if now is None else now
+        action_bit = action_bits.bit(action)
+        requested = tags if isinstance(tags, frozenset) else frozenset(tags)
+        for policy in self.policies:
+            if policy.allows(action_bit, requested, now):
+                return policy
+        return None
+
+
+class PolicyIndex:
+    """
+    Process-wide cache of compiled consent policies per entity. A consent check is then
+    a dict lookup plus a bitmask and set test instead of a SELECT and string parsing.
+
+    Entries are rebuilt after `ttl` seconds (picks up changes made by other processes)
+    and as soon as one of their policies expires. ConsentPolicy inserts, updates and
+    deletes committed through an ORM session in this process invalidate the entity right
+    away; changes made with bulk UPDATE statements or by other processes rely on the TTL
+    or an explicit invalidate(). A load that an invalidation overtook (its SELECT may
+    predate the change) is not cached, and later lookups do not join it.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_POLICY_CACHE_TTL):
+        self.ttl = ttl
+        self._entities: Dict[str, EntityPolicies] = {}
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        # Bumped by every invalidate(); entities map to the generation that last invalidated
+        # them, kept only while loads are running (a load compares against its start)
+        self._generation = 0
+        self._invalidated: Dict[str, int] = {}
+        self._cleared = 0
+        self._running_loads = 0
+
+    def cached(self, entity_id: str, now: Optional[float] = None) -> Optional[EntityPolicies]:
+        """The entity's entry if it is still fresh, without touching the database."""
+        entry = self._entities.get(entity_id)
+        if entry is None:
+            return None
+        now = time.time() if now is None else now
+        if now - entry.loaded_at >= self.ttl or (entry.next_expiry is not None and entry.next_expiry < now):
+            return None
+        return entry
+
+    async def get(self, db: AsyncSession, entity_id: str) -> EntityPolicies:
+        entry = self.cached(entity_id)
+        if entry is not None:
+            return entry
+        # Concurrent misses for one entity share a single load instead of stampeding
+        loading = self._loading.get(entity_id)
+        if loading is None or loading.get_loop() is not asyncio.get_running_loop():
+            loading = asyncio.ensure_future(self.load(db, [entity_id]))
+            self._loading[entity_id] = loading
+            loading.add_done_callback(lambda f: self._loading.get(entity_id) is f and self._loading.pop(entity_id))
+        return (await asyncio.shield(loading))[entity_id]
+
+    async def get_many(self, db: AsyncSession, entity_ids: Iterable[str]) -> Dict[str, EntityPolicies]:
+        """Entries for every entity in entity_ids; all cache misses are loaded together."""
+        now = time.time()
+        entries: Dict[str, EntityPolicies] = {}
+        missing: List[str] = []
+        for entity_id in dict.fromkeys(entity_ids):
+            entry = self.cached(entity_id, now)
+            if entry is None:
+                missing.append(entity_id)
+            else:
+                entries[entity_id] = entry
+        for start in range(0, len(missing), LOAD_CHUNK_SIZE):
+            entries.update(await self.load(db, missing[start:start + LOAD_CHUNK_SIZE]))
+        return entries
+
+    async def load(self, db: AsyncSession, entity_ids: Sequence[str]) -> Dict[str, EntityPolicies]:
+        """
+        Compiles the active policies of entity_ids from one query and caches them, except
+        for entities invalidated while the query ran.
+        """
+        with self._lock:
+            started = self._generation
+            self._running_loads += 1
+        entries: Dict[str, EntityPolicies] = {}
+        try:
+            entries = await self._compile(db, entity_ids)
+        finally:
+            with self._lock:
+                self._running_loads -= 1
+                if self._cleared <= started:
+                    for entity_id, entry in entries.items():
+                        if self._invalidated.get(entity_id, 0) <= started:
+                            self._entities[entity_id] = entry
+                if not self._running_loads:
+                    self._invalidated.clear()
+        return entries
+
+    @staticmethod
+    async def _compile(db: AsyncSession, entity_ids: Sequence[str]) -> Dict[str, EntityPolicies]:
+        now = time.time()
+        # Matches the (entity_id, revoked, expiry) index; actions and tags are selectin-loaded
+        stmt = select(ConsentPolicy).where(
+            ConsentPolicy.entity_id.in_(entity_ids),
+            ConsentPolicy.revoked == False,
+            or_(ConsentPolicy.expiry == None, ConsentPolicy.expiry >= datetime.utcfromtimestamp(now))
+        ).order_by(ConsentPolicy.id)
+        result = await db.execute(stmt)
+        compiled: Dict[str, List[CompiledPolicy]] = {entity_id: [] for entity_id in entity_ids}
+        for policy in result.scalars():
+            entry = CompiledPolicy(policy)
+            if entry.expiry is None or entry.expiry >= now:
+                compiled[policy.entity_id].append(entry)
+        return {entity_id: EntityPolicies(policies, now) for entity_id, policies in compiled.items()}
+
+    def invalidate(self, entity_id: Optional[str] = None):
+        """Drops the compiled policies of entity_id, or of every entity if None."""
+        with self._lock:
+            self._generation += 1
+            if entity_id is None:
+                self._entities.clear()
+                self._loading.clear()
+                self._cleared = self._generation
+            else:
+                self._entities.pop(entity_id, None)
+                self._loading.pop(entity_id, None)
+                if self._running_loads:
+                    self._invalidated[entity_id] = self._generation
+
+
+policy_index = PolicyIndex()
+
+
+# ORM hooks: remember which entities' policies a flush touched, invalidate on commit
+_CHANGED_KEY = "aegis_changed_policy_entities"
+_ALL_ENTITIES = object()
+
+
+def _invalidate(entity_ids):
+    if _ALL_ENTITIES in entity_ids:
+        policy_index.invalidate()
+        return
+    for entity_id in entity_ids:
+        policy_index.invalidate(entity_id)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_policy_changes(session: Session, flush_context):
+    changed: Set[str] = session.info.setdefault(_CHANGED_KEY, set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, ConsentPolicy):
+            changed.add(obj.entity_id)
+            # An entity_id change leaves the old entity stale too
+            changed.update(v for v in inspect(obj).attrs.entity_id.history.deleted if v is not None)
+        elif isinstance(obj, (ConsentPolicyAction, ConsentPolicyTag)):
+            # Rows edited on their own (not through their policy): the entity is not at hand
+            changed.add(_ALL_ENTITIES)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_policy_changes(session: Session):
+    _invalidate(session.info.pop(_CHANGED_KEY, ()))
+
+
+@event.listens_for(Session, "after_rollback")
+def _invalidate_rolled_back_changes(session: Session):
+    # A check inside the transaction may have cached the flushed, now discarded, state
+    _invalidate(session.info.pop(_CHANGED_KEY, ()))
@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import case, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database.models import AuditLog, AuditRollup, ConsentPolicy
+
+
+async def compliance_summary(db: AsyncSession, now: Optional[datetime] = None, recent_limit: int = 5) -> Dict[str, Any]:
+    """
+    Figures for the compliance dashboard, computed in the database: policy counts in one
+    aggregate query, all-time verdict totals from the audit_rollups counters (which also
+    cover sealed days), the last 24 hours as one index range count per verdict, and the
+    latest denials through the (verdict, timestamp) index.
+    """
+    now = now or datetime.utcnow()
+
+    total, active, gdpr = (await db.execute(select(
+        func.count(ConsentPolicy.id),
+        func.coalesce(func.sum(case((or_(ConsentPolicy.revoked == False, ConsentPolicy.revoked.is_(None)), 1), else_=0)), 0),
+        func.coalesce(func.sum(case((ConsentPolicy.regulation_mapping.like("%GDPR%"), 1), else_=0)), 0),
+    ))).one()
+
+    verdicts = {
+        verdict: int(count) for verdict, count in await db.execute(
+            select(AuditRollup.verdict, func.sum(AuditRollup.count)).group_by(AuditRollup.verdict)
+        )
+    }
+
+    since = now - timedelta(hours=24)
+    last_24h = {}
+    for verdict in verdicts:
+        last_24h[verdict] = (await db.execute(
+            select(func.count()).select_from(AuditLog).where(AuditLog.verdict == verdict, AuditLog.timestamp >= since)
+        )).scalar()
+
+    denials = (await db.execute(
+        select(AuditLog.timestamp, AuditLog.actor_id, AuditLog.action_type, AuditLog.target_resource)
+        .where(AuditLog.verdict == "DENIED")
+        .order_by(AuditLog.timestamp.desc())
+        .limit(recent_limit)
+    )).all()
+
+    return {
+        "policies": {"total": total, "active": int(active), "gdpr_mapped": int(gdpr)},
+        "verdicts": verdicts,
+        "attempts": sum(verdicts.values()),
+        "last_24h": last_24h,
+        # Oldest first, as in the audit trail
+        "recent_denials": [dict(row._mapping) for row in reversed(denials)],
+    }
@@ -2,6 +2,7 @@ import os
 import keyring
 from pathlib import Path
 from ..crypto.security import SERVICE_NAME, USERNAME
+from ..crypto.keys import key_provider
 
 class KeyShredder:
     """
@@ -34,4 +35,7 @@ class KeyShredder:
         except Exception as e:
             print(f"Keyring shredding warning: {e}")
 
+        # 3. Drop cached key material so no new security context can reuse it
+        key_provider.invalidate()
+
         print("Master Key Destroyed. Data is now cryptographically inaccessible.")
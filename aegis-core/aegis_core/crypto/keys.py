@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import base64
+import keyring
+import threading
+from pathlib import Path
+from typing import Optional
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from ..locks import file_lock
+
+SERVICE_NAME = "aegis_core"
+USERNAME = "aegis_master_key_v2"
+
+DEFAULT_KEY_CACHE_TTL = 300.0
+
+
+class KeySet:
+    """Immutable snapshot of the master key versions, with one shared AESGCM context per version."""
+
+    def __init__(self, keys: dict[int, bytes], active: int):
+        self.keys = dict(keys)
+        self.active = active
+        self.ciphers = {key_id: AESGCM(key) for key_id, key in self.keys.items()}
+        self.loaded_at = time.monotonic()
+
+
+def _parse_keyset(blob: bytes) -> tuple[dict[int, bytes], int]:
+    """Parses a stored key set; a bare key (pre-versioning format) becomes version 1."""
+    try:
+        doc = json.loads(blob)
+        keys = {int(k): base64.urlsafe_b64decode(v) for k, v in doc["keys"].items()}
+        return keys, int(doc["active"])
+    except (ValueError, KeyError, TypeError):
+        pass
+    try:
+        # Try reading as base64 (Jules' format)
+        key = base64.urlsafe_b64decode(blob)
+    except Exception:
+        # Fallback to raw bytes (Legacy format)
+        key = blob
+    return {1: key}, 1
+
+
+def load_keyset(key_path: Path, use_keyring: bool = True) -> Optional[tuple[dict[int, bytes], int]]:
+    """Reads the key set from the OS keyring, falling back to the key file. None if neither exists."""
+    # 1. Try Keyring first
+    if use_keyring:
+        try:
+            stored_key = keyring.get_password(SERVICE_NAME, USERNAME)
+            if stored_key:
+                return _parse_keyset(stored_key.encode("utf-8"))
+        except Exception:
+            pass
+
+    # 2. Try File (Fallback)
+    if key_path.exists():
+        return _parse_keyset(key_path.read_bytes())
+    return None
+
+
+def save_keyset(key_path: Path, keys: dict[int, bytes], active: int, use_keyring: bool = True):
+    keyset = json.dumps({
+        "active": active,
+        "keys": {str(k): base64.urlsafe_b64encode(v).decode("utf-8") for k, v in sorted(keys.items())},
+    })
+
+    # Save to Keyring
+    if use_keyring:
+        try:
+            keyring.set_password(SERVICE_NAME, USERNAME, keyset)
+        except Exception:
+            # In production logs, this should be a warning
+            pass
+
+    # Save to File (Backup); replaced atomically so a crash never loses key versions
+    tmp_path = key_path.with_name(key_path.name + ".tmp")
+    tmp_path.write_text(keyset)
+    try:
+        os.chmod(tmp_path, 0o600)
+    except Exception:
+        pass
+    os.replace(tmp_path, key_path)
+
+
+class KeyProvider:
+    """
+    Process-wide cache of master key sets, keyed by key file path and keyring use.
+    A hit costs a dict lookup instead of a keyring round trip and a file read, and every
+    AegisSecurity on the same key shares the cached AESGCM contexts. Entries expire after
+    `ttl` seconds so rotations made by other processes are picked up; invalidate() drops
+    them immediately (KeyShredder does this when it destroys the master key).
+    """
+
+    def __init__(self, ttl: float = DEFAULT_KEY_CACHE_TTL):
+        self.ttl = ttl
+        self._cache: dict[tuple[str, bool], KeySet] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _cache_key(key_path: Path, use_keyring: bool) -> tuple[str, bool]:
+        return os.path.abspath(key_path), use_keyring
+
+    def get(self, key_path: Path, use_keyring: bool = True) -> KeySet:
+        """Returns the key set for key_path, loading it (or generating a first key) on a miss."""
+        cache_key = self._cache_key(key_path, use_keyring)
+        keyset = self._cache.get(cache_key)
+        if keyset is not None and time.monotonic() - keyset.loaded_at < self.ttl:
+            return keyset
+
+        with self._lock:
+            keyset = self._cache.get(cache_key)
+            if keyset is not None and time.monotonic() - keyset.loaded_at < self.ttl:
+                return keyset
+
+            loaded = load_keyset(Path(key_path), use_keyring)
+            if loaded is None:
+                # Generate New (AES-256 = 32 bytes); under the lock so concurrent first
+                # constructions cannot each create (and overwrite) a different key
+                loaded = {1: AESGCM.generate_key(bit_length=256)}, 1
+                save_keyset(Path(key_path), *loaded, use_keyring=use_keyring)
+            keyset = KeySet(*loaded)
+            self._cache[cache_key] = keyset
+            return keyset
+
+    def store(self, key_path: Path, keys: dict[int, bytes], active: int, use_keyring: bool = True) -> KeySet:
+        """Persists a new key set (e.g. after rotation) and makes it the cached one."""
+        with self._lock:
+            save_keyset(Path(key_path), keys, active, use_keyring)
+            keyset = KeySet(keys, active)
+            self._cache[self._cache_key(key_path, use_keyring)] = keyset
+            return keyset
+
+    def rotate(self, key_path: Path, use_keyring: bool = True) -> KeySet:
+        """
+        Adds a new key version and makes it active. The key set is re-read from storage
+        under this provider's lock and an exclusive lock on `<key_path>.lock`, so the new
+        version is numbered after every version stored so far, also by other contexts
+        and processes holding an older snapshot, and no stored version is overwritten.
+        """
+        key_path = Path(key_path)
+        with self._lock, file_lock(key_path.with_name(key_path.name + ".lock")):
+            loaded = load_keyset(key_path, use_keyring)
+            keys = dict(loaded[0]) if loaded is not None else {}
+            key_id = max(keys, default=0) + 1
+            keys[key_id] = AESGCM.generate_key(bit_length=256)
+            save_keyset(key_path, keys, key_id, use_keyring)
+            keyset = KeySet(keys, key_id)
+            self._cache[self._cache_key(key_path, use_keyring)] = keyset
+            return keyset
+
+    def invalidate(self, key_path: Optional[Path] = None):
+        """Drops cached key material for key_path, or for every key if key_path is None."""
+        with self._lock:
+            if key_path is None:
+                self._cache.clear()
+                return
+            for use_keyring in (True, False):
+                self._cache.pop(self._cache_key(key_path, use_keyring), None)
+
+
+key_provider = KeyProvider()
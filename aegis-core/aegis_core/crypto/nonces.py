@@ -0,0 +1,110 @@
+import os
+import json
+import secrets
+import threading
+from pathlib import Path
+from typing import Optional
+from ..locks import FileLockedError, lock_file
+
+PREFIX_SIZE = 4
+COUNTER_SIZE = 8
+DEFAULT_RESERVE_BLOCK = 2 ** 16
+# NIST SP 800-38D caps a key at 2^32 GCM invocations; past that the key must be rotated.
+DEFAULT_NONCE_LIMIT = 2 ** 32
+
+
+def _fsync_dir(path: Path):
+    if os.name == "nt":
+        return  # directories cannot be opened for fsync; NTFS journals the rename itself
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class NonceExhaustedError(RuntimeError):
+    """The nonce sequence reached its limit for the current key; rotate the master key."""
+
+
+class NonceSequence:
+    """
+    Deterministic 96-bit GCM nonces: a random 4-byte prefix per context || 64-bit counter.
+    Replaces a getrandom syscall per message with a counter increment.
+
+    Counters are leased from `state_path` in blocks: the high-water mark of a block is
+    persisted (and fsynced) before any nonce from it is handed out, so after a crash or
+    restart the sequence resumes past every counter that could have been used. The state
+    file is locked for the lifetime of the sequence, so it must not be shared by two live
+    contexts. When the active master key version changes, a fresh prefix and counter are
+    started; once `limit` nonces were issued under one key, NonceExhaustedError forces a
+    rekey.
+    """
+
+    def __init__(
+        self,
+        state_path: Path,
+        block_size: int = DEFAULT_RESERVE_BLOCK,
+        limit: int = DEFAULT_NONCE_LIMIT,
+    ):
+        if block_size <= 0 or limit <= 0 or limit > 2 ** (8 * COUNTER_SIZE):
+            raise ValueError("Invalid nonce block_size or limit")
+        self.state_path = Path(state_path)
+        self.block_size = block_size
+        self.limit = limit
+        self._lock = threading.Lock()
+        try:
+            self._lock_file = lock_file(self.state_path.with_name(self.state_path.name + ".lock"), blocking=False)
+        except FileLockedError:
+            raise RuntimeError(f"Nonce state {self.state_path} is in use by another context") from None
+
+        self.key_id: Optional[int] = None
+        self.prefix = b""
+        self._counter = 0
+        self._reserved = 0
+        if self.state_path.exists():
+            state = json.loads(self.state_path.read_text())
+            self.key_id = state["key_id"]
+            self.prefix = bytes.fromhex(state["prefix"])
+            # Everything below the persisted mark may have been used before the restart
+            self._counter = self._reserved = state["reserved"]
+
+    @property
+    def issued(self) -> int:
+        """Counter value of the next nonce under the current key."""
+        return self._counter
+
+    def next(self, key_id: int) -> bytes:
+        with self._lock:
+            if key_id != self.key_id:
+                self._rekey(key_id)
+            counter = self._counter
+            if counter >= self.limit:
+                raise NonceExhaustedError(
+                    f"{counter} nonces issued under master key version {key_id}; rotate the master key"
+                )
+            if counter >= self._reserved:
+                self._reserve(min(counter + self.block_size, self.limit))
+            self._counter = counter + 1
+        return self.prefix + counter.to_bytes(COUNTER_SIZE, "big")
+
+    def _rekey(self, key_id: int):
+        self.key_id = key_id
+        self.prefix = secrets.token_bytes(PREFIX_SIZE)
+        self._counter = self._reserved = 0
+
+    def _reserve(self, reserved: int):
+        state = json.dumps({"key_id": self.key_id, "prefix": self.prefix.hex(), "reserved": reserved})
+        tmp_path = self.state_path.with_name(self.state_path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            f.write(state)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.state_path)
+        # The rename itself must be durable too: a lost rename would restart from the previous mark
+        _fsync_dir(self.state_path.parent)
+        self._reserved = reserved
+
+    def close(self):
+        if not self._lock_file.closed:
+            self._lock_file.close()
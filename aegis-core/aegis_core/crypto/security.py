@@ -1,132 +1,802 @@
+import io
 import os
-import keyring
-import base64
 import secrets
+import struct
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import BinaryIO, Iterable, Iterator, NamedTuple, Optional, Sequence, Union
+from cryptography.exceptions import InvalidTag
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from .keys import SERVICE_NAME, USERNAME, KeyProvider, KeySet, key_provider
+from .nonces import NonceSequence
+
+NONCE_SIZE = 12
+TAG_SIZE = 16
+
+# Chunked file format (v2):
+#   [HEADER (33 bytes)][KEY ENVELOPE (64 bytes)][CHUNK 0]...[CHUNK n-1]
+#   HEADER   = magic | version | flags | chunk_size | plaintext_size | chunk_count | nonce_prefix
+#   ENVELOPE = master key id (u32) | wrap nonce | AES-GCM(per-file data key) + TAG, AAD = HEADER
+#   CHUNK    = AES-GCM(chunk plaintext) + TAG under the data key, AAD = HEADER
+# Chunk i uses nonce = nonce_prefix (7) || i (u32 BE) || last-chunk flag (1), so
+# chunks cannot be reordered, dropped or truncated without failing authentication.
+# The envelope is outside the chunks' AAD, so master key rotation only rewrites it.
+# v1 files have no envelope; their chunks are sealed directly with a master key.
+STREAM_MAGIC = b"AEGS"
+STREAM_VERSION = 2
+DEFAULT_CHUNK_SIZE = 64 * 1024
+_STREAM_HEADER = struct.Struct(">4sBBIQQ7s")
+_KEY_ENVELOPE = struct.Struct(">I12s48s")
+STREAM_HEADER_SIZE = _STREAM_HEADER.size + _KEY_ENVELOPE.size
+_NONCE_PREFIX_SIZE = 7
+_MAX_CHUNKS = 2 ** 32
+
+
+class StreamHeader(NamedTuple):
+    """Parsed header of a chunked encrypted file."""
+    chunk_size: int
+    plaintext_size: int
+    chunk_count: int
+    nonce_prefix: bytes
+    raw: bytes
+    key_id: Optional[int] = None
+    wrap_nonce: bytes = b""
+    wrapped_key: bytes = b""
+
+    @property
+    def size(self) -> int:
+        return len(self.raw) + (_KEY_ENVELOPE.size if self.key_id is not None else 0)
+
+    def envelope(self) -> bytes:
+        return _KEY_ENVELOPE.pack(self.key_id, self.wrap_nonce, self.wrapped_key)
+
+    def to_bytes(self) -> bytes:
+        return self.raw + self.envelope()
+
+    def chunk_nonce(self, index: int) -> bytes:
+        last = b"\x01" if index == self.chunk_count - 1 else b"\x00"
+        return self.nonce_prefix + index.to_bytes(4, "big") + last
+
+    def expected_file_size(self) -> int:
+        return self.size + self.plaintext_size + self.chunk_count * TAG_SIZE
+
+
+def _chunk_count(plaintext_size: int, chunk_size: int) -> int:
+    # An empty file still gets one (empty) chunk so the header is authenticated.
+    return max(1, -(-plaintext_size // chunk_size))
+
+
+def _new_stream_header(plaintext_size: int, chunk_size: int) -> StreamHeader:
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    chunk_count = _chunk_count(plaintext_size, chunk_size)
+    if chunk_count >= _MAX_CHUNKS:
+        raise ValueError("File too large for chunk size; use a larger chunk_size")
+    nonce_prefix = secrets.token_bytes(_NONCE_PREFIX_SIZE)
+    raw = _STREAM_HEADER.pack(
+        STREAM_MAGIC, STREAM_VERSION, 0, chunk_size, plaintext_size, chunk_count, nonce_prefix
+    )
+    return StreamHeader(chunk_size, plaintext_size, chunk_count, nonce_prefix, raw)
+
+
+def parse_stream_header(data, total_size: int) -> Optional[StreamHeader]:
+    """
+    Parses the chunked-format header at the start of data (any buffer, e.g. an mmap).
+    Returns None for legacy single-shot [nonce][ciphertext] data.
+    """
+    view = memoryview(data)
+    try:
+        magic, version, _flags, chunk_size, plaintext_size, chunk_count, prefix = _STREAM_HEADER.unpack_from(view)
+    except struct.error:
+        return None
+    if magic != STREAM_MAGIC or version not in (1, STREAM_VERSION) or chunk_size == 0:
+        return None
+
+    header = StreamHeader(chunk_size, plaintext_size, chunk_count, prefix, bytes(view[:_STREAM_HEADER.size]))
+    if version == STREAM_VERSION:
+        try:
+            key_id, wrap_nonce, wrapped_key = _KEY_ENVELOPE.unpack_from(view, _STREAM_HEADER.size)
+        except struct.error:
+            return None
+        header = header._replace(key_id=key_id, wrap_nonce=wrap_nonce, wrapped_key=wrapped_key)
+
+    # A legacy nonce could start with the magic by chance; the layout check rules that out.
+    if chunk_count != _chunk_count(plaintext_size, chunk_size) or total_size != header.expected_file_size():
+        return None
+    return header
+
+
+def read_stream_header(f: BinaryIO) -> Optional[StreamHeader]:
+    """
+    Reads the chunked-format header from the start of f and leaves f positioned at chunk 0.
+    Returns None (and rewinds f) for legacy single-shot [nonce][ciphertext] files.
+    """
+    head = f.read(STREAM_HEADER_SIZE)
+    total_size = f.seek(0, io.SEEK_END)
+    header = parse_stream_header(head, total_size)
+    f.seek(header.size if header is not None else 0)
+    return header
+
+
+def _readinto_exact(src: BinaryIO, view: memoryview) -> int:
+    """Fills view from src, looping over short reads; returns the bytes read (< len(view) at EOF)."""
+    filled = 0
+    while filled < len(view):
+        got = src.readinto(view[filled:])
+        if not got:
+            break
+        filled += got
+    return filled
+
+
+def _read_chunks(src: BinaryIO, size: int, chunk_size: int) -> Iterator[memoryview]:
+    """
+    Yields the plaintext chunks of `size` bytes from src, read with readinto into one
+    reusable buffer. Each view is only valid until the next one is requested.
+    """
+    buf = memoryview(bytearray(min(chunk_size, size)))
+    remaining = size
+    while True:
+        view = buf[:min(chunk_size, remaining)]
+        if _readinto_exact(src, view) != len(view):
+            raise ValueError("Input ended before the declared size")
+        yield view
+        remaining -= len(view)
+        if remaining == 0:
+            break
+
+
+def _buffer_chunks(view: memoryview, chunk_size: int) -> Iterator[memoryview]:
+    """Yields zero-copy chunk_size slices of view (one empty slice for empty input)."""
+    for start in range(0, len(view) or 1, chunk_size):
+        yield view[start:start + chunk_size]
+
+
+class RecordBatch:
+    """
+    Many records packed back to back in one buffer: record i is
+    buffer[offsets[i]:offsets[i + 1]], so offsets holds len(batch) + 1 entries.
+    """
+    __slots__ = ("buffer", "offsets")
+
+    def __init__(self, buffer, offsets: Sequence[int]):
+        self.buffer = buffer
+        self.offsets = offsets
+
+    @classmethod
+    def pack(cls, records: Iterable[bytes]) -> "RecordBatch":
+        offsets = array("Q", [0])
+        buffer = bytearray()
+        for record in records:
+            buffer += record
+            offsets.append(len(buffer))
+        return cls(buffer, offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> memoryview:
+        if index < 0:
+            index += len(self)
+        return memoryview(self.buffer)[self.offsets[index]:self.offsets[index + 1]]
+
+    def __iter__(self) -> Iterator[memoryview]:
+        view = memoryview(self.buffer)
+        offsets = self.offsets
+        for i in range(len(offsets) - 1):
+            yield view[offsets[i]:offsets[i + 1]]
+
+
+def _output_buffer(out, total: int) -> tuple[object, memoryview]:
+    if out is None:
+        out = bytearray(total)
+    view = memoryview(out).cast("B")
+    if view.readonly or len(view) < total:
+        raise ValueError(f"Output buffer must be writable and hold at least {total} bytes")
+    return out, view
+
+
+class EncryptResult(NamedTuple):
+    """Per-file outcome of AegisSecurity.encrypt_many."""
+    source: Path
+    output: Path
+    size: int
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class _EncryptJob:
+    """Bookkeeping for one file while its chunks are in flight in encrypt_many."""
+
+    def __init__(self, source: Path, output: Path):
+        self.source = source
+        self.output = output
+        self.size = 0
+        self.dst: Optional[BinaryIO] = None
+        self.pending = 0
+        self.reading_done = False
+        self.error: Optional[str] = None
+        self.result: Optional[EncryptResult] = None
+
+    def fail(self, exc: Exception):
+        if self.error is None:
+            self.error = f"{type(exc).__name__}: {exc}"
+
+    def maybe_finish(self):
+        if self.result is not None or not self.reading_done or self.pending:
+            return
+        if self.dst is not None:
+            self.dst.close()
+        if self.error is not None and self.dst is not None:
+            self.output.unlink(missing_ok=True)
+        self.result = EncryptResult(self.source, self.output, self.size, self.error)
+
+
+class EncryptedFileReader(io.RawIOBase):
+    """
+    Seekable, read-only view of the plaintext of an encrypted file.
+    Only the chunks covering the bytes actually read are fetched and authenticated;
+    the most recently used chunk is kept so sequential small reads decrypt each chunk once.
+    Legacy single-shot files cannot be split, so they are decrypted in full on open.
+    """
+
+    def __init__(self, path: Path, security: "AegisSecurity"):
+        super().__init__()
+        self.name = str(path)
+        self._f = open(path, "rb")
+        self._pos = 0
+        self._cached_index = -1
+        self._cached = memoryview(b"")
+        try:
+            self._header = read_stream_header(self._f)
+            if self._header is None:
+                self._cached = memoryview(security.decrypt_data(self._f.read()))
+                self._cached_index = 0
+                self._size = len(self._cached)
+            else:
+                self._cipher = security._file_cipher(self._header, self._f)
+                self._size = self._header.plaintext_size
+                # One sealed and one plaintext buffer, reused for every chunk
+                buf_size = min(self._header.chunk_size, self._size)
+                self._sealed = memoryview(bytearray(buf_size + TAG_SIZE))
+                self._plain = memoryview(bytearray(buf_size))
+        except Exception:
+            self._f.close()
+            raise
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if pos < 0:
+            raise ValueError("Negative seek position")
+        self._pos = pos
+        return pos
+
+    def _chunk(self, index: int) -> memoryview:
+        if index != self._cached_index:
+            header = self._header
+            plain_len = min(header.chunk_size, header.plaintext_size - index * header.chunk_size)
+            self._cached_index = -1
+            self._f.seek(header.size + index * (header.chunk_size + TAG_SIZE))
+            sealed = self._sealed[:plain_len + TAG_SIZE]
+            if _readinto_exact(self._f, sealed) != len(sealed):
+                raise ValueError("Encrypted file is truncated")
+            self._cipher.decrypt_into(header.chunk_nonce(index), sealed, header.raw, self._plain[:plain_len])
+            self._cached = self._plain[:plain_len]
+            self._cached_index = index
+        return self._cached
+
+    def readinto(self, b) -> int:
+        if self.closed:
+            raise ValueError("I/O operation on closed file")
+        out = memoryview(b).cast("B")
+        written = 0
+        while written < len(out) and self._pos < self._size:
+            if self._header is None:
+                index, within = 0, self._pos
+            else:
+                index, within = divmod(self._pos, self._header.chunk_size)
+            chunk = self._chunk(index)
+            n = min(len(out) - written, len(chunk) - within)
+            out[written:written + n] = chunk[within:within + n]
+            written += n
+            self._pos += n
+        return written
+
+    def close(self):
+        if not self.closed:
+            self._f.close()
+            self._cached = memoryview(b"")
+        super().close()
 
-SERVICE_NAME = "aegis_core"
-USERNAME = "aegis_master_key_v2"
 
 class AegisSecurity:
-    def __init__(self, key_path: str = "aegis_key.key", use_keyring: bool = True):
+    def __init__(
+        self,
+        key_path: str = "aegis_key.key",
+        use_keyring: bool = True,
+        provider: Optional[KeyProvider] = None,
+        nonce_state: Optional[str] = None,
+    ):
         self.key_path = Path(key_path)
         self.use_keyring = use_keyring
+        self.provider = provider or key_provider
         self.key = self._load_or_generate_key()
-        self.aesgcm = AESGCM(self.key)
+        # Optional counter-based nonces for encrypt_data (see NonceSequence)
+        self.nonces = NonceSequence(Path(nonce_state)) if nonce_state else None
 
     def _load_or_generate_key(self) -> bytes:
-        # 1. Try Keyring first
-        if self.use_keyring:
-            try:
-                stored_key = keyring.get_password(SERVICE_NAME, USERNAME)
-                if stored_key:
-                    return base64.urlsafe_b64decode(stored_key)
-            except Exception:
-                pass
-
-        # 2. Try File (Fallback)
-        if self.key_path.exists():
-            try:
-                # Try reading as base64 (Jules' format)
-                return base64.urlsafe_b64decode(self.key_path.read_bytes())
-            except Exception:
-                # Fallback to raw bytes (Legacy format)
-                return self.key_path.read_bytes()
-        
-        # 3. Generate New (AES-256 = 32 bytes)
-        return self._rotate_key()
+        # Served from the process-wide cache; storage is only hit on a miss or expiry
+        self._use_keyset(self.provider.get(self.key_path, self.use_keyring))
+        return self.key
 
-    def _rotate_key(self) -> bytes:
-        """Generates a new 256-bit key and saves it."""
-        key = AESGCM.generate_key(bit_length=256)
-        key_b64 = base64.urlsafe_b64encode(key)
-        
-        # Save to Keyring
-        if self.use_keyring:
-            try:
-                keyring.set_password(SERVICE_NAME, USERNAME, key_b64.decode('utf-8'))
-            except Exception as e:
-                # In production logs, this should be a warning
-                pass
+    def _use_keyset(self, keyset: KeySet):
+        # Master key versions; self.key / self.aesgcm are always the active one.
+        self._keyset = keyset
+        self.keys = keyset.keys
+        self.key_id = keyset.active
+        self.key = keyset.keys[keyset.active]
+        self.aesgcm = keyset.ciphers[keyset.active]
 
-        # Save to File (Backup)
-        self.key_path.write_bytes(key_b64)
-        try:
-            os.chmod(self.key_path, 0o600)
-        except Exception:
-            pass
-            
-        return key
+    def _rotate_key(self) -> bytes:
+        """
+        Generates a new 256-bit key version, makes it active and saves the key set.
+        Older versions are kept so data wrapped under them stays readable; the provider
+        merges into the stored set, not this context's possibly stale snapshot.
+        """
+        self._use_keyset(self.provider.rotate(self.key_path, self.use_keyring))
+        return self.key
 
-    def rotate_master_key(self, reencrypt_files: list[Path] = None):
+    def rotate_master_key(self, reencrypt_files: list[Path] = None, workers: Optional[int] = None) -> dict[str, int]:
         """
         Public method to trigger rotation.
-        DANGER: If reencrypt_files is not provided, old data may become unreadable
-        unless the old key is archived (which this implementation currently does not do).
+        A new master key version becomes active. Previous versions are retained, so files
+        that have not been migrated yet still decrypt.
 
-        Enhancement: Supports immediate re-encryption of critical files.
+        Files in reencrypt_files are migrated right away via rewrap_files: only their
+        data-key envelopes are rewritten, not the data.
         """
-        old_aesgcm = self.aesgcm
-
         print("Rotating Master Key...")
-        self.key = self._rotate_key()
-        self.aesgcm = AESGCM(self.key)
+        self._rotate_key()
 
-        if reencrypt_files:
-            print(f"Re-encrypting {len(reencrypt_files)} files...")
-            for fpath in reencrypt_files:
-                if fpath.exists():
-                    try:
-                        # Decrypt with OLD key
-                        with open(fpath, "rb") as f:
-                            enc_data = f.read()
+        if not reencrypt_files:
+            return {}
+        print(f"Re-wrapping {len(reencrypt_files)} files...")
+        return self.rewrap_files(reencrypt_files, workers=workers)
+
+    def rewrap_files(self, paths: Iterable[Path], workers: Optional[int] = None) -> dict[str, int]:
+        """
+        Re-wraps each file's data key under the active master key version, in parallel.
+        Files already on the active version are skipped, so an interrupted rotation
+        resumes by calling this again with the same paths. Legacy and v1 files have no
+        data key and are re-encrypted once into the envelope format instead.
+        Returns counts of rewrapped / migrated / skipped / failed files.
+        """
+        workers = workers or os.cpu_count() or 1
+        counts = {"rewrapped": 0, "migrated": 0, "skipped": 0, "failed": 0}
 
-                        # Validate Format
-                        if len(enc_data) < 28:
-                             continue
+        def rewrap(fpath: Path) -> str:
+            try:
+                return self._rewrap_file(fpath)
+            except Exception as e:
+                print(f"Failed to re-wrap {fpath}: {e}")
+                return "failed"
+
+        in_flight = deque()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for fpath in paths:
+                in_flight.append(pool.submit(rewrap, Path(fpath)))
+                if len(in_flight) >= 4 * workers:
+                    counts[in_flight.popleft().result()] += 1
+            while in_flight:
+                counts[in_flight.popleft().result()] += 1
+        return counts
+
+    def _rewrap_file(self, fpath: Path) -> str:
+        with open(fpath, "r+b") as f:
+            header = read_stream_header(f)
+            if header is not None and header.key_id == self.key_id:
+                return "skipped"
+            if header is not None and header.key_id is not None:
+                data_key = self._unwrap_data_key(header)
+                f.seek(len(header.raw))
+                f.write(self._wrap_data_key(header, data_key).envelope())
+                f.flush()
+                os.fsync(f.fileno())
+                return "rewrapped"
 
-                        nonce = enc_data[:12]
-                        ciphertext = enc_data[12:]
-                        plaintext = old_aesgcm.decrypt(nonce, ciphertext, None)
+        # Decrypt with whichever key sealed it, encrypt into v2, one chunk at a time
+        tmp_path = fpath.with_name(fpath.name + ".rotating")
+        try:
+            with open(fpath, "rb") as src, open(tmp_path, "wb") as dst:
+                header = read_stream_header(src)
+                if header is None:
+                    self.encrypt_buffer(self.decrypt_data(src.read()), dst)
+                else:
+                    chunks = self._iter_chunks(src, header, self._file_cipher(header, src))
+                    self._seal_chunks(dst, header.plaintext_size, header.chunk_size, chunks)
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.replace(tmp_path, fpath)
+        finally:
+            if tmp_path.exists():
+                os.remove(tmp_path)
+        return "migrated"
+
+    def _master_ciphers(self) -> Iterator[AESGCM]:
+        """Active master key first, then older versions newest to oldest."""
+        keyset = self._keyset
+        yield keyset.ciphers[keyset.active]
+        for key_id in sorted(keyset.ciphers, reverse=True):
+            if key_id != keyset.active:
+                yield keyset.ciphers[key_id]
 
-                        # Encrypt with NEW key
-                        new_enc_data = self.encrypt_data(plaintext)
-                        with open(fpath, "wb") as f:
-                            f.write(new_enc_data)
+    def _new_file_header(self, size: int, chunk_size: int) -> tuple[StreamHeader, AESGCM]:
+        """Creates a v2 header with a fresh data key wrapped under the active master key."""
+        data_key = AESGCM.generate_key(bit_length=256)
+        header = self._wrap_data_key(_new_stream_header(size, chunk_size), data_key)
+        return header, AESGCM(data_key)
 
-                        print(f"Re-encrypted: {fpath}")
-                    except Exception as e:
-                        print(f"Failed to re-encrypt {fpath}: {e}")
+    def _wrap_data_key(self, header: StreamHeader, data_key: bytes) -> StreamHeader:
+        wrap_nonce = secrets.token_bytes(NONCE_SIZE)
+        wrapped_key = self.aesgcm.encrypt(wrap_nonce, data_key, header.raw)
+        return header._replace(key_id=self.key_id, wrap_nonce=wrap_nonce, wrapped_key=wrapped_key)
+
+    def _unwrap_data_key(self, header: StreamHeader) -> bytes:
+        if header.key_id not in self._keyset.ciphers:
+            # Possibly rotated by another context or process since our key set was cached
+            self.provider.invalidate(self.key_path)
+            self._load_or_generate_key()
+        master = self._keyset.ciphers.get(header.key_id)
+        if master is None:
+            raise ValueError(f"Master key version {header.key_id} is not available")
+        return master.decrypt(header.wrap_nonce, header.wrapped_key, header.raw)
+
+    def _file_cipher(self, header: StreamHeader, src) -> AESGCM:
+        """
+        Returns the cipher that sealed header's chunks. src is the file (positioned after
+        the header) or a buffer holding the whole encrypted file.
+        """
+        if header.key_id is not None:
+            return AESGCM(self._unwrap_data_key(header))
+
+        # v1 files carry no key id, so find the master key version that opens chunk 0
+        first_len = min(header.chunk_size, header.plaintext_size) + TAG_SIZE
+        if isinstance(src, memoryview):
+            sealed = src[header.size:header.size + first_len]
+        else:
+            pos = src.tell()
+            sealed = src.read(first_len)
+            src.seek(pos)
+        for cipher in self._master_ciphers():
+            try:
+                cipher.decrypt(header.chunk_nonce(0), sealed, header.raw)
+                return cipher
+            except InvalidTag:
+                continue
+        raise InvalidTag()
+
+    def _next_nonce(self) -> bytes:
+        if self.nonces is None:
+            return secrets.token_bytes(NONCE_SIZE)
+        return self.nonces.next(self.key_id)
 
     def encrypt_data(self, data: bytes) -> bytes:
         """Format: [NONCE (12 bytes)][CIPHERTEXT + TAG]"""
-        nonce = secrets.token_bytes(12)
+        nonce = self._next_nonce()
         ciphertext = self.aesgcm.encrypt(nonce, data, None)
         return nonce + ciphertext
 
     def decrypt_data(self, token: bytes) -> bytes:
-        if len(token) < 28:
+        if len(token) < NONCE_SIZE + TAG_SIZE:
             raise ValueError("Token too short")
-        nonce = token[:12]
-        ciphertext = token[12:]
-        return self.aesgcm.decrypt(nonce, ciphertext, None)
-
-    def encrypt_file(self, file_path: Path, output_path: Path):
-        with open(file_path, "rb") as f:
-            data = f.read()
-        
-        encrypted_data = self.encrypt_data(data)
-        
-        with open(output_path, "wb") as f:
-            f.write(encrypted_data)
+        # Slicing a memoryview does not copy the ciphertext (also accepts mmap input)
+        view = memoryview(token)
+        nonce = view[:NONCE_SIZE]
+        ciphertext = view[NONCE_SIZE:]
+        # Records carry no key id; older master key versions are only tried on failure
+        for cipher in self._master_ciphers():
+            try:
+                return cipher.decrypt(nonce, ciphertext, None)
+            except InvalidTag:
+                continue
+        raise InvalidTag()
+
+    def encrypt_batch(
+        self,
+        records: Union[Sequence[bytes], RecordBatch],
+        associated_data: Optional[Sequence[Optional[bytes]]] = None,
+        out=None,
+    ) -> RecordBatch:
+        """
+        Encrypts many small records into one buffer, each in the encrypt_data format
+        ([NONCE][CIPHERTEXT + TAG]), so any record can also be opened with decrypt_data.
+        records is a list of buffers or a RecordBatch (one buffer plus offsets); out is an
+        optional preallocated writable buffer, otherwise a single bytearray is allocated.
+        associated_data, if given, holds one AAD (or None) per record.
+        """
+        views = list(records) if isinstance(records, RecordBatch) else records
+        count = len(views)
+        aads = self._batch_aads(associated_data, count)
+
+        offsets = array("Q", [0])
+        total = 0
+        for view in views:
+            total += NONCE_SIZE + len(view) + TAG_SIZE
+            offsets.append(total)
+        out, buf = _output_buffer(out, total)
+
+        # One entropy call for the whole batch unless counter nonces are enabled
+        if self.nonces is None:
+            random_nonces = secrets.token_bytes(NONCE_SIZE * count)
+            nonces = (random_nonces[i:i + NONCE_SIZE] for i in range(0, NONCE_SIZE * count, NONCE_SIZE))
+        else:
+            nonces = (self.nonces.next(self.key_id) for _ in range(count))
+
+        encrypt_into = self.aesgcm.encrypt_into
+        start = 0
+        for view, aad, nonce, end in zip(views, aads, nonces, offsets[1:]):
+            body = start + NONCE_SIZE
+            buf[start:body] = nonce
+            encrypt_into(nonce, view, aad, buf[body:end])
+            start = end
+        return RecordBatch(out, offsets)
+
+    def decrypt_batch(
+        self,
+        tokens: Union[Sequence[bytes], RecordBatch],
+        associated_data: Optional[Sequence[Optional[bytes]]] = None,
+        out=None,
+    ) -> RecordBatch:
+        """
+        Inverse of encrypt_batch: decrypts every token into one buffer of plaintexts.
+        Raises on the first token that fails authentication.
+        """
+        views = list(tokens) if isinstance(tokens, RecordBatch) else [memoryview(t) for t in tokens]
+        aads = self._batch_aads(associated_data, len(views))
+
+        offsets = array("Q", [0])
+        total = 0
+        for view in views:
+            if len(view) < NONCE_SIZE + TAG_SIZE:
+                raise ValueError("Token too short")
+            total += len(view) - NONCE_SIZE - TAG_SIZE
+            offsets.append(total)
+        out, buf = _output_buffer(out, total)
+
+        cipher = self.aesgcm
+        for i, view in enumerate(views):
+            nonce = view[:NONCE_SIZE]
+            target = buf[offsets[i]:offsets[i + 1]]
+            try:
+                cipher.decrypt_into(nonce, view[NONCE_SIZE:], aads[i], target)
+            except InvalidTag:
+                # Sealed under an older master key version (see decrypt_data)
+                for old in self._master_ciphers():
+                    if old is cipher:
+                        continue
+                    try:
+                        old.decrypt_into(nonce, view[NONCE_SIZE:], aads[i], target)
+                        break
+                    except InvalidTag:
+                        continue
+                else:
+                    raise
+        return RecordBatch(out, offsets)
+
+    @staticmethod
+    def _batch_aads(associated_data, count: int) -> Sequence[Optional[bytes]]:
+        if associated_data is None:
+            return [None] * count
+        if len(associated_data) != count:
+            raise ValueError("associated_data must have one entry per record")
+        return associated_data
+
+    def encrypt_file(self, file_path: Path, output_path: Path, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """Streams file_path into the chunked format with memory bounded by chunk_size."""
+        with open(file_path, "rb") as src, open(output_path, "wb") as dst:
+            self.encrypt_stream(src, dst, os.fstat(src.fileno()).st_size, chunk_size)
+
+    def encrypt_stream(self, src: BinaryIO, dst: BinaryIO, size: int, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """Encrypts exactly `size` bytes read from src into dst in the chunked format."""
+        self._seal_chunks(dst, size, chunk_size, _read_chunks(src, size, chunk_size))
+
+    def encrypt_buffer(self, data, dst: BinaryIO, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """Encrypts an in-memory buffer (bytes, memoryview, mmap) into dst without copying it."""
+        view = memoryview(data).cast("B")
+        self._seal_chunks(dst, len(view), chunk_size, _buffer_chunks(view, chunk_size))
+
+    def encrypt_many(
+        self,
+        paths: Iterable[Path],
+        out_dir: Path,
+        workers: Optional[int] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> list[EncryptResult]:
+        """
+        Bulk-encrypts files into out_dir as `<name>.enc`, spreading chunk encryption over
+        a thread pool (AES-GCM releases the GIL). The calling thread reads the next chunks
+        and writes finished ones in order while workers seal, so disk I/O overlaps crypto.
+        At most 2 * workers chunks are in flight, across file boundaries, so many small
+        files pipeline as well as one large one. Chunks are read and sealed in place in a
+        ring of reusable buffers, one slot per in-flight chunk. A failing file is reported
+        in its EncryptResult and its partial output removed; the other files are unaffected.
+        """
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        workers = workers or os.cpu_count() or 1
+        max_in_flight = 2 * workers
+
+        jobs: list[_EncryptJob] = []
+        seen_outputs = set()
+        in_flight = deque()
+        # With at most max_in_flight chunks pending, the next slot is always free again
+        ring = [
+            (memoryview(bytearray(chunk_size)), memoryview(bytearray(chunk_size + TAG_SIZE)))
+            for _ in range(max_in_flight + 1)
+        ]
+        slot = 0
+
+        def drain(limit: int):
+            while len(in_flight) > limit:
+                job, future, sealed = in_flight.popleft()
+                try:
+                    future.result()
+                    if job.error is None:
+                        job.dst.write(sealed)
+                except Exception as e:
+                    job.fail(e)
+                job.pending -= 1
+                job.maybe_finish()
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for source in paths:
+                source = Path(source)
+                job = _EncryptJob(source, out_dir / (source.name + ".enc"))
+                jobs.append(job)
+                try:
+                    if job.output in seen_outputs:
+                        raise ValueError(f"Duplicate output name: {job.output.name}")
+                    seen_outputs.add(job.output)
+
+                    with open(source, "rb") as src:
+                        job.size = os.fstat(src.fileno()).st_size
+                        header, cipher = self._new_file_header(job.size, chunk_size)
+                        job.dst = open(job.output, "wb")
+                        job.dst.write(header.to_bytes())
+
+                        remaining = job.size
+                        for index in range(header.chunk_count):
+                            plain, sealed = ring[slot]
+                            slot = (slot + 1) % len(ring)
+                            chunk = plain[:min(chunk_size, remaining)]
+                            if _readinto_exact(src, chunk) != len(chunk):
+                                raise ValueError("File changed size while being read")
+                            remaining -= len(chunk)
+                            sealed = sealed[:len(chunk) + TAG_SIZE]
+
+                            job.pending += 1
+                            future = pool.submit(cipher.encrypt_into, header.chunk_nonce(index), chunk, header.raw, sealed)
+                            in_flight.append((job, future, sealed))
+                            drain(max_in_flight)
+                            if job.error is not None:
+                                break
+                except Exception as e:
+                    job.fail(e)
+                job.reading_done = True
+                job.maybe_finish()
+            drain(0)
+
+        return [job.result for job in jobs]
 
     def decrypt_file(self, encrypted_path: Path, output_path: Path):
-        with open(encrypted_path, "rb") as f:
-            data = f.read()
-        
-        decrypted_data = self.decrypt_data(data)
-        
-        with open(output_path, "wb") as f:
-            f.write(decrypted_data)
+        """Decrypts chunked files as a stream; legacy [nonce][ciphertext] files in one shot."""
+        try:
+            with open(encrypted_path, "rb") as src, open(output_path, "wb") as dst:
+                header = read_stream_header(src)
+                if header is None:
+                    dst.write(self.decrypt_data(src.read()))
+                    return
+                for chunk in self._iter_chunks(src, header, self._file_cipher(header, src)):
+                    dst.write(chunk)
+        except Exception:
+            # Never leave a partially decrypted (unauthenticated) file behind
+            Path(output_path).unlink(missing_ok=True)
+            raise
+
+    def decrypt_buffer(self, data, dst: BinaryIO):
+        """Decrypts a whole encrypted file held in a buffer (e.g. an mmap) into dst."""
+        view = memoryview(data).cast("B")
+        header = parse_stream_header(view, len(view))
+        if header is None:
+            dst.write(self.decrypt_data(view))
+            return
+        for chunk in self._iter_chunks(view, header, self._file_cipher(header, view)):
+            dst.write(chunk)
+
+    def open_encrypted(self, encrypted_path: Path) -> EncryptedFileReader:
+        """Opens an encrypted file as a seekable, read-only binary stream of its plaintext."""
+        return EncryptedFileReader(Path(encrypted_path), self)
+
+    def read_range(self, encrypted_path: Path, offset: int, length: int) -> bytes:
+        """Decrypts only the chunks covering plaintext bytes [offset, offset + length)."""
+        if offset < 0 or length < 0:
+            raise ValueError("offset and length must be non-negative")
+        with self.open_encrypted(encrypted_path) as reader:
+            reader.seek(offset)
+            return reader.read(length)
+
+    def _seal_chunks(self, dst: BinaryIO, size: int, chunk_size: int, chunks: Iterator[memoryview]):
+        """
+        Writes header and sealed chunks to dst. chunks must yield chunk_size pieces (the
+        last may be shorter, one empty piece for empty input); each is sealed with
+        encrypt_into through one reusable output buffer.
+        """
+        header, cipher = self._new_file_header(size, chunk_size)
+        dst.write(header.to_bytes())
+
+        sealed = memoryview(bytearray(min(chunk_size, size) + TAG_SIZE))
+        remaining = size
+        index = -1
+        for index, chunk in enumerate(chunks):
+            expected = min(chunk_size, remaining)
+            if index >= header.chunk_count or len(chunk) != expected:
+                raise ValueError("Input size does not match declared size")
+            out = sealed[:expected + TAG_SIZE]
+            cipher.encrypt_into(header.chunk_nonce(index), chunk, header.raw, out)
+            dst.write(out)
+            remaining -= expected
+        if index != header.chunk_count - 1:
+            raise ValueError("Input size does not match declared size")
+
+    @staticmethod
+    def _iter_chunks(src, header: StreamHeader, aesgcm: AESGCM) -> Iterator[memoryview]:
+        """
+        Yields authenticated plaintext chunks, decrypted with decrypt_into into one reusable
+        buffer (each view is valid until the next is requested). src is the file positioned
+        just after the header, or a buffer holding the whole encrypted file.
+        """
+        buf_size = min(header.chunk_size, header.plaintext_size)
+        plain = memoryview(bytearray(buf_size))
+        sealed_buf = None if isinstance(src, memoryview) else memoryview(bytearray(buf_size + TAG_SIZE))
+        offset = header.size
+
+        remaining = header.plaintext_size
+        for index in range(header.chunk_count):
+            plain_len = min(header.chunk_size, remaining)
+            if sealed_buf is None:
+                # Zero-copy slice of the caller's buffer
+                sealed = src[offset:offset + plain_len + TAG_SIZE]
+                offset += len(sealed)
+            else:
+                sealed = sealed_buf[:plain_len + TAG_SIZE]
+                sealed = sealed[:_readinto_exact(src, sealed)]
+            if len(sealed) != plain_len + TAG_SIZE:
+                raise ValueError("Encrypted file is truncated")
+            aesgcm.decrypt_into(header.chunk_nonce(index), sealed, header.raw, plain[:plain_len])
+            yield plain[:plain_len]
+            remaining -= plain_len
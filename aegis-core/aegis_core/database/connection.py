@@ -1,28 +1,211 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql.dml import UpdateBase
+import threading
 from contextlib import asynccontextmanager
-from pathlib import Path
+from typing import Optional, Tuple
 from .models import Base
+from .settings import DatabaseSettings
 
-# Default to a local SQLite database in the current directory
-DATABASE_URL = "sqlite+aiosqlite:///./aegis.db"
+_ENGINES_KEY = "aegis_engines"
+_WRITING_KEY = "aegis_writing"
 
-engine = create_async_engine(
-    DATABASE_URL, 
-    connect_args={"check_same_thread": False}, # Needed for SQLite
-    echo=False
-)
 
-AsyncSessionLocal = sessionmaker(
-    engine, class_=AsyncSession, expire_on_commit=False
-)
+def _sqlite_profile(settings: DatabaseSettings):
+    """connect listener applying the configured pragmas to each new SQLite connection."""
+    pragmas = [
+        f"PRAGMA busy_timeout = {int(settings.busy_timeout_ms)}",
+        f"PRAGMA synchronous = {settings.synchronous}",
+        f"PRAGMA cache_size = {-int(settings.cache_size_kib)}",
+        f"PRAGMA mmap_size = {int(settings.mmap_size)}",
+        # Off by default in SQLite; the consent policy association tables cascade on delete
+        "PRAGMA foreign_keys = ON",
+    ]
+    if not settings.is_sqlite_memory:
+        # After busy_timeout: switching to WAL takes a lock another connection may hold
+        pragmas.insert(1, f"PRAGMA journal_mode = {settings.journal_mode}")
+
+    def apply(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    return apply
+
+
+def _sqlite_engines(settings: DatabaseSettings) -> Tuple[AsyncEngine, AsyncEngine]:
+    connect_args = {"check_same_thread": False} # Needed for SQLite
+    url = settings.sqlalchemy_url
+    if settings.is_sqlite_memory:
+        engine = create_async_engine(url, connect_args=connect_args, echo=settings.echo)
+        event.listen(engine.sync_engine, "connect", _sqlite_profile(settings))
+        return engine, engine
+
+    reader = create_async_engine(
+        url, connect_args=connect_args, echo=settings.echo,
+        pool_size=settings.pool_size, max_overflow=settings.max_overflow, pool_timeout=settings.pool_timeout,
+    )
+    writer = create_async_engine(
+        url, connect_args=connect_args, echo=settings.echo,
+        pool_size=1, max_overflow=0, pool_timeout=settings.pool_timeout,
+    )
+    for e in (reader, writer):
+        event.listen(e.sync_engine, "connect", _sqlite_profile(settings))
+    return reader, writer
+
+
+def _postgresql_engine(settings: DatabaseSettings) -> AsyncEngine:
+    url = settings.sqlalchemy_url
+    connect_args = {"timeout": settings.connect_timeout}
+    if url.get_driver_name() == "asyncpg":
+        # asyncpg's own statement cache, and SQLAlchemy's cache of prepared statements on top
+        connect_args["statement_cache_size"] = settings.statement_cache_size
+        url = url.update_query_dict({"prepared_statement_cache_size": str(settings.statement_cache_size)})
+    return create_async_engine(
+        url, connect_args=connect_args, echo=settings.echo,
+        pool_size=settings.pool_size, max_overflow=settings.max_overflow, pool_timeout=settings.pool_timeout,
+        pool_pre_ping=settings.pool_pre_ping, pool_recycle=settings.pool_recycle,
+    )
+
+
+def create_engines(settings: DatabaseSettings) -> Tuple[AsyncEngine, AsyncEngine]:
+    """
+    (reader, writer) engines for the backend the settings' URL selects. For a SQLite file
+    the reader pool holds `pool_size` connections and the writer exactly one, so writes
+    queue in-process instead of contending for SQLite's write lock. Server databases
+    handle concurrent writers themselves: reader and writer are the same pooled engine.
+    """
+    if settings.is_sqlite:
+        return _sqlite_engines(settings)
+    if settings.backend == "postgresql":
+        engine = _postgresql_engine(settings)
+    else:
+        engine = create_async_engine(
+            settings.sqlalchemy_url, echo=settings.echo,
+            pool_size=settings.pool_size, max_overflow=settings.max_overflow, pool_timeout=settings.pool_timeout,
+            pool_pre_ping=settings.pool_pre_ping, pool_recycle=settings.pool_recycle,
+        )
+    return engine, engine
+
+
+class RoutingSession(Session):
+    """
+    Sends SELECTs to the reader pool and flushes / INSERT / UPDATE / DELETE to the writer.
+    Once a transaction has written, its later statements also go to the writer so it
+    reads its own uncommitted changes. The writer is held until commit / rollback, so
+    a task must not wait on another session's write while its own write is uncommitted.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        engines = self.info.get(_ENGINES_KEY)
+        if engines is None:
+            return super().get_bind(mapper=mapper, clause=clause, **kw)
+        reader, writer = engines
+        if self.info.get(_WRITING_KEY) or self._flushing or isinstance(clause, UpdateBase):
+            self.info[_WRITING_KEY] = True
+            return writer.sync_engine
+        return reader.sync_engine
+
+
+@event.listens_for(RoutingSession, "after_commit")
+@event.listens_for(RoutingSession, "after_rollback")
+def _end_write_transaction(session: Session):
+    session.info.pop(_WRITING_KEY, None)
+
+
+def create_sessionmaker(reader: AsyncEngine, writer: Optional[AsyncEngine] = None) -> sessionmaker:
+    writer = writer or reader
+    if writer is reader:
+        return sessionmaker(reader, class_=AsyncSession, expire_on_commit=False)
+    return sessionmaker(
+        class_=AsyncSession, sync_session_class=RoutingSession, expire_on_commit=False,
+        info={_ENGINES_KEY: (reader, writer)},
+    )
+
+
+class Database:
+    """
+    The configured engines and session factory, built on first use rather than at
+    import, so importing aegis_core never needs a database driver or a configured URL.
+    """
+
+    def __init__(self, settings: Optional[DatabaseSettings] = None):
+        self._settings = settings
+        self._engines: Optional[Tuple[AsyncEngine, AsyncEngine]] = None
+        self._sessionmaker: Optional[sessionmaker] = None
+        self._lock = threading.Lock()
+
+    @property
+    def settings(self) -> DatabaseSettings:
+        if self._settings is None:
+            self._settings = DatabaseSettings()
+        return self._settings
+
+    def _build(self):
+        with self._lock:
+            if self._engines is None:
+                self._engines = create_engines(self.settings)
+                self._sessionmaker = create_sessionmaker(*self._engines)
+
+    @property
+    def engine(self) -> AsyncEngine:
+        """The engine writes (and DDL) go to."""
+        if self._engines is None:
+            self._build()
+        return self._engines[1]
+
+    @property
+    def read_engine(self) -> AsyncEngine:
+        if self._engines is None:
+            self._build()
+        return self._engines[0]
+
+    @property
+    def session_factory(self) -> sessionmaker:
+        if self._sessionmaker is None:
+            self._build()
+        return self._sessionmaker
+
+    async def configure(self, settings: Optional[DatabaseSettings] = None):
+        """Switches to new settings (None: re-read the environment) after disposing the current engines."""
+        await self.dispose()
+        self._settings = settings
+
+    async def dispose(self):
+        """Closes pooled connections; the engines are rebuilt on next use."""
+        with self._lock:
+            engines, self._engines, self._sessionmaker = self._engines, None, None
+        if engines is not None:
+            for engine in {id(e): e for e in engines}.values():
+                await engine.dispose()
+
+
+database = Database()
+
+
+def __getattr__(name):
+    # Lazy module attributes for code written against the import-time globals
+    if name == "engine":
+        return database.engine
+    if name == "read_engine":
+        return database.read_engine
+    if name == "AsyncSessionLocal":
+        return database.session_factory
+    if name == "settings":
+        return database.settings
+    if name == "DATABASE_URL":
+        return database.settings.url
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 async def init_db():
     """Initializes the database tables."""
-    async with engine.begin() as conn:
+    async with database.engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
 @asynccontextmanager
 async def get_db():
-    async with AsyncSessionLocal() as session:
+    async with database.session_factory() as session:
         yield session
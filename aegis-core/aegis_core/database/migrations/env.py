@@ -0,0 +1,47 @@
+import asyncio
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from aegis_core.database.settings import DatabaseSettings
+from aegis_core.database.models import Base
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+target_metadata = Base.metadata
+
+
+def _url() -> str:
+    # Normalized like the application's engines: sqlite:// / postgresql:// get their async driver
+    configured = config.get_main_option("sqlalchemy.url")
+    settings = DatabaseSettings(url=configured) if configured else DatabaseSettings()
+    return settings.sqlalchemy_url.render_as_string(hide_password=False)
+
+
+def run_migrations_offline():
+    """Emits the migration SQL instead of running it (alembic upgrade --sql)."""
+    context.configure(url=_url(), target_metadata=target_metadata, literal_binds=True, render_as_batch=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def _run(connection):
+    # Batch mode: SQLite can only drop / alter columns by recreating the table
+    context.configure(connection=connection, target_metadata=target_metadata, render_as_batch=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_migrations_online():
+    engine = create_async_engine(_url())
+    async with engine.connect() as connection:
+        await connection.run_sync(_run)
+    await engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    asyncio.run(run_migrations_online())
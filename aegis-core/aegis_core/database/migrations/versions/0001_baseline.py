@@ -0,0 +1,64 @@
+"""Baseline: the schema as created by init_db() before migrations existed
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "stored_documents",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("filename", sa.String),
+        sa.Column("file_path", sa.String, unique=True),
+        sa.Column("file_hash", sa.String),
+        sa.Column("tags", sa.String),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("meta_info", sa.Text),
+    )
+    op.create_index("ix_stored_documents_id", "stored_documents", ["id"])
+    op.create_index("ix_stored_documents_filename", "stored_documents", ["filename"])
+
+    op.create_table(
+        "audit_records",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("timestamp", sa.DateTime),
+        sa.Column("actor_id", sa.String),
+        sa.Column("action_type", sa.String),
+        sa.Column("target_resource", sa.String),
+        sa.Column("verdict", sa.String),
+        sa.Column("policy_id", sa.Integer, nullable=True),
+        sa.Column("details", sa.Text),
+        sa.Column("compliance_check_details", sa.Text),
+    )
+    op.create_index("ix_audit_records_id", "audit_records", ["id"])
+
+    op.create_table(
+        "consent_policies",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("entity_id", sa.String),
+        sa.Column("name", sa.String),
+        sa.Column("description", sa.String),
+        sa.Column("allowed_actions", sa.String),
+        sa.Column("target_tags", sa.String),
+        sa.Column("expiry", sa.DateTime, nullable=True),
+        sa.Column("revoked", sa.Boolean),
+        sa.Column("regulation_mapping", sa.Text),
+        sa.Column("data_minimization_rules", sa.Text),
+    )
+    op.create_index("ix_consent_policies_id", "consent_policies", ["id"])
+
+
+def downgrade():
+    op.drop_table("consent_policies")
+    op.drop_table("audit_records")
+    op.drop_table("stored_documents")
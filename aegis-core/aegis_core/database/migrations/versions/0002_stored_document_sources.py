@@ -0,0 +1,35 @@
+"""Record where stored documents came from and index their content hash
+
+Adds the source_path / source_size / source_mtime_ns columns incremental re-ingest
+compares against, and the file_hash index deduplication looks content up by.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("stored_documents") as batch:
+        batch.add_column(sa.Column("source_path", sa.String, nullable=True))
+        batch.add_column(sa.Column("source_size", sa.BigInteger, nullable=True))
+        batch.add_column(sa.Column("source_mtime_ns", sa.BigInteger, nullable=True))
+    op.create_index("ix_stored_documents_source_path", "stored_documents", ["source_path"])
+    op.create_index("ix_stored_documents_file_hash", "stored_documents", ["file_hash"])
+
+
+def downgrade():
+    op.drop_index("ix_stored_documents_file_hash", table_name="stored_documents")
+    op.drop_index("ix_stored_documents_source_path", table_name="stored_documents")
+    with op.batch_alter_table("stored_documents") as batch:
+        batch.drop_column("source_mtime_ns")
+        batch.drop_column("source_size")
+        batch.drop_column("source_path")
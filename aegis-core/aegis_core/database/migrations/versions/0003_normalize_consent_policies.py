@@ -0,0 +1,97 @@
+"""Normalize consent policy actions / tags and index consent lookups
+
+Moves the comma-separated allowed_actions / target_tags columns of consent_policies
+into the consent_policy_actions / consent_policy_tags association tables and adds
+the (entity_id, revoked, expiry) index used by consent checks.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+COPY_BATCH = 10_000
+
+policies = sa.table(
+    "consent_policies",
+    sa.column("id", sa.Integer),
+    sa.column("allowed_actions", sa.String),
+    sa.column("target_tags", sa.String),
+)
+actions = sa.table("consent_policy_actions", sa.column("policy_id"), sa.column("action"), sa.column("position"))
+tags = sa.table("consent_policy_tags", sa.column("policy_id"), sa.column("tag"), sa.column("position"))
+
+
+def _split(value):
+    """Same normalization as ConsentPolicy: stripped items, no blanks, no repeats."""
+    return list(dict.fromkeys(item.strip() for item in (value or "").split(",") if item.strip()))
+
+
+def _association_table(name, value_column):
+    op.create_table(
+        name,
+        sa.Column("policy_id", sa.Integer, sa.ForeignKey("consent_policies.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column(value_column, sa.String, primary_key=True),
+        sa.Column("position", sa.Integer, nullable=False, server_default="0"),
+    )
+
+
+def upgrade():
+    _association_table("consent_policy_actions", "action")
+    _association_table("consent_policy_tags", "tag")
+
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(policies.c.id, policies.c.allowed_actions, policies.c.target_tags)
+            .where(policies.c.id > last_id).order_by(policies.c.id).limit(COPY_BATCH)
+        ).all()
+        if not rows:
+            break
+        action_rows = [
+            {"policy_id": policy_id, "action": action, "position": i}
+            for policy_id, allowed, _ in rows for i, action in enumerate(_split(allowed))
+        ]
+        tag_rows = [
+            {"policy_id": policy_id, "tag": tag, "position": i}
+            for policy_id, _, target in rows for i, tag in enumerate(_split(target))
+        ]
+        if action_rows:
+            bind.execute(actions.insert(), action_rows)
+        if tag_rows:
+            bind.execute(tags.insert(), tag_rows)
+        last_id = rows[-1].id
+
+    with op.batch_alter_table("consent_policies") as batch:
+        batch.drop_column("allowed_actions")
+        batch.drop_column("target_tags")
+        batch.create_index("ix_consent_policies_entity_revoked_expiry", ["entity_id", "revoked", "expiry"])
+
+
+def downgrade():
+    with op.batch_alter_table("consent_policies") as batch:
+        batch.drop_index("ix_consent_policies_entity_revoked_expiry")
+        batch.add_column(sa.Column("allowed_actions", sa.String))
+        batch.add_column(sa.Column("target_tags", sa.String))
+
+    bind = op.get_bind()
+    for table, value_column, target in ((actions, actions.c.action, "allowed_actions"), (tags, tags.c.tag, "target_tags")):
+        joined = {}
+        for policy_id, value in bind.execute(sa.select(table.c.policy_id, value_column).order_by(table.c.policy_id, table.c.position)):
+            joined.setdefault(policy_id, []).append(value)
+        if joined:
+            bind.execute(
+                policies.update().where(policies.c.id == sa.bindparam("pid")).values({target: sa.bindparam("value")}),
+                [{"pid": policy_id, "value": ",".join(values)} for policy_id, values in joined.items()],
+            )
+
+    op.drop_table("consent_policy_tags")
+    op.drop_table("consent_policy_actions")
@@ -0,0 +1,21 @@
+"""Index audit records by (timestamp, verdict, actor_id)
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_audit_records_timestamp_verdict_actor", "audit_records", ["timestamp", "verdict", "actor_id"])
+
+
+def downgrade():
+    op.drop_index("ix_audit_records_timestamp_verdict_actor", table_name="audit_records")
@@ -0,0 +1,45 @@
+"""Audit rollup counters and a (verdict, timestamp) index
+
+Creates audit_rollups (record counts per day, action and verdict) and fills it from
+the records currently in audit_records; from then on writers keep it up to date.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+records = sa.table("audit_records", sa.column("timestamp", sa.DateTime), sa.column("action_type", sa.String), sa.column("verdict", sa.String))
+
+
+def upgrade():
+    rollups = op.create_table(
+        "audit_rollups",
+        sa.Column("day", sa.Date, primary_key=True),
+        sa.Column("action_type", sa.String, primary_key=True),
+        sa.Column("verdict", sa.String, primary_key=True),
+        sa.Column("count", sa.BigInteger, nullable=False),
+    )
+    op.create_index("ix_audit_records_verdict_timestamp", "audit_records", ["verdict", "timestamp"])
+
+    day = sa.cast(records.c.timestamp, sa.Date) if op.get_context().dialect.name != "sqlite" else sa.func.date(records.c.timestamp)
+    action_type = sa.func.coalesce(records.c.action_type, "")
+    verdict = sa.func.coalesce(records.c.verdict, "")
+    op.execute(rollups.insert().from_select(
+        ["day", "action_type", "verdict", "count"],
+        sa.select(day, action_type, verdict, sa.func.count())
+        .where(records.c.timestamp.is_not(None))
+        .group_by(day, action_type, verdict),
+    ))
+
+
+def downgrade():
+    op.drop_index("ix_audit_records_verdict_timestamp", table_name="audit_records")
+    op.drop_table("audit_rollups")
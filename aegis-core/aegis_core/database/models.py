@@ -1,6 +1,9 @@
+from collections import Counter
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean
-from sqlalchemy.orm import declarative_base
+from typing import Any, Dict, Iterable, List
+from sqlalchemy import BigInteger, Column, ForeignKey, Index, Integer, String, Date, DateTime, Text, Boolean, event, insert, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session, declarative_base, relationship
 
 Base = declarative_base()
 
@@ -10,10 +13,15 @@ class StoredDocument(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String, index=True)
-    file_path = Column(String, unique=True) # Path to the encrypted file on disk
-    file_hash = Column(String) # For integrity checking
+    file_path = Column(String, unique=True) # Path to the encrypted file on disk (NULL for linked duplicates)
+    file_hash = Column(String, index=True) # Plaintext content hash: integrity checks and deduplication
     tags = Column(String) # Comma-separated tags
     created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Where the file was ingested from, and its stat at the time (incremental re-ingest)
+    source_path = Column(String, index=True, nullable=True)
+    source_size = Column(BigInteger, nullable=True)
+    source_mtime_ns = Column(BigInteger, nullable=True)
     
     # Metadata extracted from the file (JSON string)
     meta_info = Column(Text, default="{}") 
@@ -21,6 +29,12 @@ class StoredDocument(Base):
 class AuditLog(Base):
     """Logs every access to the aegis (Immutable Ledger)."""
     __tablename__ = "audit_records"
+    __table_args__ = (
+        # Time-range report queries (last 24h, by verdict / actor) read one index range
+        Index("ix_audit_records_timestamp_verdict_actor", "timestamp", "verdict", "actor_id"),
+        # Latest records of one verdict ("recent violations") without scanning other verdicts
+        Index("ix_audit_records_verdict_timestamp", "verdict", "timestamp"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     timestamp = Column(DateTime, default=datetime.utcnow)
@@ -37,21 +51,141 @@ class AuditLog(Base):
     # e.g. {"checks": [{"rule": "GDPR_CONSENT", "passed": true}]}
     compliance_check_details = Column(Text, default="{}")
 
+@event.listens_for(AuditLog, "before_update")
+@event.listens_for(AuditLog, "before_delete")
+def _audit_records_are_append_only(mapper, connection, target):
+    # Records only leave the table by being sealed into the archive (compliance.archive)
+    raise PermissionError("audit_records is append-only")
+
+
+class AuditRollup(Base):
+    """Audit record counts per day, action and verdict, updated as records are written."""
+    __tablename__ = "audit_rollups"
+
+    day = Column(Date, primary_key=True)
+    action_type = Column(String, primary_key=True)  # "" for records without one
+    verdict = Column(String, primary_key=True)      # likewise
+    count = Column(BigInteger, nullable=False, default=0)
+
+
+def _rollup_rows(records: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    counts = Counter(
+        ((record.get("timestamp") or datetime.utcnow()).date(), record.get("action_type") or "", record.get("verdict") or "")
+        for record in records
+    )
+    return [
+        {"day": day, "action_type": action_type, "verdict": verdict, "count": count}
+        for (day, action_type, verdict), count in counts.items()
+    ]
+
+
+def increment_rollups(connection: Connection, records: Iterable[Dict[str, Any]]):
+    """Adds audit records to the audit_rollups counters, in the caller's transaction."""
+    rows = _rollup_rows(records)
+    if not rows:
+        return
+    table = AuditRollup.__table__
+    dialect = connection.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        stmt = upsert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.day, table.c.action_type, table.c.verdict],
+            set_={"count": table.c.count + stmt.excluded["count"]},
+        )
+        connection.execute(stmt, rows)
+        return
+    # Other backends: update, then insert the counters that did not exist yet
+    for row in rows:
+        result = connection.execute(
+            update(table)
+            .where(table.c.day == row["day"], table.c.action_type == row["action_type"], table.c.verdict == row["verdict"])
+            .values(count=table.c.count + row["count"])
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(table), row)
+
+
+@event.listens_for(Session, "after_flush")
+def _rollup_flushed_records(session: Session, flush_context):
+    # AuditLog objects added through the ORM instead of compliance.audit.write_records;
+    # registered with the models so the counters never depend on that module being imported
+    records = [
+        {"timestamp": obj.timestamp, "action_type": obj.action_type, "verdict": obj.verdict}
+        for obj in session.new if isinstance(obj, AuditLog)
+    ]
+    if records:
+        increment_rollups(session.connection(bind_arguments={"clause": insert(AuditRollup.__table__)}), records)
+
+
+def _split_list(value) -> List[str]:
+    """Items of a comma-separated string (or an iterable), stripped, without blanks or repeats."""
+    if not value:
+        return []
+    items = value.split(",") if isinstance(value, str) else value
+    return list(dict.fromkeys(item.strip() for item in items if item and item.strip()))
+
+
 class ConsentPolicy(Base):
     """Defines rules for data usage."""
     __tablename__ = "consent_policies"
+    __table_args__ = (
+        # Consent lookups: one entity's active policies, as an index range scan
+        Index("ix_consent_policies_entity_revoked_expiry", "entity_id", "revoked", "expiry"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     entity_id = Column(String)      # e.g., "did:web:healthcorp.com" or "user_me"
     name = Column(String)
     description = Column(String)
-    allowed_actions = Column(String) # e.g., "TRAIN_MODEL", "STATISTICS"
-    target_tags = Column(String)    # e.g., "health, finance"
     expiry = Column(DateTime, nullable=True)
     revoked = Column(Boolean, default=False)
 
+    # Normalized allowed actions / target tags, loaded together with the policy
+    actions = relationship("ConsentPolicyAction", cascade="all, delete-orphan", lazy="selectin", order_by="ConsentPolicyAction.position")
+    tags = relationship("ConsentPolicyTag", cascade="all, delete-orphan", lazy="selectin", order_by="ConsentPolicyTag.position")
+
     # Compliance & Minimization
     # JSON map: {"GDPR": ["Art.6(1)(a)"], "HIPAA": ["§164.502"]}
     regulation_mapping = Column(Text, default="{}")
     # JSON rules: {"allowed_columns": ["age", "diagnosis"], "row_filter": "age > 18"}
     data_minimization_rules = Column(Text, default="{}")
+
+    @property
+    def allowed_actions(self) -> str:
+        """Comma-separated view of `actions`, e.g. "TRAIN_MODEL,STATISTICS"."""
+        return ",".join(a.action for a in self.actions)
+
+    @allowed_actions.setter
+    def allowed_actions(self, value):
+        self.actions = [ConsentPolicyAction(action=action, position=i) for i, action in enumerate(_split_list(value))]
+
+    @property
+    def target_tags(self) -> str:
+        """Comma-separated view of `tags`, e.g. "health,finance"."""
+        return ",".join(t.tag for t in self.tags)
+
+    @target_tags.setter
+    def target_tags(self, value):
+        self.tags = [ConsentPolicyTag(tag=tag, position=i) for i, tag in enumerate(_split_list(value))]
+
+
+class ConsentPolicyAction(Base):
+    """One action (TRAIN_MODEL, STATISTICS, ...) a consent policy allows."""
+    __tablename__ = "consent_policy_actions"
+
+    policy_id = Column(Integer, ForeignKey("consent_policies.id", ondelete="CASCADE"), primary_key=True)
+    action = Column(String, primary_key=True)
+    position = Column(Integer, nullable=False, default=0)
+
+
+class ConsentPolicyTag(Base):
+    """One data tag a consent policy covers."""
+    __tablename__ = "consent_policy_tags"
+
+    policy_id = Column(Integer, ForeignKey("consent_policies.id", ondelete="CASCADE"), primary_key=True)
+    tag = Column(String, primary_key=True)
+    position = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,65 @@
+from typing import Literal
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from sqlalchemy.engine import URL, make_url
+
+
+class DatabaseSettings(BaseSettings):
+    """
+    Database configuration, read from AEGIS_DB_* environment variables (or a .env file),
+    e.g. AEGIS_DB_URL=sqlite+aiosqlite:////var/lib/aegis/aegis.db AEGIS_DB_POOL_SIZE=16.
+    The URL selects the backend: SQLite (aiosqlite) for a single node, PostgreSQL
+    (asyncpg; postgresql://... URLs get that driver) for a store shared by replicas.
+    """
+    model_config = SettingsConfigDict(env_prefix="AEGIS_DB_", env_file=".env", extra="ignore")
+
+    url: str = "sqlite+aiosqlite:///./aegis.db"
+    echo: bool = False
+
+    # Connections kept open (SQLite: readers, which WAL lets run alongside the writer)
+    pool_size: int = 8
+    max_overflow: int = 4
+    # Seconds a session waits for a free connection (SQLite: or for the writer)
+    pool_timeout: float = 30.0
+
+    # Server backends: test connections on checkout, replace them after pool_recycle seconds
+    pool_pre_ping: bool = True
+    pool_recycle: int = 1800
+    connect_timeout: float = 10.0
+    # asyncpg prepared statements cached per connection; 0 behind pgbouncer in transaction mode
+    statement_cache_size: int = 100
+
+    # SQLite profile, applied to every new connection
+    journal_mode: Literal["WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY", "OFF"] = "WAL"
+    # NORMAL is durable in WAL mode except for the last transactions on power loss
+    synchronous: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    mmap_size: int = 256 * 1024 * 1024
+    cache_size_kib: int = 64 * 1024
+    busy_timeout_ms: int = 5000
+
+    @property
+    def sqlalchemy_url(self) -> URL:
+        """The URL with the async driver of its backend filled in."""
+        url = make_url(self.url)
+        if url.drivername in ("postgresql", "postgres"):
+            url = url.set(drivername="postgresql+asyncpg")
+        elif url.drivername == "sqlite":
+            url = url.set(drivername="sqlite+aiosqlite")
+        return url
+
+    @property
+    def backend(self) -> str:
+        """Dialect name: "sqlite", "postgresql", ..."""
+        return self.sqlalchemy_url.get_backend_name()
+
+    @property
+    def is_sqlite(self) -> bool:
+        return self.backend == "sqlite"
+
+    @property
+    def is_sqlite_memory(self) -> bool:
+        """In-memory SQLite: every connection is a separate database, so no reader/writer split."""
+        if not self.is_sqlite:
+            return False
+        database = self.sqlalchemy_url.database or ""
+        return database in ("", ":memory:") or self.sqlalchemy_url.query.get("mode") == "memory"
@@ -0,0 +1,136 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+# Inference order for CSV columns; a column takes the first type every value parses as.
+INT = "int64"
+FLOAT = "float64"
+STRING = "string"
+
+
+class ColumnBatch:
+    """
+    Columnar batch of tabular rows: one typed NumPy array per column.
+    String columns are dictionary-encoded: `columns[name]` holds int32 codes into
+    `dictionaries[name]`, the sorted array of distinct values in this batch.
+    Projection and row masks are array views/indexing, not per-row Python work.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], dictionaries: Optional[Dict[str, np.ndarray]] = None):
+        self.columns = columns
+        self.dictionaries = dictionaries or {}
+
+    @property
+    def column_names(self) -> List[str]:
+        return list(self.columns)
+
+    @property
+    def num_rows(self) -> int:
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in self.columns.values()) + sum(d.nbytes for d in self.dictionaries.values())
+
+    def dtype(self, name: str) -> str:
+        return STRING if name in self.dictionaries else str(self.columns[name].dtype)
+
+    def select(self, names: Iterable[str]) -> "ColumnBatch":
+        """Column projection; shares the underlying arrays. Unknown names are ignored."""
+        names = [n for n in names if n in self.columns]
+        return ColumnBatch(
+            {n: self.columns[n] for n in names},
+            {n: self.dictionaries[n] for n in names if n in self.dictionaries},
+        )
+
+    def filter(self, mask: np.ndarray) -> "ColumnBatch":
+        """Keeps the rows where the boolean mask is True."""
+        return ColumnBatch({n: a[mask] for n, a in self.columns.items()}, self.dictionaries)
+
+    def column(self, name: str) -> np.ndarray:
+        """Decoded values of a column (dictionary lookups for string columns)."""
+        if name in self.dictionaries:
+            return self.dictionaries[name][self.columns[name]]
+        return self.columns[name]
+
+    def to_numpy(self, names: Optional[Sequence[str]] = None, dtype=np.float32) -> np.ndarray:
+        """Stacks numeric columns into a (rows, columns) matrix, e.g. for model input."""
+        names = list(names) if names is not None else [n for n in self.columns if n not in self.dictionaries]
+        if not names:
+            return np.empty((self.num_rows, 0), dtype=dtype)
+        return np.column_stack([self.columns[n].astype(dtype, copy=False) for n in names])
+
+    def to_tensor(self, names: Optional[Sequence[str]] = None):
+        """Same as to_numpy, as a torch.Tensor sharing the matrix memory."""
+        import torch
+        return torch.from_numpy(self.to_numpy(names))
+
+    def to_rows(self) -> List[Dict[str, Any]]:
+        """Row-dict view, for callers of the list-of-dicts layout."""
+        decoded = {n: self.column(n).tolist() for n in self.columns}
+        return [dict(zip(decoded, values)) for values in zip(*decoded.values())]
+
+
+def _infer_column(values: Sequence[str], dtype: Optional[str] = None):
+    """Returns (array, dictionary-or-None) for one column of raw CSV strings."""
+    raw = np.asarray(values, dtype=str)
+    if dtype in (None, INT):
+        try:
+            return raw.astype(np.int64), None
+        except ValueError:
+            if dtype == INT:
+                raise
+        except OverflowError as e:
+            if dtype == INT:
+                raise ValueError(f"Integer out of int64 range: {e}") from None
+            # Wider than int64 (account numbers, MRNs...): kept exact as text, not rounded to float
+            dtype = STRING
+    if dtype in (None, FLOAT):
+        try:
+            # Empty cells in numeric columns become NaN
+            return np.where(raw == "", "nan", raw).astype(np.float64), None
+        except ValueError:
+            if dtype == FLOAT:
+                raise
+    dictionary, codes = np.unique(raw, return_inverse=True)
+    return codes.astype(np.int32).reshape(-1), dictionary
+
+
+def build_column_batch(
+    names: Sequence[str],
+    rows: List[Sequence[str]],
+    dtypes: Optional[Dict[str, str]] = None,
+) -> ColumnBatch:
+    """Transposes raw CSV rows into a ColumnBatch, inferring int64 / float64 / string per column."""
+    dtypes = dtypes or {}
+    columns: Dict[str, np.ndarray] = {}
+    dictionaries: Dict[str, np.ndarray] = {}
+    transposed = list(zip(*rows)) if rows else [()] * len(names)
+    for name, values in zip(names, transposed):
+        array, dictionary = _infer_column(values, dtypes.get(name))
+        columns[name] = array
+        if dictionary is not None:
+            dictionaries[name] = dictionary
+    return ColumnBatch(columns, dictionaries)
+
+
+def from_arrow(record_batch) -> ColumnBatch:
+    """
+    ColumnBatch from a pyarrow RecordBatch. Numeric columns convert without a copy when
+    they have no nulls (nulls become NaN); string columns are dictionary-encoded.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    columns: Dict[str, np.ndarray] = {}
+    dictionaries: Dict[str, np.ndarray] = {}
+    for name, array in zip(record_batch.schema.names, record_batch.columns):
+        if pa.types.is_string(array.type) or pa.types.is_large_string(array.type):
+            values = pc.fill_null(array, "").to_numpy(zero_copy_only=False)
+            columns[name], dictionaries[name] = _infer_column(values, STRING)
+        else:
+            columns[name] = array.to_numpy(zero_copy_only=False)
+    return ColumnBatch(columns, dictionaries)
@@ -1,17 +1,48 @@
 import abc
+import codecs
 import csv
+import hashlib
 import io
+import json
+import os
+import signal
+import threading
+import time
+from concurrent.futures import CancelledError, TimeoutError as FutureTimeoutError
 from pathlib import Path
-from typing import Any, Dict, List
-from pypdf import PdfReader
+from typing import TYPE_CHECKING, Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from ..compliance.filters import RowFilter, minimization_pushdown
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+    from pypdf import PdfReader
+    from ..crypto.security import AegisSecurity
+    from ..database.models import ConsentPolicy
+    from .columnar import ColumnBatch
+    from .registry import IngestorRegistry
+
+DEFAULT_BATCH_SIZE = 10_000
+# Times a PDF page range is submitted before its pages count as failed, when worker
+# processes die under it (another document's timeout kill, or a crashing page)
+PDF_RANGE_ATTEMPTS = 3
+DEFAULT_TEXT_WINDOW = 1024 * 1024
 
 class BaseIngestor(abc.ABC):
-    """Abstract base class for data ingestors."""
-    
-    @abc.abstractmethod
+    """
+    Abstract base class for data ingestors.
+    `suffixes` / `mime_types` declare the files an ingestor is registered for.
+    Parser libraries should be imported inside the methods that use them, so that
+    importing an ingestor stays cheap.
+    """
+    suffixes: Tuple[str, ...] = ()
+    mime_types: Tuple[str, ...] = ()
+    # Tabular ingestors whose iter_batches / iter_column_batches accept `columns` and
+    # `row_filter` and apply them while reading
+    supports_pushdown = False
+
     def can_handle(self, file_path: Path) -> bool:
         """Returns True if this ingestor can handle the file type."""
-        pass
+        return file_path.suffix.lower() in self.suffixes
 
     @abc.abstractmethod
     def ingest(self, file_path: Path) -> Dict[str, Any]:
@@ -22,66 +53,682 @@ class BaseIngestor(abc.ABC):
         """
         pass
 
+    def iter_batches(self, file_path: Path, metadata: Dict[str, Any], batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[Any]:
+        """
+        Yields the content in batches, filling `metadata` in as it goes.
+        Ingestors that cannot stream yield their whole content as a single batch.
+        """
+        result = self.ingest(file_path)
+        metadata.update(result["metadata"])
+        yield result["content"]
+
+class IngestionStream:
+    """
+    Single-pass iterable over the content batches of one file.
+    `metadata` is filled in while batches are consumed and is complete once iteration ends.
+    """
+    def __init__(
+        self,
+        ingestor: BaseIngestor,
+        file_path: Path,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        columnar: bool = False,
+        columns: Optional[Sequence[str]] = None,
+        row_filter: Optional[RowFilter] = None,
+    ):
+        self.file_path = file_path
+        self.metadata: Dict[str, Any] = {}
+        pushdown = {}
+        if columns is not None or row_filter is not None:
+            if not ingestor.supports_pushdown:
+                raise ValueError(f"Column / row filters are not supported for file: {file_path.name}")
+            pushdown = {"columns": columns, "row_filter": row_filter}
+        if columnar:
+            if not hasattr(ingestor, "iter_column_batches"):
+                raise ValueError(f"Columnar output is not supported for file: {file_path.name}")
+            self._batches = ingestor.iter_column_batches(file_path, self.metadata, batch_size, **pushdown)
+        else:
+            self._batches = ingestor.iter_batches(file_path, self.metadata, batch_size, **pushdown)
+
+    def __iter__(self) -> Iterator[Any]:
+        return self._batches
+
+class TeeReader:
+    """Binary reader that passes every chunk read through it on to sink.update()."""
+    def __init__(self, raw: BinaryIO, sink):
+        self.raw = raw
+        self.sink = sink
+
+    def readinto(self, view) -> int:
+        got = self.raw.readinto(view)
+        if got:
+            self.sink.update(memoryview(view)[:got])
+        return got
+
+class TextStats:
+    """
+    Incremental text metadata over raw UTF-8 bytes: character count (a UTF-8 sequence
+    split across chunks is carried over by an incremental decoder), byte count, line
+    count and SHA-256. Invalid UTF-8 raises UnicodeDecodeError, like a full read would.
+    """
+    def __init__(self):
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.hasher = hashlib.sha256()
+        self.chars = 0
+        self.bytes = 0
+        self.newlines = 0
+        self.ends_with_newline = True
+
+    def update(self, chunk) -> str:
+        """Accounts for the next chunk of bytes; returns the text it completes."""
+        text = self.decoder.decode(chunk)
+        self.hasher.update(chunk)
+        self.chars += len(text)
+        self.bytes += len(chunk)
+        self.newlines += text.count("\n")
+        if text:
+            self.ends_with_newline = text.endswith("\n")
+        return text
+
+    def finish(self, metadata: Dict[str, Any]):
+        """Checks the input ended on a character boundary and writes the totals to metadata."""
+        self.decoder.decode(b"", final=True)
+        metadata.update({
+            "type": "text",
+            "size": self.chars,
+            "bytes": self.bytes,
+            "line_count": self.newlines + (0 if self.ends_with_newline else 1),
+            "sha256": self.hasher.hexdigest(),
+        })
+
 class TextIngestor(BaseIngestor):
-    def can_handle(self, file_path: Path) -> bool:
-        return file_path.suffix.lower() == ".txt"
+    """
+    Plain UTF-8 text. iter_batches reads the file in windows of window_size bytes into a
+    reusable buffer and yields the decoded text of each, so memory stays constant however
+    large the file; batch_size does not apply. Metadata (size in characters, bytes,
+    line_count, sha256) is computed along the way.
+    """
+    suffixes = (".txt",)
+    mime_types = ("text/plain",)
+
+    def __init__(self, window_size: int = DEFAULT_TEXT_WINDOW):
+        self.window_size = window_size
 
     def ingest(self, file_path: Path) -> Dict[str, Any]:
-        with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read()
+        metadata: Dict[str, Any] = {}
+        content = "".join(self.iter_batches(file_path, metadata))
         return {
             "content": content,
-            "metadata": {"type": "text", "size": len(content)}
+            "metadata": metadata
         }
 
+    def iter_batches(self, file_path: Path, metadata: Dict[str, Any], batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[str]:
+        stats = TextStats()
+        buf = memoryview(bytearray(self.window_size))
+        with open(file_path, "rb") as f:
+            while got := f.readinto(buf):
+                text = stats.update(buf[:got])
+                if text:
+                    yield text
+        stats.finish(metadata)
+
+    def encrypt(self, file_path: Path, output_path: Path, security: "AegisSecurity", metadata: Dict[str, Any]):
+        """
+        Encrypts the file with AegisSecurity.encrypt_stream, computing the text metadata
+        from the same reads: one pass over the file with memory bounded by the chunk size.
+        """
+        stats = TextStats()
+        with open(file_path, "rb") as src, open(output_path, "wb") as dst:
+            security.encrypt_stream(TeeReader(src, stats), dst, os.fstat(src.fileno()).st_size)
+        stats.finish(metadata)
+
+def _read_columns(
+    header: Sequence[str],
+    columns: Optional[Sequence[str]],
+    row_filter: Optional[RowFilter],
+) -> Tuple[List[str], List[Tuple[int, str]]]:
+    """
+    Output columns (header order) and the (index, name) pairs a reader has to decode:
+    the output columns plus any the row filter needs.
+    """
+    output = [name for name in header if columns is None or name in columns]
+    needed = set(output) | (row_filter.columns if row_filter is not None else set())
+    return output, [(i, name) for i, name in enumerate(header) if name in needed]
+
+def _batched(rows: Iterable[Any], batch_size: int, metadata: Dict[str, Any]) -> Iterator[List[Any]]:
+    """Groups rows into lists of at most batch_size, counting them in metadata["row_count"]."""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            metadata["row_count"] += len(batch)
+            yield batch
+            batch = []
+    if batch:
+        metadata["row_count"] += len(batch)
+        yield batch
+
 class CSVIngestor(BaseIngestor):
-    def can_handle(self, file_path: Path) -> bool:
-        return file_path.suffix.lower() == ".csv"
+    """
+    CSV with a header row. With `columns` / `row_filter`, only the cells of output and
+    filter columns are turned into values, rows failing the filter are dropped before
+    batching, and filter-only columns are removed again.
+    """
+    suffixes = (".csv",)
+    mime_types = ("text/csv",)
+    supports_pushdown = True
 
     def ingest(self, file_path: Path) -> Dict[str, Any]:
+        metadata: Dict[str, Any] = {}
         rows = []
-        with open(file_path, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            fieldnames = reader.fieldnames or []
-            for row in reader:
-                rows.append(row)
+        for batch in self.iter_batches(file_path, metadata):
+            rows.extend(batch)
         
         return {
             "content": rows, # List of dicts
-            "metadata": {
+            "metadata": metadata
+        }
+
+    def iter_batches(
+        self,
+        file_path: Path,
+        metadata: Dict[str, Any],
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        columns: Optional[Sequence[str]] = None,
+        row_filter: Optional[RowFilter] = None,
+    ) -> Iterator[List[Dict[str, str]]]:
+        """Yields lists of at most batch_size row dicts; only one batch is held in memory."""
+        with open(file_path, "r", encoding="utf-8", newline="") as f:
+            if columns is None and row_filter is None:
+                reader = csv.DictReader(f)
+                metadata.update({
+                    "type": "csv",
+                    "row_count": 0,
+                    "columns": reader.fieldnames or []
+                })
+                yield from _batched(reader, batch_size, metadata)
+                return
+
+            reader = csv.reader(f)
+            output, read = _read_columns(next(reader, []), columns, row_filter)
+            metadata.update({
+                "type": "csv",
+                "row_count": 0,
+                "columns": output
+            })
+
+            def rows():
+                for values in reader:
+                    if not values:
+                        continue
+                    row = {name: values[i] if i < len(values) else None for i, name in read}
+                    if row_filter is not None:
+                        if not row_filter.matches(row):
+                            continue
+                        row = {name: row[name] for name in output}
+                    yield row
+
+            yield from _batched(rows(), batch_size, metadata)
+
+    def iter_column_batches(
+        self,
+        file_path: Path,
+        metadata: Dict[str, Any],
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        dtypes: Optional[Dict[str, str]] = None,
+        columns: Optional[Sequence[str]] = None,
+        row_filter: Optional[RowFilter] = None,
+    ) -> Iterator["ColumnBatch"]:
+        """
+        Yields ColumnBatch objects (typed NumPy arrays per column, dictionary-encoded
+        strings) instead of row dicts. Column types are inferred per batch unless pinned
+        via dtypes ({"age": "int64", ...}); metadata["dtypes"] records the first batch's.
+        Columns outside `columns` are never converted into arrays.
+        """
+        from .columnar import build_column_batch
+
+        with open(file_path, "r", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            output, read = _read_columns(header, columns, row_filter)
+            metadata.update({
                 "type": "csv",
-                "row_count": len(rows),
-                "columns": fieldnames
-            }
+                "row_count": 0,
+                "columns": output
+            })
+            width = len(header)
+            # Indexes of the output columns within a row (None: the row is used as is)
+            keep = [i for i, name in read if name in set(output)] if len(output) < width else None
+            rows = []
+            while True:
+                for row in reader:
+                    if not row:
+                        continue
+                    # Pad/truncate ragged rows like DictReader does
+                    if len(row) != width:
+                        row = (row + [""] * width)[:width]
+                    if row_filter is not None and not row_filter.matches({name: row[i] for i, name in read}):
+                        continue
+                    rows.append(row if keep is None else [row[i] for i in keep])
+                    if len(rows) >= batch_size:
+                        break
+                if not rows:
+                    break
+                batch = build_column_batch(output, rows, dtypes)
+                metadata["row_count"] += len(rows)
+                metadata.setdefault("dtypes", {name: batch.dtype(name) for name in output})
+                rows = []
+                yield batch
+
+class JSONLIngestor(BaseIngestor):
+    """
+    JSON Lines: one JSON object per line, rows are the top-level objects. With `columns`
+    / `row_filter`, rows failing the filter are dropped and only allowed keys are kept
+    before a row is batched (the json module still has to scan each whole line).
+    """
+    suffixes = (".jsonl", ".ndjson")
+    mime_types = ("application/x-ndjson", "application/jsonl")
+    supports_pushdown = True
+
+    def ingest(self, file_path: Path) -> Dict[str, Any]:
+        metadata: Dict[str, Any] = {}
+        rows = []
+        for batch in self.iter_batches(file_path, metadata):
+            rows.extend(batch)
+        return {
+            "content": rows,
+            "metadata": metadata
+        }
+
+    def iter_batches(
+        self,
+        file_path: Path,
+        metadata: Dict[str, Any],
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        columns: Optional[Sequence[str]] = None,
+        row_filter: Optional[RowFilter] = None,
+    ) -> Iterator[List[Dict[str, Any]]]:
+        metadata.update({
+            "type": "jsonl",
+            "row_count": 0,
+            "columns": []
+        })
+        seen_columns: Dict[str, None] = {}
+        allowed = set(columns) if columns is not None else None
+
+        def rows(f):
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError(f"{file_path.name}:{line_number}: expected a JSON object")
+                if row_filter is not None and not row_filter.matches(row):
+                    continue
+                if allowed is not None:
+                    row = {k: v for k, v in row.items() if k in allowed}
+                for key in row:
+                    if key not in seen_columns:
+                        seen_columns[key] = None
+                        metadata["columns"].append(key)
+                yield row
+
+        with open(file_path, "r", encoding="utf-8") as f:
+            yield from _batched(rows(f), batch_size, metadata)
+
+class ParquetIngestor(BaseIngestor):
+    """
+    Parquet via pyarrow datasets (optional dependency, imported on first use). Column
+    projection and the row filter are pushed into the scan: only the column chunks of
+    allowed and filter columns are read and decoded, and row groups whose statistics
+    rule out the filter are skipped without being read. A filter that compares a
+    column with a literal of another type (see RowFilter.pushable) is evaluated on the
+    scanned rows instead, with the same coercion as the CSV and JSON readers.
+    """
+    suffixes = (".parquet", ".pq")
+    mime_types = ("application/vnd.apache.parquet",)
+    supports_pushdown = True
+
+    def ingest(self, file_path: Path) -> Dict[str, Any]:
+        metadata: Dict[str, Any] = {}
+        rows = []
+        for batch in self.iter_batches(file_path, metadata):
+            rows.extend(batch)
+        return {
+            "content": rows,
+            "metadata": metadata
         }
 
+    def _scan(
+        self,
+        file_path: Path,
+        metadata: Dict[str, Any],
+        batch_size: int,
+        columns: Optional[Sequence[str]],
+        row_filter: Optional[RowFilter],
+    ):
+        """Yields pyarrow RecordBatches holding only the output columns."""
+        import pyarrow.dataset as ds
+
+        dataset = ds.dataset(str(file_path), format="parquet")
+        names = dataset.schema.names
+        output, read = _read_columns(names, columns, row_filter)
+        metadata.update({
+            "type": "parquet",
+            "row_count": 0,
+            "columns": output,
+            "source_rows": dataset.count_rows()
+        })
+        pushdown = row_filter is not None and row_filter.pushable(dataset.schema)
+        scanner = dataset.scanner(
+            columns=[name for _, name in read],
+            filter=row_filter.to_arrow(names) if pushdown else None,
+            batch_size=batch_size,
+        )
+        for record_batch in scanner.to_batches():
+            if row_filter is not None and not pushdown and record_batch.num_rows:
+                filter_columns = [name for name in record_batch.schema.names if name in row_filter.columns]
+                rows = record_batch.select(filter_columns).to_pylist()
+                record_batch = record_batch.filter([row_filter.matches(row) for row in rows])
+            if record_batch.num_rows:
+                metadata["row_count"] += record_batch.num_rows
+                yield record_batch.select(output)
+
+    def iter_batches(
+        self,
+        file_path: Path,
+        metadata: Dict[str, Any],
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        columns: Optional[Sequence[str]] = None,
+        row_filter: Optional[RowFilter] = None,
+    ) -> Iterator[List[Dict[str, Any]]]:
+        for record_batch in self._scan(file_path, metadata, batch_size, columns, row_filter):
+            yield record_batch.to_pylist()
+
+    def iter_column_batches(
+        self,
+        file_path: Path,
+        metadata: Dict[str, Any],
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        columns: Optional[Sequence[str]] = None,
+        row_filter: Optional[RowFilter] = None,
+    ) -> Iterator["ColumnBatch"]:
+        """ColumnBatch per scanned batch; string columns are dictionary-encoded like CSV's."""
+        from .columnar import from_arrow
+
+        for record_batch in self._scan(file_path, metadata, batch_size, columns, row_filter):
+            batch = from_arrow(record_batch)
+            metadata.setdefault("dtypes", {name: batch.dtype(name) for name in batch.column_names})
+            yield batch
+
+def _extract_page_range(file_path: str, start: int, stop: int) -> List[Tuple[int, Optional[str], Optional[str]]]:
+    """Worker task: extracts pages [start, stop) of one PDF, isolating failures per page."""
+    from pypdf import PdfReader
+    reader = PdfReader(file_path)
+    results = []
+    for index in range(start, stop):
+        try:
+            results.append((index, reader.pages[index].extract_text(), None))
+        except Exception as e:
+            results.append((index, None, f"{type(e).__name__}: {e}"))
+    return results
+
+def _register_worker(pids):
+    """PDF pool worker initializer: reports the worker's pid, so a hung pool can be killed."""
+    pids.put(os.getpid())
+
 class PDFIngestor(BaseIngestor):
-    def can_handle(self, file_path: Path) -> bool:
-        return file_path.suffix.lower() == ".pdf"
+    """
+    Extracts page text, in parallel across a process pool for large documents.
+    Pages are handed out in ranges of pages_per_task (each worker parses the file once per
+    range) and streamed back in page order. A page that fails to extract is recorded in
+    metadata["failed_pages"] and contributes empty text; max_pages caps the pages read and
+    timeout (seconds per document) stops extraction with the pages finished so far; the
+    pool's workers are then killed (a worker stuck in a page cannot be cancelled) and a
+    new pool is started. Page ranges of other documents that the kill (or a crashing
+    worker) interrupted are run again in the new pool.
+    """
+    suffixes = (".pdf",)
+    mime_types = ("application/pdf",)
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        max_pages: Optional[int] = None,
+        timeout: Optional[float] = None,
+        pages_per_task: int = 8,
+        parallel_threshold: int = 16,
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pages = max_pages
+        self.timeout = timeout
+        self.pages_per_task = pages_per_task
+        self.parallel_threshold = parallel_threshold
+        self._pool: Optional["ProcessPoolExecutor"] = None
+        # iter_pages runs on several pipeline threads at once
+        self._pool_lock = threading.Lock()
+        # Per pool: the queue its workers report their pids to
+        self._worker_pids: Dict["ProcessPoolExecutor", Any] = {}
 
     def ingest(self, file_path: Path) -> Dict[str, Any]:
-        reader = PdfReader(str(file_path))
-        text_content = []
-        for page in reader.pages:
-            text_content.append(page.extract_text())
+        metadata: Dict[str, Any] = {}
+        text_content = [text for _, text in self.iter_pages(file_path, metadata)]
         
         full_text = "\n".join(text_content)
         return {
             "content": full_text,
-            "metadata": {
-                "type": "pdf",
-                "page_count": len(reader.pages)
-            }
+            "metadata": metadata
         }
 
+    def iter_batches(self, file_path: Path, metadata: Dict[str, Any], batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[List[str]]:
+        """Yields lists of at most batch_size page texts, in page order."""
+        batch = []
+        for _, text in self.iter_pages(file_path, metadata):
+            batch.append(text)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def iter_pages(self, file_path: Path, metadata: Dict[str, Any]) -> Iterator[Tuple[int, str]]:
+        """Yields (page index, text) in page order as soon as each page is available."""
+        from pypdf import PdfReader
+        reader = PdfReader(str(file_path))
+        page_count = len(reader.pages)
+        limit = page_count if self.max_pages is None else min(page_count, self.max_pages)
+        metadata.update({
+            "type": "pdf",
+            "page_count": page_count
+        })
+        if limit < page_count:
+            metadata["extracted_pages"] = limit
+
+        deadline = time.monotonic() + self.timeout if self.timeout is not None else None
+        if self.workers > 1 and limit >= self.parallel_threshold:
+            results = self._extract_parallel(file_path, limit, deadline)
+        else:
+            results = self._extract_serial(reader, limit, deadline)
+
+        done = 0
+        try:
+            for index, text, error in results:
+                if error is not None:
+                    metadata.setdefault("failed_pages", []).append({"page": index, "error": error})
+                    text = ""
+                done += 1
+                yield index, text or ""
+        except FutureTimeoutError:
+            # Partial result: everything up to the last page finished before the deadline
+            metadata["timed_out"] = True
+            metadata["extracted_pages"] = done
+
+    def _extract_serial(self, reader: "PdfReader", limit: int, deadline: Optional[float]):
+        for index in range(limit):
+            if deadline is not None and time.monotonic() > deadline:
+                raise FutureTimeoutError()
+            try:
+                yield index, reader.pages[index].extract_text(), None
+            except Exception as e:
+                yield index, None, f"{type(e).__name__}: {e}"
+
+    def _get_pool(self) -> "ProcessPoolExecutor":
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        with self._pool_lock:
+            if self._pool is None:
+                context = multiprocessing.get_context()
+                pids = context.SimpleQueue()
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=context, initializer=_register_worker, initargs=(pids,)
+                )
+                self._worker_pids[self._pool] = pids
+            return self._pool
+
+    def _discard_pool(self, pool: "ProcessPoolExecutor", kill: bool = False):
+        """Drops `pool` (if still current) so the next document starts a new one; kill terminates its workers."""
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+            pids = self._worker_pids.pop(pool, None)
+        if kill and pids is not None:
+            while not pids.empty():
+                try:
+                    os.kill(pids.get(), signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _extract_parallel(self, file_path: Path, limit: int, deadline: Optional[float]):
+        from concurrent.futures.process import BrokenProcessPool
+
+        pool = self._get_pool()
+        ranges = [(start, min(start + self.pages_per_task, limit)) for start in range(0, limit, self.pages_per_task)]
+        futures = [pool.submit(_extract_page_range, str(file_path), start, stop) for start, stop in ranges]
+        pools = [pool] * len(ranges)
+        attempts = [1] * len(ranges)
+
+        timed_out = False
+        try:
+            for i, (start, stop) in enumerate(ranges):
+                while True:
+                    remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                    try:
+                        results = futures[i].result(timeout=remaining)
+                    except FutureTimeoutError:
+                        timed_out = True
+                        raise
+                    except (BrokenProcessPool, CancelledError) as e:
+                        # Cancelled here means another document discarded the pool
+                        if attempts[i] >= PDF_RANGE_ATTEMPTS:
+                            results = [(index, None, f"{type(e).__name__}: {e}") for index in range(start, stop)]
+                        else:
+                            # Rerun this and every later range the dead pool still held in a new one
+                            broken = pools[i]
+                            self._discard_pool(broken)
+                            pool = self._get_pool()
+                            for j in range(i, len(ranges)):
+                                future = futures[j]
+                                if pools[j] is broken and (
+                                    j == i or not future.done() or future.cancelled() or future.exception() is not None
+                                ):
+                                    futures[j] = pool.submit(_extract_page_range, str(file_path), *ranges[j])
+                                    pools[j] = pool
+                                    attempts[j] += 1
+                            continue
+                    except Exception as e:
+                        results = [(index, None, f"{type(e).__name__}: {e}") for index in range(start, stop)]
+                    break
+                yield from results
+        finally:
+            # Don't spend workers on pages nobody will read (timeout or early exit)
+            for future in futures:
+                future.cancel()
+            if timed_out:
+                for hung in {owner for owner, future in zip(pools, futures) if future.running()}:
+                    self._discard_pool(hung, kill=True)
+
+    def close(self):
+        """Shuts down the worker pool, if one was started."""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+            if pool is not None:
+                self._worker_pids.pop(pool, None)
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
 class IngestionManager:
-    """Factory to select the right ingestor."""
-    def __init__(self):
-        self.ingestors = [TextIngestor(), CSVIngestor(), PDFIngestor()]
+    """
+    Factory to select the right ingestor, by suffix / MIME type through an
+    IngestorRegistry (built-ins plus installed "aegis_core.ingestors" entry points).
+    """
+    def __init__(self, registry: Optional["IngestorRegistry"] = None):
+        if registry is None:
+            from .registry import default_registry
+            registry = default_registry()
+        self.registry = registry
+
+    def register(self, ingestor, suffixes: Optional[Iterable[str]] = None, mime_types: Optional[Iterable[str]] = None):
+        """Adds (or replaces) the ingestor for suffixes; see IngestorRegistry.register."""
+        self.registry.register(ingestor, suffixes, mime_types)
+
+    def _ingestor_for(self, file_path: Path) -> BaseIngestor:
+        ingestor = self.registry.get(file_path)
+        if ingestor is None:
+            raise ValueError(f"No ingestor found for file: {file_path.name}")
+        return ingestor
+
+    def can_ingest(self, file_path: Path) -> bool:
+        return self.registry.get(file_path) is not None
 
     def ingest_file(self, file_path: Path) -> Dict[str, Any]:
-        for ingestor in self.ingestors:
-            if ingestor.can_handle(file_path):
-                return ingestor.ingest(file_path)
-        
-        raise ValueError(f"No ingestor found for file: {file_path.name}")
+        return self._ingestor_for(file_path).ingest(file_path)
+
+    def stream_file(
+        self,
+        file_path: Path,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        columnar: bool = False,
+        policy: Optional["ConsentPolicy"] = None,
+    ) -> IngestionStream:
+        """
+        Streaming counterpart of ingest_file: iterate the result for content batches
+        (row dicts for CSV) so memory stays bounded by batch_size regardless of file size.
+        Each batch can go straight to ComplianceEngine.enforce_minimization or
+        AegisSecurity.encrypt_batch. With columnar=True, CSV batches are ColumnBatch objects.
+        With a policy, its allowed_columns and row_filter are applied by the reader itself
+        (tabular formats only), so disallowed columns are never materialized.
+        """
+        columns, row_filter = minimization_pushdown(policy.data_minimization_rules) if policy is not None else (None, None)
+        return IngestionStream(self._ingestor_for(file_path), file_path, batch_size, columnar, columns, row_filter)
+
+    async def ingest_many(
+        self,
+        paths: Iterable[Path],
+        security: "AegisSecurity",
+        out_dir: Path,
+        root: Optional[Path] = None,
+        **options,
+    ) -> Dict[str, int]:
+        """
+        Extracts, encrypts into out_dir and records a StoredDocument row for every path.
+        Outputs keep each file's path relative to root (default: just its name) plus
+        ".enc". Re-running over the same paths only re-reads files whose size or mtime
+        changed, and content that is already stored is not encrypted or extracted twice.
+        Options configure IngestionPipeline: session_factory, extract_workers,
+        encrypt_workers, queue_size, insert_batch, chunk_size, tags, hash_algorithm,
+        on_duplicate and progress. Returns the number of files per outcome.
+        """
+        from .pipeline import IngestionPipeline
+
+        def named(paths):
+            for path in paths:
+                path = Path(path)
+                yield path, path.relative_to(root) if root is not None else path.name
+
+        return await IngestionPipeline(self, security, out_dir, **options).run(named(paths))
+
+    async def ingest_directory(self, root: Path, security: "AegisSecurity", out_dir: Path, **options) -> Dict[str, int]:
+        """ingest_many over every file under root, walked lazily; unsupported extensions are counted and skipped."""
+        from .pipeline import walk_files
+        return await self.ingest_many(walk_files(root), security, out_dir, root=Path(root), **options)
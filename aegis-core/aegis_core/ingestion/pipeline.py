@@ -0,0 +1,496 @@
+import os
+import json
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from ..crypto.security import AegisSecurity, DEFAULT_CHUNK_SIZE
+from ..database.models import StoredDocument
+from .handlers import TeeReader
+
+if TYPE_CHECKING:
+    from .handlers import IngestionManager
+
+DEFAULT_QUEUE_SIZE = 256
+DEFAULT_INSERT_BATCH = 500
+DEFAULT_HASH_ALGORITHM = "sha256"
+
+# What to do with a new file whose content is already stored
+SKIP_DUPLICATES = "skip"    # record nothing; the file is hashed again on the next run
+LINK_DUPLICATES = "link"    # record a row without its own encrypted copy (file_path NULL)
+
+
+class IngestResult(NamedTuple):
+    """
+    Per-file outcome of IngestionManager.ingest_many / ingest_directory. status is one of
+    ingested, updated, unchanged, duplicate, unsupported or failed.
+    """
+    source: Path
+    output: Optional[Path] = None
+    file_hash: Optional[str] = None
+    metadata: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    status: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class _StoredState(NamedTuple):
+    """What the database knows about a source path from the previous run."""
+    id: int
+    size: Optional[int]
+    mtime_ns: Optional[int]
+    file_hash: Optional[str]
+
+
+class _Job:
+    """One file moving through the pipeline stages."""
+
+    def __init__(self, source: Path, output: Path, stored: Optional[_StoredState]):
+        self.source = source
+        self.source_path = os.path.abspath(source)
+        self.output = output
+        self.tmp_output = output.with_name(output.name + ".tmp")
+        self.stored = stored
+        self.size: Optional[int] = None
+        self.mtime_ns: Optional[int] = None
+        self.file_hash: Optional[str] = None
+        self.metadata: Optional[Dict[str, Any]] = None
+
+    def result(self, **fields) -> IngestResult:
+        return IngestResult(self.source, self.output, self.file_hash, self.metadata, **fields)
+
+
+def walk_files(root: Path) -> Iterator[Path]:
+    """Lazily yields every regular file under root (no list of the whole tree is built)."""
+    stack = [Path(root)]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(Path(entry.path))
+                elif entry.is_file(follow_symlinks=False):
+                    yield Path(entry.path)
+
+
+class IngestionPipeline:
+    """
+    Bulk ingestion: scan -> encrypt + hash -> deduplicate -> extract -> batched write of
+    StoredDocument rows.
+
+    The scan looks up `insert_batch` source paths per query; a file whose size and
+    mtime match its stored row is not read at all. Everything else is encrypted, and
+    hashed from the same reads, into a temporary output. A file whose hash matches its
+    stored row only gets its stat refreshed; new content already stored under another
+    path (this run or the file_hash index) is a duplicate, handled per `on_duplicate`,
+    and never extracted; a linked duplicate of a file claimed this run is held until
+    that file's row is committed, and fails with it. A file whose output path is
+    already stored for another row fails without touching that output. Remaining files
+    are extracted and their output moved into place; changed files update their
+    existing row.
+
+    Encryption and extraction run `*_workers` concurrent tasks on thread pools (AES-GCM
+    and file I/O release the GIL, large PDFs fan out to PDFIngestor's process pool),
+    connected by queues of at most `queue_size` files, so a slow stage throttles the
+    ones before it instead of letting work pile up in memory. Any failure is confined to
+    its file (or, for a database error, to its insert batch): it is reported as failed,
+    its output removed, and the run continues. Should a stage task itself die, the others
+    are cancelled and run() raises its error instead of waiting on a queue nobody drains.
+    """
+
+    def __init__(
+        self,
+        manager: "IngestionManager",
+        security: AegisSecurity,
+        out_dir: Path,
+        session_factory=None,
+        extract_workers: Optional[int] = None,
+        encrypt_workers: Optional[int] = None,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        insert_batch: int = DEFAULT_INSERT_BATCH,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        tags: str = "",
+        hash_algorithm: str = DEFAULT_HASH_ALGORITHM,
+        on_duplicate: str = LINK_DUPLICATES,
+        progress: Optional[Callable[[IngestResult, Dict[str, int]], None]] = None,
+    ):
+        if session_factory is None:
+            from ..database.connection import AsyncSessionLocal
+            session_factory = AsyncSessionLocal
+        if on_duplicate not in (SKIP_DUPLICATES, LINK_DUPLICATES):
+            raise ValueError(f"on_duplicate must be {SKIP_DUPLICATES!r} or {LINK_DUPLICATES!r}")
+        hashlib.new(hash_algorithm)  # fail fast on an unknown algorithm
+        self.manager = manager
+        self.security = security
+        self.out_dir = Path(out_dir)
+        self.session_factory = session_factory
+        self.extract_workers = extract_workers or os.cpu_count() or 1
+        self.encrypt_workers = encrypt_workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.insert_batch = insert_batch
+        self.chunk_size = chunk_size
+        self.tags = tags
+        self.hash_algorithm = hash_algorithm
+        self.on_duplicate = on_duplicate
+        self.progress = progress
+
+    async def run(self, files: Iterable[Tuple[Path, Path]]) -> Dict[str, int]:
+        """
+        Ingests (source, relative output name) pairs. Returns counts per status (see
+        IngestResult); per-file details go to the progress callback.
+        """
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.counts = {status: 0 for status in ("ingested", "updated", "unchanged", "duplicate", "unsupported", "failed")}
+        # Content hash -> encrypted path of every file stored (or claimed) during this run
+        self._stored_hashes: Dict[str, str] = {}
+        # Hash claimed this run whose row is not committed yet -> linked duplicates waiting on it
+        self._held: Dict[str, List[_Job]] = {}
+        # Rows whose source changed this run: their stored content may be replaced
+        self._changing_ids = set()
+        to_encrypt: asyncio.Queue = asyncio.Queue(self.queue_size)
+        to_dedup: asyncio.Queue = asyncio.Queue(self.queue_size)
+        to_extract: asyncio.Queue = asyncio.Queue(self.queue_size)
+        to_write: asyncio.Queue = asyncio.Queue(self.queue_size)
+
+        encrypt_pool = ThreadPoolExecutor(self.encrypt_workers, thread_name_prefix="aegis-encrypt")
+        extract_pool = ThreadPoolExecutor(self.extract_workers, thread_name_prefix="aegis-extract")
+        try:
+            encryptors = [asyncio.create_task(self._encrypt_stage(to_encrypt, to_dedup, to_write, encrypt_pool))
+                          for _ in range(self.encrypt_workers)]
+            deduplicator = asyncio.create_task(self._dedup_stage(to_dedup, to_extract, to_write))
+            extractors = [asyncio.create_task(self._extract_stage(to_extract, to_write, extract_pool))
+                          for _ in range(self.extract_workers)]
+            writer = asyncio.create_task(self._write_stage(to_write))
+
+            async def feed():
+                pending: List[Tuple[Path, Path]] = []
+                seen_outputs = set()
+                for source, name in files:
+                    if not self.manager.can_ingest(source):
+                        self._report(IngestResult(source, error="unsupported"), "unsupported")
+                        continue
+                    output = self.out_dir / (str(name) + ".enc")
+                    if output in seen_outputs:
+                        self._report(IngestResult(source, error=f"duplicate output {output}"), "failed")
+                        continue
+                    seen_outputs.add(output)
+                    pending.append((source, output))
+                    if len(pending) >= self.insert_batch:
+                        await self._scan(pending, to_encrypt)
+                        pending = []
+                if pending:
+                    await self._scan(pending, to_encrypt)
+
+                await self._close_stage(to_encrypt, encryptors)
+                await self._close_stage(to_dedup, [deduplicator])
+                await self._close_stage(to_extract, extractors)
+                await to_write.put(None)
+                await writer
+
+            await self._supervise([asyncio.create_task(feed()), *encryptors, deduplicator, *extractors, writer])
+        finally:
+            encrypt_pool.shutdown()
+            extract_pool.shutdown()
+        return self.counts
+
+    @staticmethod
+    async def _supervise(tasks: List[asyncio.Task]):
+        """Waits for all tasks; the first to fail cancels the rest and its error is raised."""
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if not task.cancelled() and task.exception() is not None:
+                    raise task.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    @staticmethod
+    async def _close_stage(queue: asyncio.Queue, tasks: List[asyncio.Task]):
+        for _ in tasks:
+            await queue.put(None)
+        await asyncio.gather(*tasks)
+
+    def _report(self, result: IngestResult, status: str):
+        self.counts[status] += 1
+        if status == "failed":
+            print(f"Failed to ingest {result.source}: {result.error}")
+        if self.progress is not None:
+            self.progress(result._replace(status=status), self.counts)
+
+    def _fail(self, job: _Job, e: Exception, remove_output: bool = False):
+        for path in (job.tmp_output, job.output) if remove_output else (job.tmp_output,):
+            if path.exists():
+                os.remove(path)
+        self._report(IngestResult(job.source, error=f"{type(e).__name__}: {e}"), "failed")
+
+    async def _scan(self, batch: List[Tuple[Path, Path]], outbox: asyncio.Queue):
+        """Skips files whose size and mtime match their stored row; queues the rest for encryption."""
+        source_paths = [os.path.abspath(source) for source, _ in batch]
+        async with self.session_factory() as session:
+            rows = await session.execute(
+                select(
+                    StoredDocument.source_path, StoredDocument.id, StoredDocument.source_size,
+                    StoredDocument.source_mtime_ns, StoredDocument.file_hash,
+                ).where(StoredDocument.source_path.in_(source_paths))
+            )
+            stored = {row[0]: _StoredState(*row[1:]) for row in rows}
+
+        for (source, output), source_path in zip(batch, source_paths):
+            state = stored.get(source_path)
+            if state is not None:
+                try:
+                    st = os.stat(source)
+                except OSError as e:
+                    self._report(IngestResult(source, error=f"{type(e).__name__}: {e}"), "failed")
+                    continue
+                if (st.st_size, st.st_mtime_ns) == (state.size, state.mtime_ns):
+                    self._report(IngestResult(source, output, state.file_hash), "unchanged")
+                    continue
+                self._changing_ids.add(state.id)
+            # Blocks while the encrypt queue is full (back-pressure on the directory walk)
+            await outbox.put(_Job(source, output, state))
+
+    async def _encrypt_stage(self, inbox: asyncio.Queue, to_dedup: asyncio.Queue, to_write: asyncio.Queue, pool: ThreadPoolExecutor):
+        loop = asyncio.get_running_loop()
+        while (job := await inbox.get()) is not None:
+            try:
+                await loop.run_in_executor(pool, self._encrypt, job)
+            except Exception as e:
+                self._fail(job, e)
+                continue
+
+            if job.stored is not None and job.stored.file_hash == job.file_hash:
+                # Touched but not modified: refresh the stat, keep the stored output
+                os.remove(job.tmp_output)
+                await to_write.put(("unchanged", job))
+                continue
+            await to_dedup.put(job)
+
+    def _encrypt(self, job: _Job):
+        """Encrypts the source into the temporary output, hashing the plaintext from the same reads."""
+        job.output.parent.mkdir(parents=True, exist_ok=True)
+        hasher = hashlib.new(self.hash_algorithm)
+        with open(job.source, "rb") as src, open(job.tmp_output, "wb") as dst:
+            st = os.fstat(src.fileno())
+            self.security.encrypt_stream(TeeReader(src, hasher), dst, st.st_size, self.chunk_size)
+        job.size, job.mtime_ns = st.st_size, st.st_mtime_ns
+        job.file_hash = hasher.hexdigest()
+
+    async def _dedup_stage(self, inbox: asyncio.Queue, to_extract: asyncio.Queue, to_write: asyncio.Queue):
+        """
+        Single task, so claiming a hash for this run never races another file with the
+        same content. Takes whatever has queued up (at most insert_batch files) and
+        resolves the whole batch against the file_hash index in one query.
+        """
+        done = False
+        while not done:
+            job = await inbox.get()
+            if job is None:
+                break
+            batch = [job]
+            while len(batch) < self.insert_batch and not inbox.empty():
+                job = inbox.get_nowait()
+                if job is None:
+                    done = True
+                    break
+                batch.append(job)
+            try:
+                routed = await self._dedup(batch)
+            except Exception as e:
+                for job in batch:
+                    self._fail(job, e)
+                continue
+            for status, job in routed:
+                if status is None:
+                    await to_extract.put(job)
+                elif status == "conflict":
+                    self._fail(job, FileExistsError(f"{job.output} is stored for another document"))
+                elif status == "duplicate" and self.on_duplicate == SKIP_DUPLICATES:
+                    self._report(job.result(), status)
+                else:
+                    await to_write.put((status, job))
+
+    async def _dedup(self, batch: List[_Job]) -> List[Tuple[Optional[str], _Job]]:
+        """
+        New files whose content is already stored (by this run or in the file_hash index)
+        become duplicates; the rest claim their hash and go on to extraction (status None).
+        A changed file about to overwrite content that linked duplicates depend on first
+        hands its old output to one of them. A file whose output path belongs to another
+        row is a conflict: it must not replace that row's output.
+        """
+        lookup = {job.file_hash for job in batch if job.stored is None and job.file_hash not in self._stored_hashes}
+        replaced = {job.stored.file_hash for job in batch if job.stored is not None}
+        async with self.session_factory() as session:
+            stored: Dict[str, str] = {}
+            if lookup:
+                rows = await session.execute(
+                    select(StoredDocument.id, StoredDocument.file_hash, StoredDocument.file_path)
+                    .where(StoredDocument.file_hash.in_(lookup), StoredDocument.file_path.is_not(None))
+                )
+                for doc_id, file_hash, file_path in rows:
+                    # A row being re-ingested this run may be about to hold different content
+                    if doc_id not in self._changing_ids:
+                        stored.setdefault(file_hash, file_path)
+            linked: Dict[str, List[int]] = {}
+            if replaced:
+                rows = await session.execute(
+                    select(StoredDocument.id, StoredDocument.file_hash)
+                    .where(StoredDocument.file_hash.in_(replaced), StoredDocument.file_path.is_(None))
+                    .order_by(StoredDocument.id)
+                )
+                for doc_id, file_hash in rows:
+                    linked.setdefault(file_hash, []).append(doc_id)
+            rows = await session.execute(
+                select(StoredDocument.file_path, StoredDocument.id)
+                .where(StoredDocument.file_path.in_([str(job.output) for job in batch]))
+            )
+            owners = dict(rows.all())
+
+            routed = []
+            promotions = []
+            for job in batch:
+                owner = owners.get(str(job.output))
+                if owner is not None and (job.stored is None or owner != job.stored.id):
+                    routed.append(("conflict", job))
+                    continue
+                if job.stored is not None:
+                    promotions.extend(self._preserve_linked_content(job, linked.pop(job.stored.file_hash, [])))
+                    routed.append((None, job))
+                    continue
+                canonical = self._stored_hashes.get(job.file_hash) or stored.get(job.file_hash)
+                if canonical is None:
+                    self._stored_hashes[job.file_hash] = str(job.output)
+                    self._held[job.file_hash] = []
+                    routed.append((None, job))
+                    continue
+                self._stored_hashes[job.file_hash] = canonical
+                os.remove(job.tmp_output)
+                job.output = None
+                job.metadata = {"duplicate_of": canonical}
+                held = self._held.get(job.file_hash)
+                if held is not None and self.on_duplicate == LINK_DUPLICATES:
+                    # Its link must not be stored before (or without) the canonical row
+                    held.append(job)
+                    continue
+                routed.append(("duplicate", job))
+            if promotions:
+                await session.execute(update(StoredDocument), promotions)
+                await session.commit()
+        return routed
+
+    def _preserve_linked_content(self, job: _Job, linked: List[int]) -> List[Dict[str, Any]]:
+        """Renames the old output of a changed file if linked rows need it; returns their row updates."""
+        if not linked or not job.output.exists():
+            return []
+        preserved = str(job.output.with_name(f"{job.output.name}.{job.stored.file_hash[:16]}"))
+        os.replace(job.output, preserved)
+        if self._stored_hashes.get(job.stored.file_hash) == str(job.output):
+            self._stored_hashes[job.stored.file_hash] = preserved
+        return [{"id": linked[0], "file_path": preserved}] + [
+            {"id": doc_id, "meta_info": json.dumps({"duplicate_of": preserved})} for doc_id in linked[1:]
+        ]
+
+    async def _extract_stage(self, inbox: asyncio.Queue, outbox: asyncio.Queue, pool: ThreadPoolExecutor):
+        loop = asyncio.get_running_loop()
+        while (job := await inbox.get()) is not None:
+            try:
+                job.metadata = await loop.run_in_executor(pool, self._extract, job.source)
+                os.replace(job.tmp_output, job.output)
+            except Exception as e:
+                self._fail(job, e)
+                self._drop_claim(job, f"{type(e).__name__}: {e}")
+                continue
+            await outbox.put(("ingested" if job.stored is None else "updated", job))
+
+    def _extract(self, source: Path) -> Dict[str, Any]:
+        # Only the metadata is kept, so drain the stream rather than materialize the content
+        stream = self.manager.stream_file(source)
+        for _ in stream:
+            pass
+        return stream.metadata
+
+    def _drop_claim(self, job: _Job, error: str):
+        """Releases the hash a failed new file claimed; the duplicates held for its row fail too."""
+        if job.output is None or self._stored_hashes.get(job.file_hash) != str(job.output):
+            return
+        del self._stored_hashes[job.file_hash]
+        for duplicate in self._held.pop(job.file_hash, []):
+            self._report(duplicate.result(error=f"duplicate of {job.source}, which failed: {error}"), "failed")
+
+    async def _write_stage(self, inbox: asyncio.Queue):
+        # Each write returns the duplicates its committed rows released; they go in the next batch
+        batch: List[Tuple[str, _Job]] = []
+        while (item := await inbox.get()) is not None:
+            batch.append(item)
+            if len(batch) >= self.insert_batch:
+                batch = await self._write(batch)
+        while batch:
+            batch = await self._write(batch)
+
+    def _row(self, status: str, job: _Job) -> Dict[str, Any]:
+        row = {"source_size": job.size, "source_mtime_ns": job.mtime_ns}
+        if status == "unchanged":
+            return row
+        row.update({
+            "filename": job.source.name,
+            "file_path": str(job.output) if job.output is not None else None,
+            "file_hash": job.file_hash,
+            "tags": self.tags,
+            "meta_info": json.dumps(job.metadata),
+        })
+        if status in ("ingested", "duplicate"):
+            row["source_path"] = job.source_path
+        return row
+
+    async def _execute(self, session, batch: List[Tuple[str, _Job]]):
+        inserts = [self._row(status, job) for status, job in batch if job.stored is None]
+        updates = [dict(self._row(status, job), id=job.stored.id) for status, job in batch if job.stored is not None]
+        if inserts:
+            await session.execute(insert(StoredDocument), inserts)
+        if updates:
+            # Bulk UPDATE by primary key: one executemany
+            await session.execute(update(StoredDocument), updates)
+        await session.commit()
+
+    async def _write(self, batch: List[Tuple[str, _Job]]) -> List[Tuple[str, _Job]]:
+        """Writes a batch of rows; returns the held duplicates of the new files it committed."""
+        try:
+            async with self.session_factory() as session:
+                await self._execute(session, batch)
+        except IntegrityError as e:
+            if len(batch) > 1:
+                # One bad row (e.g. a file_path already stored) must not sink the batch
+                released = []
+                for item in batch:
+                    released.extend(await self._write([item]))
+                return released
+            self._write_failed(batch, f"IntegrityError: {e.orig}")
+            return []
+        except Exception as e:
+            self._write_failed(batch, f"{type(e).__name__}: {e}")
+            return []
+        released = []
+        for status, job in batch:
+            self._report(job.result(), status)
+            if status == "ingested":
+                released.extend(("duplicate", duplicate) for duplicate in self._held.pop(job.file_hash, []))
+        return released
+
+    def _write_failed(self, batch: List[Tuple[str, _Job]], error: str):
+        """Reports unwritten files as failed, removing the outputs new files had moved into place."""
+        for status, job in batch:
+            if status == "ingested":
+                self._drop_claim(job, error)
+                if job.output.exists():
+                    os.remove(job.output)
+                job.output = None
+            self._report(job.result(error=error), "failed")
@@ -0,0 +1,121 @@
+import mimetypes
+import threading
+from functools import lru_cache
+from importlib import import_module
+from importlib.metadata import entry_points
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Type, Union
+
+from .handlers import BaseIngestor, CSVIngestor, JSONLIngestor, ParquetIngestor, PDFIngestor, TextIngestor
+
+# Third-party packages register ingestors under this entry point group, one entry per
+# suffix, e.g. in pyproject.toml:
+#   [project.entry-points."aegis_core.ingestors"]
+#   ".parquet" = "aegis_parquet:ParquetIngestor"
+ENTRY_POINT_GROUP = "aegis_core.ingestors"
+
+BUILTIN_INGESTORS: Tuple[Type[BaseIngestor], ...] = (TextIngestor, CSVIngestor, PDFIngestor, JSONLIngestor, ParquetIngestor)
+
+# Something that produces an ingestor: an instance, a class / zero-argument factory, or a
+# "module:attr" reference that is only imported when a matching file is first seen.
+IngestorSource = Union[BaseIngestor, Callable[[], BaseIngestor], str]
+
+
+def _normalize_suffix(suffix: str) -> str:
+    suffix = suffix.lower()
+    return suffix if suffix.startswith(".") else "." + suffix
+
+
+@lru_cache(maxsize=None)
+def _entry_point_ingestors(group: str) -> Tuple[Tuple[str, str], ...]:
+    """(suffix, "module:attr") for every installed entry point in group; scanned once per process."""
+    return tuple((_normalize_suffix(ep.name), ep.value) for ep in entry_points(group=group))
+
+
+class _Slot:
+    """One registered ingestor, constructed on first use and then shared by its suffixes."""
+
+    def __init__(self, source: IngestorSource):
+        self.source = source
+        self._instance: Optional[BaseIngestor] = source if isinstance(source, BaseIngestor) else None
+        self._lock = threading.Lock()
+
+    def get(self) -> BaseIngestor:
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    factory = self.source
+                    if isinstance(factory, str):
+                        module, _, attr = factory.partition(":")
+                        factory = getattr(import_module(module), attr)
+                    self._instance = factory()
+        return self._instance
+
+    @property
+    def loaded(self) -> bool:
+        return self._instance is not None
+
+
+class IngestorRegistry:
+    """
+    Maps file suffixes and MIME types to ingestors: one dict lookup per file instead of
+    asking every ingestor in turn. Ingestors are constructed, and their modules imported,
+    the first time a file they handle comes along, so a worker that only sees text
+    never pays for a PDF parser. Later registrations for a suffix replace earlier ones.
+    """
+
+    def __init__(self):
+        self._by_suffix: Dict[str, _Slot] = {}
+        self._by_mime: Dict[str, _Slot] = {}
+
+    def register(
+        self,
+        source: IngestorSource,
+        suffixes: Optional[Iterable[str]] = None,
+        mime_types: Optional[Iterable[str]] = None,
+    ):
+        """
+        Registers an ingestor for the given suffixes / MIME types, which default to the
+        `suffixes` / `mime_types` attributes of an ingestor instance or class.
+        """
+        if suffixes is None:
+            suffixes = getattr(source, "suffixes", ())
+        if mime_types is None:
+            mime_types = getattr(source, "mime_types", ())
+        slot = _Slot(source)
+        for suffix in suffixes:
+            self._by_suffix[_normalize_suffix(suffix)] = slot
+        for mime_type in mime_types:
+            self._by_mime[mime_type] = slot
+
+    def load_entry_points(self, group: str = ENTRY_POINT_GROUP):
+        """Registers installed third-party ingestors without importing them."""
+        for suffix, reference in _entry_point_ingestors(group):
+            self.register(reference, suffixes=[suffix], mime_types=[])
+
+    def get(self, file_path: Path) -> Optional[BaseIngestor]:
+        """The ingestor for file_path by suffix, falling back to its guessed MIME type; None if unsupported."""
+        slot = self._by_suffix.get(Path(file_path).suffix.lower())
+        if slot is None and self._by_mime:
+            mime_type, _ = mimetypes.guess_type(str(file_path), strict=False)
+            slot = self._by_mime.get(mime_type)
+        return slot.get() if slot is not None else None
+
+    @property
+    def suffixes(self) -> List[str]:
+        return sorted(self._by_suffix)
+
+    def loaded(self) -> List[BaseIngestor]:
+        """Ingestors that have been constructed so far."""
+        slots = {id(slot): slot for slot in (*self._by_suffix.values(), *self._by_mime.values())}
+        return [slot.get() for slot in slots.values() if slot.loaded]
+
+
+def default_registry(discover: bool = True) -> IngestorRegistry:
+    """Built-in ingestors, overridden / extended by installed entry points."""
+    registry = IngestorRegistry()
+    for ingestor_cls in BUILTIN_INGESTORS:
+        registry.register(ingestor_cls)
+    if discover:
+        registry.load_entry_points()
+    return registry
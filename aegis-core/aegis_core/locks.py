@@ -0,0 +1,36 @@
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, mutual exclusion across processes is on the caller
+    fcntl = None
+
+
+class FileLockedError(RuntimeError):
+    """A non-blocking lock_file() found the lock held by another process (or context)."""
+
+
+def lock_file(lock_path: Path, blocking: bool = True) -> BinaryIO:
+    """
+    Opens (creating it if needed) and exclusively locks `lock_path`; the lock is held
+    until the returned file is closed. With blocking=False a held lock raises
+    FileLockedError instead of waiting.
+    """
+    lock = open(lock_path, "a+b")
+    if fcntl is not None:
+        try:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError as e:
+            lock.close()
+            raise FileLockedError(f"{os.fspath(lock_path)} is locked") from e
+    return lock
+
+
+@contextmanager
+def file_lock(lock_path: Path) -> Iterator[None]:
+    """Holds the exclusive lock on `lock_path` for the duration of the with block."""
+    with lock_file(lock_path):
+        yield
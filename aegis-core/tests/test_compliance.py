@@ -0,0 +1,367 @@
+import asyncio
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from pathlib import Path
+from datetime import datetime, timedelta
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from aegis_core.compliance.archive import AuditArchive, AuditChainError
+from aegis_core.compliance.audit import ASYNC, GROUP_COMMIT, SYNC, AuditSink
+from aegis_core.compliance.engine import ComplianceEngine
+from aegis_core.compliance.filters import compile_minimization
+from aegis_core.compliance.report import compliance_summary
+from aegis_core.compliance.policy_index import policy_index
+from aegis_core.database.models import AuditLog, AuditRollup, Base, ConsentPolicy
+from aegis_core.ingestion.columnar import ColumnBatch, build_column_batch
+
+class TestComplianceEngine(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session_factory = sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+        self.db = self.session_factory()
+        policy_index.invalidate()
+
+        self.policy_queries = 0
+        self.audit_inserts = 0
+        def count(conn, cursor, statement, *args):
+            if statement.lstrip().startswith("SELECT") and "consent_policies" in statement:
+                self.policy_queries += 1
+            if statement.lstrip().startswith("INSERT INTO audit_records"):
+                self.audit_inserts += 1
+        event.listen(self.engine.sync_engine, "before_cursor_execute", count)
+
+        self.db.add_all([
+            ConsentPolicy(
+                entity_id="health_corp", name="Medical Training", allowed_actions="TRAIN_MODEL,STATISTICS",
+                target_tags="medical,research", revoked=False,
+                regulation_mapping=json.dumps({"GDPR": ["Art.6(1)(a)"]}),
+            ),
+            ConsentPolicy(
+                entity_id="health_corp", name="Expired", allowed_actions="EXPORT", target_tags="medical",
+                revoked=False, expiry=datetime.utcnow() - timedelta(days=1),
+            ),
+        ])
+        await self.db.commit()
+
+    async def asyncTearDown(self):
+        await self.db.close()
+        await self.engine.dispose()
+        policy_index.invalidate()
+
+    async def test_decisions_match_policy_rules(self):
+        compliance = ComplianceEngine(self.db)
+        self.assertTrue(await compliance.check_consent("health_corp", "TRAIN_MODEL", ["medical"]))
+        self.assertTrue(await compliance.check_consent("health_corp", "STATISTICS", ["medical", "research"]))
+        self.assertFalse(await compliance.check_consent("health_corp", "TRAIN_MODEL", ["finance"]))
+        self.assertFalse(await compliance.check_consent("health_corp", "EXPORT", ["medical"]))  # expired
+        self.assertFalse(await compliance.check_consent("unknown", "TRAIN_MODEL", ["medical"]))
+
+        logs = (await self.db.execute(select(AuditLog).order_by(AuditLog.id))).scalars().all()
+        self.assertEqual([log.verdict for log in logs], ["ALLOWED", "ALLOWED", "DENIED", "DENIED", "DENIED"])
+        self.assertEqual(json.loads(logs[0].compliance_check_details), {"regulations": {"GDPR": ["Art.6(1)(a)"]}})
+        self.assertIsNotNone(logs[0].policy_id)
+
+    async def test_policies_are_queried_once_per_entity(self):
+        compliance = ComplianceEngine(self.db)
+        for _ in range(20):
+            await compliance.check_consent("health_corp", "TRAIN_MODEL", ["medical"])
+            await compliance.check_consent("nobody", "TRAIN_MODEL", ["medical"])
+        self.assertEqual(self.policy_queries, 2)
+
+        entry = policy_index.cached("health_corp")
+        self.assertEqual(entry.match("STATISTICS", frozenset(["research"])).tags, frozenset(["medical", "research"]))
+
+    async def test_committed_changes_invalidate(self):
+        compliance = ComplianceEngine(self.db)
+        self.assertFalse(await compliance.check_consent("fin_corp", "STATISTICS", ["finance"]))
+
+        async with self.session_factory() as other:
+            policy = ConsentPolicy(entity_id="fin_corp", allowed_actions="STATISTICS", target_tags="finance", revoked=False)
+            other.add(policy)
+            await other.commit()
+            self.assertTrue(await compliance.check_consent("fin_corp", "STATISTICS", ["finance"]))
+
+            policy.allowed_actions = "TRAIN_MODEL"
+            await other.commit()
+            self.assertFalse(await compliance.check_consent("fin_corp", "STATISTICS", ["finance"]))
+            self.assertTrue(await compliance.check_consent("fin_corp", "TRAIN_MODEL", ["finance"]))
+
+            policy.revoked = True
+            await other.commit()
+        self.assertFalse(await compliance.check_consent("fin_corp", "TRAIN_MODEL", ["finance"]))
+
+    async def test_revocation_during_a_load_is_not_lost(self):
+        compliance = ComplianceEngine(self.db)
+        selected, resume = asyncio.Event(), asyncio.Event()
+        execute = self.db.execute
+        async def paused_execute(*args, **kwargs):
+            result = await execute(*args, **kwargs)
+            selected.set()
+            await resume.wait()
+            return result
+
+        with mock.patch.object(self.db, "execute", paused_execute):
+            stale = asyncio.ensure_future(policy_index.get(self.db, "health_corp"))
+            await selected.wait()
+        async with self.session_factory() as other:
+            policy = (await other.execute(select(ConsentPolicy).where(ConsentPolicy.name == "Medical Training"))).scalar_one()
+            policy.revoked = True
+            await other.commit()
+        # Issued after the revocation: must not join the load that read the old state
+        revoked_check = asyncio.ensure_future(compliance.check_consent("health_corp", "TRAIN_MODEL", ["medical"]))
+        await asyncio.sleep(0)
+        resume.set()
+        await stale
+        self.assertFalse(await revoked_check)
+        self.assertFalse(await compliance.check_consent("health_corp", "TRAIN_MODEL", ["medical"]))
+
+    async def test_entry_expires_with_its_policy(self):
+        self.db.add(ConsentPolicy(
+            entity_id="lab", allowed_actions="TRAIN_MODEL", target_tags="genomics", revoked=False,
+            expiry=datetime.utcnow() + timedelta(hours=1),
+        ))
+        await self.db.commit()
+        entry = await policy_index.get(self.db, "lab")
+        now = entry.loaded_at
+        self.assertIsNotNone(entry.match("TRAIN_MODEL", ["genomics"], now=now))
+        self.assertIsNone(entry.match("TRAIN_MODEL", ["genomics"], now=now + 7200))
+        self.assertIsNone(policy_index.cached("lab", now=now + 7200))
+
+    async def _audit_rows(self):
+        async with self.session_factory() as session:
+            return (await session.execute(select(AuditLog).order_by(AuditLog.id))).scalars().all()
+
+    async def test_group_commit_shares_transactions(self):
+        async with AuditSink(self.session_factory, mode=GROUP_COMMIT, max_batch=500) as sink:
+            compliance = ComplianceEngine(self.db, audit=sink)
+            verdicts = await asyncio.gather(*(
+                compliance.check_consent("health_corp", "TRAIN_MODEL", ["medical" if i % 2 else "finance"])
+                for i in range(1000)
+            ))
+            # Every check returned only after its record was committed
+            self.assertEqual(sink.written, 1000)
+        self.assertEqual(verdicts.count(True), 500)
+        self.assertLessEqual(self.audit_inserts, 3)
+        self.assertEqual(self.policy_queries, 1)  # concurrent cache misses share one load
+        rows = await self._audit_rows()
+        self.assertEqual(len(rows), 1000)
+        self.assertEqual(sum(row.verdict == "ALLOWED" for row in rows), 500)
+
+    async def test_async_mode_flushes_on_close(self):
+        sink = AuditSink(self.session_factory, mode=ASYNC, flush_interval=60)
+        compliance = ComplianceEngine(self.db, audit=sink)
+        for _ in range(10):
+            await compliance.check_consent("health_corp", "TRAIN_MODEL", ["medical"])
+        self.assertEqual(len(await self._audit_rows()), 0)
+        await sink.flush()
+        self.assertEqual(len(await self._audit_rows()), 10)
+        await compliance.check_consent("health_corp", "TRAIN_MODEL", ["medical"])
+        await sink.close()
+        self.assertEqual(len(await self._audit_rows()), 11)
+        with self.assertRaises(RuntimeError):
+            await sink.submit(AuditSink.record("a", "b", "c", "DENIED"))
+
+    async def test_sync_mode_and_failed_batches(self):
+        async with AuditSink(self.session_factory, mode=SYNC) as sink:
+            await sink.submit(AuditSink.record("a", "LOGIN", "x", "ALLOWED"))
+        self.assertEqual(self.audit_inserts, 1)
+        self.assertEqual(len(await self._audit_rows()), 1)
+
+        async with AuditSink(self.session_factory, mode=GROUP_COMMIT) as sink:
+            bad = AuditSink.record("a", "LOGIN", "x", "ALLOWED")
+            bad["policy_id"] = object()  # not bindable: the whole batch fails
+            with self.assertRaises(Exception):
+                await asyncio.gather(sink.submit(bad), sink.submit(AuditSink.record("b", "LOGIN", "y", "DENIED")))
+            self.assertEqual(sink.failed, 2)
+
+        with self.assertRaises(ValueError):
+            AuditSink(self.session_factory, mode="eventually")
+
+    async def test_check_consent_many(self):
+        self.db.add_all([
+            ConsentPolicy(entity_id=f"site_{i}", allowed_actions="TRAIN_MODEL", target_tags="medical", revoked=(i % 3 == 0))
+            for i in range(300)
+        ])
+        await self.db.commit()
+        requests = [(f"site_{i}", "TRAIN_MODEL", ["medical"]) for i in range(300)]
+        requests += [("health_corp", "STATISTICS", ["research"]), ("health_corp", "EXPORT", ["medical"]), ("nobody", "TRAIN_MODEL", [])]
+
+        async with AuditSink(self.session_factory) as sink:
+            verdicts = await ComplianceEngine(self.db, audit=sink).check_consent_many(requests)
+        self.assertEqual(verdicts, [i % 3 != 0 for i in range(300)] + [True, False, False])
+        self.assertEqual(self.policy_queries, 1)
+        self.assertEqual(self.audit_inserts, 1)
+
+        rows = await self._audit_rows()
+        self.assertEqual([(row.actor_id, row.verdict) for row in rows],
+                         [(entity_id, "ALLOWED" if ok else "DENIED") for (entity_id, _, _), ok in zip(requests, verdicts)])
+
+        # Same decisions without a sink, now from the cache
+        policy_queries = self.policy_queries
+        self.assertEqual(await ComplianceEngine(self.db).check_consent_many(requests), verdicts)
+        self.assertEqual(self.policy_queries, policy_queries)
+        self.assertEqual(len(await self._audit_rows()), 2 * len(requests))
+
+    async def test_rollups_follow_every_write_path(self):
+        async with self.session_factory() as session:
+            session.add(AuditLog(actor_id="x", action_type="LOGIN", verdict="DENIED",
+                                 timestamp=datetime.utcnow() - timedelta(days=3)))
+            await session.commit()
+        async with AuditSink(self.session_factory) as sink:
+            compliance = ComplianceEngine(self.db, audit=sink)
+            await compliance.check_consent("health_corp", "TRAIN_MODEL", ["medical"])
+            await compliance.check_consent_many([("health_corp", "EXPORT", ["medical"])] * 3)
+        compliance = ComplianceEngine(self.db)
+        await compliance.check_consent("health_corp", "TRAIN_MODEL", ["finance"])
+        await compliance.check_consent("health_corp", "STATISTICS", ["research"])
+
+        async with self.session_factory() as session:
+            rollups = {(r.action_type, r.verdict): r.count for r in (await session.execute(select(AuditRollup))).scalars()}
+            summary = await compliance_summary(session)
+        self.assertEqual(rollups, {("LOGIN", "DENIED"): 1, ("TRAIN_MODEL", "ALLOWED"): 1, ("EXPORT", "DENIED"): 3,
+                                   ("TRAIN_MODEL", "DENIED"): 1, ("STATISTICS", "ALLOWED"): 1})
+        self.assertEqual(summary["verdicts"], {"ALLOWED": 2, "DENIED": 5})
+        self.assertEqual(summary["attempts"], 7)
+        self.assertEqual(summary["last_24h"], {"ALLOWED": 2, "DENIED": 4})
+        self.assertEqual(summary["policies"], {"total": 2, "active": 2, "gdpr_mapped": 1})
+        self.assertEqual([d["action_type"] for d in summary["recent_denials"]], ["LOGIN", "EXPORT", "EXPORT", "EXPORT", "TRAIN_MODEL"])
+        self.assertEqual(len((await compliance_summary(self.db, recent_limit=2))["recent_denials"]), 2)
+
+class TestMinimization(unittest.TestCase):
+    def setUp(self):
+        self.engine = ComplianceEngine(None)
+        self.policy = ConsentPolicy(data_minimization_rules=json.dumps({
+            "allowed_columns": ["age", "diagnosis"],
+            "row_filter": "age >= 40 and country != 'US' or diagnosis == 'flu' and score < 0.5",
+        }))
+        countries = ["DE", "US", "FR", ""]
+        self.raw = [
+            [str(20 + i % 50), countries[i % 4], ["flu", "cold"][i % 2], "" if i % 7 == 0 else str((i % 10) / 10)]
+            for i in range(1000)
+        ]
+        self.names = ["age", "country", "diagnosis", "score"]
+
+    def test_rows_and_batches_agree(self):
+        rows = [dict(zip(self.names, values)) for values in self.raw]
+        expected = [{"age": r["age"], "diagnosis": r["diagnosis"]} for r in rows
+                    if (float(r["age"]) >= 40 and r["country"] != "US")
+                    or (r["diagnosis"] == "flu" and r["score"] != "" and float(r["score"]) < 0.5)]
+
+        self.assertEqual(self.engine.enforce_minimization(rows, self.policy), expected)
+        streamed = self.engine.enforce_minimization(iter(rows), self.policy)
+        self.assertNotIsInstance(streamed, list)
+        self.assertEqual(list(streamed), expected)
+
+        batch = self.engine.enforce_minimization(build_column_batch(self.names, self.raw), self.policy)
+        self.assertIsInstance(batch, ColumnBatch)
+        self.assertEqual(batch.column_names, ["age", "diagnosis"])
+        self.assertEqual([(str(r["age"]), r["diagnosis"]) for r in batch.to_rows()],
+                         [(r["age"], r["diagnosis"]) for r in expected])
+
+        # Empty numeric cells: NaN in the batch, missing (only equal to null) in both
+        raw = [[""], ["30"], ["17"]]
+        for expression, kept in (("age != 18", ["30", "17"]), ("age < 20", ["17"]),
+                                 ("age == null", [""]), ("age != null", ["30", "17"])):
+            policy = ConsentPolicy(data_minimization_rules=json.dumps({"row_filter": expression}))
+            rows = self.engine.enforce_minimization([{"age": value} for value, in raw], policy)
+            self.assertEqual([r["age"] for r in rows], kept, expression)
+            batch = self.engine.enforce_minimization(build_column_batch(["age"], raw), policy)
+            self.assertEqual(batch.num_rows, len(kept), expression)
+
+    def test_rules_compiled_once_and_fail_closed(self):
+        rules = self.policy.data_minimization_rules
+        self.assertIs(compile_minimization(rules), compile_minimization(rules))
+        self.assertTrue(compile_minimization(None).is_noop)
+
+        broken = ConsentPolicy(data_minimization_rules="{not json")
+        self.assertEqual(self.engine.enforce_minimization([{"age": 1}], broken), [])
+        self.assertEqual(len(self.engine.enforce_minimization(build_column_batch(self.names, self.raw), broken)), 0)
+        bad_filter = ConsentPolicy(data_minimization_rules=json.dumps({"row_filter": "age >"}))
+        self.assertEqual(self.engine.enforce_minimization([{"age": 1}], bad_filter), [])
+
+class TestAuditArchive(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session_factory = sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+        self.archive_dir = Path(tempfile.mkdtemp())
+        self.now = datetime(2026, 3, 10, 12, 0)
+        async with AuditSink(self.session_factory, mode=SYNC) as sink:
+            await sink.submit_many([
+                AuditSink.record(f"actor_{i}", "TRAIN_MODEL", "tags:medical", "DENIED" if i % 4 == 0 else "ALLOWED",
+                                 timestamp=self.now - timedelta(hours=7 * i))
+                for i in range(100)  # ~29 days back
+            ])
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+        shutil.rmtree(self.archive_dir)
+
+    async def _hot_rows(self):
+        async with self.session_factory() as session:
+            return (await session.execute(select(AuditLog).order_by(AuditLog.id))).scalars().all()
+
+    async def test_seal_moves_old_days_into_chained_segments(self):
+        before = {row.id: row for row in await self._hot_rows()}
+        archive = AuditArchive(self.archive_dir, hot_days=7)
+        added = await archive.seal(self.session_factory, now=self.now)
+
+        cutoff = datetime(2026, 3, 3)
+        hot = await self._hot_rows()
+        self.assertTrue(hot and all(row.timestamp >= cutoff for row in hot))
+        sealed = list(archive.read())
+        self.assertEqual(len(sealed) + len(hot), 100)
+        self.assertTrue(all(record["timestamp"] < cutoff for record in sealed))
+        self.assertEqual(sealed[0]["actor_id"], before[sealed[0]["id"]].actor_id)
+        self.assertEqual(len(added), len({record["timestamp"].date() for record in sealed}))
+        self.assertEqual(archive.verify(), len(added))
+        self.assertEqual(await archive.seal(self.session_factory, now=self.now), [])
+
+        # Tampering with a segment or the manifest breaks the chain
+        segment = self.archive_dir / added[0]["segment"]
+        original = segment.read_bytes()
+        segment.write_bytes(original[:-1] + bytes([original[-1] ^ 1]))
+        with self.assertRaises(AuditChainError):
+            archive.verify()
+        segment.write_bytes(original)
+        manifest = archive.manifest_path.read_text().splitlines()
+        archive.manifest_path.write_text("\n".join(manifest[1:]) + "\n")
+        with self.assertRaises(AuditChainError):
+            archive.verify()
+
+    async def test_retention_expires_segments_but_keeps_the_chain(self):
+        archive = AuditArchive(self.archive_dir, hot_days=7, retention_days=20)
+        await archive.seal(self.session_factory, now=self.now)
+        self.assertFalse(any(record["timestamp"] < datetime(2026, 2, 18) for record in archive.read()))
+        expired = [e for e in archive.entries() if e["type"] == "expire"]
+        self.assertTrue(expired)
+        self.assertFalse(any((self.archive_dir / e["segment"]).exists() for e in expired))
+        self.assertEqual(archive.verify(), len(archive.entries()))
+
+    async def test_audit_records_are_append_only(self):
+        async with self.session_factory() as session:
+            row = (await session.execute(select(AuditLog).limit(1))).scalar_one()
+            row.verdict = "ALLOWED" if row.verdict == "DENIED" else "DENIED"
+            with self.assertRaises(PermissionError):
+                await session.commit()
+
+    async def test_recent_window_reads_one_index_range(self):
+        async with self.engine.connect() as conn:
+            window = (await conn.exec_driver_sql(
+                "EXPLAIN QUERY PLAN SELECT actor_id, verdict FROM audit_records WHERE timestamp >= '2026-03-09 12:00:00'"
+            )).all()
+            per_verdict = (await conn.exec_driver_sql(
+                "EXPLAIN QUERY PLAN SELECT count(*) FROM audit_records WHERE verdict = 'DENIED' AND timestamp >= '2026-03-09 12:00:00'"
+            )).all()
+        self.assertIn("INDEX ix_audit_records_timestamp_verdict_actor (timestamp>?)", window[0][-1])
+        self.assertIn("INDEX ix_audit_records_verdict_timestamp (verdict=? AND timestamp>?)", per_verdict[0][-1])
+
+if __name__ == '__main__':
+    unittest.main()
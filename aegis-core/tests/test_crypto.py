@@ -1,8 +1,18 @@
+import base64
+import csv
+import io
+import mmap
 import os
+import stat
+import tracemalloc
 import unittest
 import shutil
+from unittest import mock
 from pathlib import Path
-from aegis_core.crypto.security import AegisSecurity
+from aegis_core.crypto.keys import KeyProvider, key_provider
+from aegis_core.crypto.nonces import NonceExhaustedError, NonceSequence
+from aegis_core.crypto.security import AegisSecurity, RecordBatch, STREAM_HEADER_SIZE, STREAM_MAGIC, TAG_SIZE
+from aegis_core.compliance.shredder import KeyShredder
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
 class TestAegisSecurity(unittest.TestCase):
@@ -14,6 +24,7 @@ class TestAegisSecurity(unittest.TestCase):
         # Ensure clean state
         if self.key_path.exists():
             os.remove(self.key_path)
+        key_provider.invalidate()
 
     def tearDown(self):
         shutil.rmtree(self.test_dir)
@@ -30,6 +41,71 @@ class TestAegisSecurity(unittest.TestCase):
         sec2 = AegisSecurity(key_path=str(self.key_path), use_keyring=False)
         self.assertEqual(sec.key, sec2.key)
 
+    def test_key_material_is_cached_and_shared(self):
+        sec = AegisSecurity(key_path=str(self.key_path), use_keyring=False)
+
+        # A second context is served from the cache, not from storage
+        os.remove(self.key_path)
+        sec2 = AegisSecurity(key_path=str(self.key_path), use_keyring=False)
+        self.assertEqual(sec.key, sec2.key)
+        self.assertIs(sec.aesgcm, sec2.aesgcm)
+        self.assertFalse(self.key_path.exists())
+
+        # Invalidation forces a reload (here: a fresh key, as the file is gone)
+        key_provider.invalidate(self.key_path)
+        sec3 = AegisSecurity(key_path=str(self.key_path), use_keyring=False)
+        self.assertNotEqual(sec.key, sec3.key)
+
+    def test_key_cache_ttl_and_shredding(self):
+        provider = KeyProvider(ttl=0)
+        sec = AegisSecurity(key_path=str(self.key_path), use_keyring=False, provider=provider)
+        sec2 = AegisSecurity(key_path=str(self.key_path), use_keyring=False, provider=provider)
+        self.assertIsNot(sec.aesgcm, sec2.aesgcm)  # expired immediately, reloaded from file
+        self.assertEqual(sec.key, sec2.key)
+
+        AegisSecurity(key_path=str(self.key_path), use_keyring=False)
+        with mock.patch("aegis_core.compliance.shredder.keyring"):
+            KeyShredder.shred_master_key(str(self.key_path))
+        self.assertFalse(self.key_path.exists())
+        sec3 = AegisSecurity(key_path=str(self.key_path), use_keyring=False)
+        self.assertNotEqual(sec.key, sec3.key)
+
+    def test_rotation_seen_by_other_contexts(self):
+        sec = AegisSecurity(key_path=str(self.key_path), use_keyring=False)
+        other = AegisSecurity(key_path=str(self.key_path), use_keyring=False, provider=KeyProvider())
+        input_file = self.test_dir / "input.bin"
+        enc_file = self.test_dir / "enc.bin"
+        output_file = self.test_dir / "output.bin"
+
+        input_file.write_bytes(b"rotated elsewhere")
+        sec.rotate_master_key()
+        sec.encrypt_file(input_file, enc_file)
+
+        # `other` still caches version 1 only; an unknown key id triggers a reload
+        other.decrypt_file(enc_file, output_file)
+        self.assertEqual(output_file.read_bytes(), b"rotated elsewhere")
+        self.assertEqual(other.key_id, 2)
+
+    def test_rotation_from_two_contexts(self):
+        sec = AegisSecurity(key_path=str(self.key_path), use_keyring=False)
+        # A separate provider per context, as in another process
+        other = AegisSecurity(key_path=str(self.key_path), use_keyring=False, provider=KeyProvider())
+        input_file = self.test_dir / "input.bin"
+        input_file.write_bytes(b"rotated twice")
+
+        sec.rotate_master_key()
+        sec.encrypt_file(input_file, self.test_dir / "a.enc")
+        # `other` only knows version 1: its rotation must come after version 2, not replace it
+        other.rotate_master_key()
+        other.encrypt_file(input_file, self.test_dir / "b.enc")
+        self.assertEqual(other.key_id, 3)
+
+        for context in (sec, other, AegisSecurity(key_path=str(self.key_path), use_keyring=False, provider=KeyProvider())):
+            for name in ("a.enc", "b.enc"):
+                output_file = self.test_dir / "output.bin"
+                context.decrypt_file(self.test_dir / name, output_file)
+                self.assertEqual(output_file.read_bytes(), b"rotated twice")
+
     def test_encryption_decryption(self):
         sec = AegisSecurity(key_path=str(self.key_path), use_keyring=False)
         data = b"Hello, World! This is a secret."
@@ -42,6 +118,95 @@ class TestAegisSecurity(unittest.TestCase):
         decrypted = sec.decrypt_data(encrypted)
         self.assertEqual(data, decrypted)
 
+    def test_counter_nonces(self):
+        state = self.test_dir / "nonces.json"
+        sec = AegisSecurity(key_path=str(self.key_path), use_keyring=False, nonce_state=str(state))
+
+        tokens = [sec.encrypt_data(b"row %d" % i) for i in range(3)]
+        nonces = [t[:12] for t in tokens]
+        self.assertEqual(len({n[:4] for n in nonces}), 1)
+        self.assertEqual([int.from_bytes(n[4:], "big") for n in nonces], [0, 1, 2])
+        self.assertEqual(sec.decrypt_data(tokens[2]), b"row 2")
+
+        # The state file is exclusively held by one live context
+        with self.assertRaises(RuntimeError):
+            NonceSequence(state)
+        sec.nonces.close()
+
+        # After a restart the counter resumes past the whole reserved block
+        sec2 = AegisSecurity(key_path=str(self.key_path), use_keyring=False, nonce_state=str(state))
+        nonce = sec2.encrypt_data(b"after restart")[:12]
+        self.assertEqual(nonce[:4], nonces[0][:4])
+        self.assertGreaterEqual(int.from_bytes(nonce[4:], "big"), sec2.nonces.block_size)
+
+        # Rotation starts a fresh prefix and counter under the new key
+        sec2.rotate_master_key()
+        nonce = sec2.encrypt_data(b"new key")[:12]
+        self.assertNotEqual(nonce[:4], nonces[0][:4])
+        self.assertEqual(int.from_bytes(nonce[4:], "big"), 0)
+        sec2.nonces.close()
+
+    def test_counter_nonce_limit_forces_rekey(self):
+        seq = NonceSequence(self.test_dir / "nonces.json", block_size=2, limit=3)
+        for _ in range(3):
+            seq.next(1)
+        with self.assertRaises(NonceExhaustedError):
+            seq.next(1)
+        self.assertEqual(seq.next(2)[4:], bytes(8))
+        seq.close()
+
+    def test_counter_reservation_is_durable(self):
+        synced = []
+        real_fsync = os.fsync
+        def fsync(fd):
+            synced.append(stat.S_ISDIR(os.fstat(fd).st_mode))
+            real_fsync(fd)
+        seq = NonceSequence(self.test_dir / "nonces.json", block_size=2)
+        with mock.patch("aegis_core.crypto.nonces.os.fsync", fsync):
+            seq.next(1)
+        seq.close()
+        # The state file, then the directory holding its new name
+        self.assertEqual(synced, [False, True])
+
+    def test_batch_encryption(self):
+        sec = AegisSecurity(key_path=str(self.key_path), use_keyring=False)
+        rows = [b"", b"alice,30", b"bob,25" * 50]
+
+        batch = sec.encrypt_batch(rows)
+        self.assertIsInstance(batch.buffer, bytearray)
+        self.assertEqual(len(batch), 3)
+        self.assertEqual(len(batch.buffer), sum(12 + len(r) + 16 for r in rows))
+        # Every record is a regular encrypt_data token
+        self.assertEqual(sec.decrypt_data(bytes(batch[1])), rows[1])
+
+        plain = sec.decrypt_batch(batch)
+        self.assertEqual([bytes(r) for r in plain], rows)
+
+        # Single buffer + offsets in, caller-provided buffer out
+        packed = RecordBatch.pack(rows)
+        out = bytearray(len(batch.buffer) + 10)
+        batch2 = sec.encrypt_batch(packed, out=out)
+        self.assertIs(batch2.buffer, out)
+        self.assertEqual([bytes(r) for r in sec.decrypt_batch(batch2)], rows)
+        with self.assertRaises(ValueError):
+            sec.encrypt_batch(rows, out=bytearray(10))
+
+    def test_batch_associated_data(self):
+        sec = AegisSecurity(key_path=str(self.key_path), use_keyring=False)
+        rows = [b"row-1", b"row-2"]
+        aads = [b"patient:1", b"patient:2"]
+
+        batch = sec.encrypt_batch(rows, associated_data=aads)
+        self.assertEqual([bytes(r) for r in sec.decrypt_batch(batch, associated_data=aads)], rows)
+        with self.assertRaises(Exception):
+            sec.decrypt_batch(batch, associated_data=list(reversed(aads)))
+        with self.assertRaises(ValueError):
+            sec.encrypt_batch(rows, associated_data=aads[:1])
+
+        # Records sealed before a rotation still open
+        sec.rotate_master_key()
+        self.assertEqual([bytes(r) for r in sec.decrypt_batch(batch, associated_data=aads)], rows)
+
     def test_file_encryption(self):
         sec = AegisSecurity(key_path=str(self.key_path), use_keyring=False)
         input_file = self.test_dir / "input.txt"
@@ -58,6 +223,236 @@ class TestAegisSecurity(unittest.TestCase):
         sec.decrypt_file(enc_file, output_file)
         self.assertEqual(output_file.read_bytes(), data)
 
+    def test_chunked_file_roundtrip(self):
+        sec = AegisSecurity(key_path=str(self.key_path), use_keyring=False)
+        input_file = self.test_dir / "input.bin"
+        enc_file = self.test_dir / "enc.bin"
+        output_file = self.test_dir / "output.bin"
+
+        for data in (b"", b"x" * 4096, os.urandom(10_000)):
+            input_file.write_bytes(data)
+            sec.encrypt_file(input_file, enc_file, chunk_size=4096)
+
+            enc = enc_file.read_bytes()
+            self.assertTrue(enc.startswith(STREAM_MAGIC))
+            chunks = max(1, -(-len(data) // 4096))
+            self.assertEqual(len(enc), STREAM_HEADER_SIZE + len(data) + chunks * TAG_SIZE)
+
+            sec.decrypt_file(enc_file, output_file)
+            self.assertEqual(output_file.read_bytes(), data)
+
+    def test_legacy_file_still_decrypts(self):
+        sec = AegisSecurity(key_path=str(self.key_path), use_keyring=False)
+        enc_file = self.test_dir / "legacy.enc"
+        output_file = self.test_dir / "output.txt"
+
+        data = b"Legacy single-shot payload"
+        enc_file.write_bytes(sec.encrypt_data(data))
+
+        sec.decrypt_file(enc_file, output_file)
+        self.assertEqual(output_file.read_bytes(), data)
+
+    def test_chunked_file_truncation_and_reorder(self):
+        sec = AegisSecurity(key_path=str(self.key_path), use_keyring=False)
+        input_file = self.test_dir / "input.bin"
+        enc_file = self.test_dir / "enc.bin"
+        output_file = self.test_dir / "output.bin"
+
+        input_file.write_bytes(os.urandom(3 * 1024))
+        sec.encrypt_file(input_file, enc_file, chunk_size=1024)
+        enc = enc_file.read_bytes()
+        header, body = enc[:STREAM_HEADER_SIZE], enc[STREAM_HEADER_SIZE:]
+        sealed = [body[i:i + 1024 + TAG_SIZE] for i in range(0, len(body), 1024 + TAG_SIZE)]
+
+        # Swap the first two chunks
+        enc_file.write_bytes(header + sealed[1] + sealed[0] + sealed[2])
+        with self.assertRaises(Exception):
+            sec.decrypt_file(enc_file, output_file)
+        self.assertFalse(output_file.exists())
+
+        # Drop the last chunk
+        enc_file.write_bytes(header + sealed[0] + sealed[1])
+        with self.assertRaises(Exception):
+            sec.decrypt_file(enc_file, output_file)
+
+    def test_rotation_reencrypts_files(self):
+        sec = AegisSecurity(key_path=str(self.key_path), use_keyring=False)
+        input_file = self.test_dir / "input.bin"
+        chunked_file = self.test_dir / "chunked.enc"
+        legacy_file = self.test_dir / "legacy.enc"
+        output_file = self.test_dir / "output.bin"
+
+        data = os.urandom(5000)
+        input_file.write_bytes(data)
+        sec.encrypt_file(input_file, chunked_file, chunk_size=1024)
+        legacy_file.write_bytes(sec.encrypt_data(data))
+
+        old_key = sec.key
+        sec.rotate_master_key(reencrypt_files=[chunked_file, legacy_file])
+        self.assertNotEqual(old_key, sec.key)
+
+        for path in (chunked_file, legacy_file):
+            sec.decrypt_file(path, output_file)
+            self.assertEqual(output_file.read_bytes(), data)
+
+    def test_rotation_rewraps_headers_only(self):
+        sec = AegisSecurity(key_path=str(self.key_path), use_keyring=False)
+        input_file = self.test_dir / "input.bin"
+        migrated_file = self.test_dir / "migrated.enc"
+        lazy_file = self.test_dir / "lazy.enc"
+        record = sec.encrypt_data(b"audit record")
+        output_file = self.test_dir / "output.bin"
+
+        data = os.urandom(5000)
+        input_file.write_bytes(data)
+        sec.encrypt_file(input_file, migrated_file, chunk_size=1024)
+        sec.encrypt_file(input_file, lazy_file, chunk_size=1024)
+        before = migrated_file.read_bytes()
+
+        counts = sec.rotate_master_key(reencrypt_files=[migrated_file], workers=2)
+        self.assertEqual(counts["rewrapped"], 1)
+        self.assertEqual(sec.key_id, 2)
+
+        # Only the key envelope changed; the sealed chunks are untouched
+        after = migrated_file.read_bytes()
+        self.assertEqual(len(after), len(before))
+        self.assertEqual(after[:33], before[:33])
+        self.assertNotEqual(after[33:STREAM_HEADER_SIZE], before[33:STREAM_HEADER_SIZE])
+        self.assertEqual(after[STREAM_HEADER_SIZE:], before[STREAM_HEADER_SIZE:])
+
+        # Old versions survive a reload, so un-migrated data still decrypts
+        reloaded = AegisSecurity(key_path=str(self.key_path), use_keyring=False)
+        self.assertEqual(reloaded.key, sec.key)
+        self.assertEqual(sorted(reloaded.keys), [1, 2])
+        for path in (migrated_file, lazy_file):
+            reloaded.decrypt_file(path, output_file)
+            self.assertEqual(output_file.read_bytes(), data)
+        self.assertEqual(reloaded.decrypt_data(record), b"audit record")
+
+        # Re-running picks up where an interrupted rotation left off
+        counts = reloaded.rewrap_files([migrated_file, lazy_file])
+        self.assertEqual(counts, {"rewrapped": 1, "migrated": 0, "skipped": 1, "failed": 0})
+
+    def test_legacy_key_file_loads_as_version_one(self):
+        key = AESGCM.generate_key(bit_length=256)
+        self.key_path.write_bytes(base64.urlsafe_b64encode(key))
+
+        sec = AegisSecurity(key_path=str(self.key_path), use_keyring=False)
+        self.assertEqual(sec.key, key)
+        self.assertEqual(sec.key_id, 1)
+
+    def test_mmap_and_memoryview_inputs(self):
+        sec = AegisSecurity(key_path=str(self.key_path), use_keyring=False)
+        input_file = self.test_dir / "input.bin"
+        enc_file = self.test_dir / "enc.bin"
+
+        data = os.urandom(10_000)
+        input_file.write_bytes(data)
+        with open(input_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with open(enc_file, "wb") as dst:
+                sec.encrypt_buffer(mapped, dst, chunk_size=1024)
+
+        with open(enc_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            out = io.BytesIO()
+            sec.decrypt_buffer(mapped, out)
+        self.assertEqual(out.getvalue(), data)
+
+        # In-memory streams work too, and record tokens can be memoryviews
+        out = io.BytesIO()
+        sec.encrypt_stream(io.BytesIO(data), out, len(data), chunk_size=4096)
+        plain = io.BytesIO()
+        sec.decrypt_buffer(memoryview(out.getvalue()), plain)
+        self.assertEqual(plain.getvalue(), data)
+        self.assertEqual(sec.decrypt_data(memoryview(sec.encrypt_data(data))), data)
+
+    def test_file_encryption_memory_is_one_chunk(self):
+        sec = AegisSecurity(key_path=str(self.key_path), use_keyring=False)
+        input_file = self.test_dir / "large.bin"
+        enc_file = self.test_dir / "large.enc"
+        output_file = self.test_dir / "large.out"
+        input_file.write_bytes(os.urandom(8 * 1024 * 1024))
+
+        tracemalloc.start()
+        try:
+            sec.encrypt_file(input_file, enc_file)
+            sec.decrypt_file(enc_file, output_file)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertLess(peak, 1024 * 1024)
+        self.assertEqual(output_file.read_bytes(), input_file.read_bytes())
+
+    def test_read_range(self):
+        sec = AegisSecurity(key_path=str(self.key_path), use_keyring=False)
+        input_file = self.test_dir / "input.bin"
+        enc_file = self.test_dir / "enc.bin"
+
+        data = os.urandom(10_000)
+        input_file.write_bytes(data)
+        sec.encrypt_file(input_file, enc_file, chunk_size=1024)
+
+        for offset, length in ((0, 10), (1000, 100), (1024, 1024), (9990, 100), (20_000, 5), (0, 10_000)):
+            self.assertEqual(sec.read_range(enc_file, offset, length), data[offset:offset + length])
+
+        # Corrupting one chunk only breaks reads that touch it
+        enc = bytearray(enc_file.read_bytes())
+        enc[STREAM_HEADER_SIZE + 5 * (1024 + TAG_SIZE)] ^= 0x01
+        enc_file.write_bytes(bytes(enc))
+        self.assertEqual(sec.read_range(enc_file, 0, 1024), data[:1024])
+        with self.assertRaises(Exception):
+            sec.read_range(enc_file, 5 * 1024, 10)
+
+    def test_encrypted_reader_is_seekable_stream(self):
+        sec = AegisSecurity(key_path=str(self.key_path), use_keyring=False)
+        input_file = self.test_dir / "rows.csv"
+        enc_file = self.test_dir / "rows.enc"
+        legacy_file = self.test_dir / "legacy.enc"
+
+        rows = "id,value\n" + "".join(f"{i},{i * i}\n" for i in range(500))
+        input_file.write_text(rows)
+        sec.encrypt_file(input_file, enc_file, chunk_size=256)
+        legacy_file.write_bytes(sec.encrypt_data(rows.encode()))
+
+        for path in (enc_file, legacy_file):
+            with sec.open_encrypted(path) as raw:
+                self.assertEqual(raw.size, len(rows))
+                raw.seek(-4, io.SEEK_END)
+                self.assertEqual(raw.read(), rows.encode()[-4:])
+                raw.seek(0)
+                reader = csv.DictReader(io.TextIOWrapper(io.BufferedReader(raw), encoding="utf-8"))
+                parsed = list(reader)
+            self.assertEqual(len(parsed), 500)
+            self.assertEqual(parsed[499], {"id": "499", "value": str(499 * 499)})
+
+    def test_encrypt_many(self):
+        sec = AegisSecurity(key_path=str(self.key_path), use_keyring=False)
+        src_dir = self.test_dir / "src"
+        out_dir = self.test_dir / "out"
+        src_dir.mkdir()
+
+        payloads = {"empty.txt": b"", "small.csv": b"a,b\n1,2\n", "large.bin": os.urandom(50_000)}
+        paths = []
+        for name, data in payloads.items():
+            (src_dir / name).write_bytes(data)
+            paths.append(src_dir / name)
+        paths.insert(1, src_dir / "missing.txt")
+
+        results = sec.encrypt_many(paths, out_dir, workers=4, chunk_size=1024)
+
+        self.assertEqual([r.source for r in results], paths)
+        failed = results[1]
+        self.assertFalse(failed.ok)
+        self.assertIn("FileNotFoundError", failed.error)
+        self.assertFalse(failed.output.exists())
+
+        for result in results[:1] + results[2:]:
+            self.assertTrue(result.ok, result.error)
+            self.assertEqual(result.output, out_dir / (result.source.name + ".enc"))
+            self.assertEqual(result.size, len(payloads[result.source.name]))
+            decrypted = self.test_dir / "decrypted.bin"
+            sec.decrypt_file(result.output, decrypted)
+            self.assertEqual(decrypted.read_bytes(), payloads[result.source.name])
+
     def test_tampered_data(self):
         sec = AegisSecurity(key_path=str(self.key_path), use_keyring=False)
         data = b"Vital Data"
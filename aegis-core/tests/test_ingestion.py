@@ -0,0 +1,595 @@
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+import unittest
+from importlib.metadata import EntryPoint
+import numpy as np
+from pathlib import Path
+from unittest import mock
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from aegis_core.compliance.engine import ComplianceEngine
+from aegis_core.compliance.filters import RowFilter
+from aegis_core.crypto.keys import key_provider
+from aegis_core.crypto.security import AegisSecurity
+from aegis_core.database.models import Base, ConsentPolicy, StoredDocument
+from aegis_core.ingestion import registry as registry_module
+from aegis_core.ingestion.columnar import build_column_batch
+from aegis_core.ingestion.handlers import (
+    BaseIngestor,
+    CSVIngestor,
+    IngestionManager,
+    PDFIngestor,
+    TextIngestor,
+    _extract_page_range,
+)
+from aegis_core.ingestion.registry import IngestorRegistry
+
+def _hanging_page_range(file_path, start, stop):
+    """Pool task for the PDF tests: hangs on "slow" files, and on the first task of any other file."""
+    marker = Path(f"{file_path}.tried")
+    if "slow" in file_path or not marker.exists():
+        marker.touch()
+        time.sleep(60)
+    return _extract_page_range(file_path, start, stop)
+
+class UpperIngestor(BaseIngestor):
+    suffixes = (".upper",)
+
+    def ingest(self, file_path):
+        return {"content": file_path.read_text().upper(), "metadata": {"type": "upper"}}
+
+def write_pdf(path: Path, pages: int):
+    """Writes a PDF whose page i contains the text "Page i"."""
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    }))
+    for i in range(pages):
+        page = writer.add_blank_page(612, 792)
+        stream = DecodedStreamObject()
+        stream.set_data(f"BT /F1 12 Tf 72 720 Td (Page {i}) Tj ET".encode())
+        page[NameObject("/Contents")] = writer._add_object(stream)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})
+        })
+    with open(path, "wb") as f:
+        writer.write(f)
+
+class TestIngestion(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path("test_ingestion_tmp")
+        self.test_dir.mkdir(exist_ok=True)
+        self.manager = IngestionManager()
+
+        self.csv_file = self.test_dir / "patients.csv"
+        lines = ["name,age,diagnosis"] + [f"p{i},{20 + i % 50},code{i % 7}" for i in range(2500)]
+        self.csv_file.write_text("\n".join(lines) + "\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+        key_provider.invalidate()
+
+    def test_csv_ingest_unchanged(self):
+        data = self.manager.ingest_file(self.csv_file)
+        self.assertEqual(data["metadata"], {"type": "csv", "row_count": 2500, "columns": ["name", "age", "diagnosis"]})
+        self.assertEqual(data["content"][0], {"name": "p0", "age": "20", "diagnosis": "code0"})
+
+    def test_csv_stream_batches(self):
+        stream = self.manager.stream_file(self.csv_file, batch_size=1000)
+        sizes = []
+        for batch in stream:
+            sizes.append(len(batch))
+            self.assertEqual(stream.metadata["row_count"], sum(sizes))
+            self.assertEqual(stream.metadata["columns"], ["name", "age", "diagnosis"])
+        self.assertEqual(sizes, [1000, 1000, 500])
+        self.assertEqual(stream.metadata["row_count"], 2500)
+
+    def test_stream_feeds_minimization_and_encryption(self):
+        policy = ConsentPolicy(data_minimization_rules=json.dumps({"allowed_columns": ["age", "diagnosis"]}))
+        engine = ComplianceEngine(None)
+        security = AegisSecurity(key_path=str(self.test_dir / "test.key"), use_keyring=False)
+
+        sealed = []
+        for batch in self.manager.stream_file(self.csv_file, batch_size=1000):
+            minimized = engine.enforce_minimization(batch, policy)
+            sealed.append(security.encrypt_batch([json.dumps(row).encode() for row in minimized]))
+
+        first = json.loads(bytes(security.decrypt_batch(sealed[0])[0]))
+        self.assertEqual(first, {"age": "20", "diagnosis": "code0"})
+        self.assertEqual(sum(len(b) for b in sealed), 2500)
+
+    def test_csv_columnar_batches(self):
+        stream = self.manager.stream_file(self.csv_file, batch_size=1000, columnar=True)
+        batches = list(stream)
+        self.assertEqual([len(b) for b in batches], [1000, 1000, 500])
+        self.assertEqual(stream.metadata["row_count"], 2500)
+        self.assertEqual(stream.metadata["dtypes"], {"name": "string", "age": "int64", "diagnosis": "string"})
+
+        first = batches[0]
+        self.assertEqual(first.columns["age"].dtype, np.int64)
+        self.assertEqual(first.columns["diagnosis"].dtype, np.int32)
+        self.assertEqual(len(first.dictionaries["diagnosis"]), 7)
+        self.assertEqual(first.column("diagnosis")[8], "code1")
+        self.assertEqual(first.to_rows()[0], {"name": "p0", "age": 20, "diagnosis": "code0"})
+
+        projected = first.select(["age"])
+        self.assertIs(projected.columns["age"], first.columns["age"])
+        matrix = projected.to_numpy()
+        self.assertEqual(matrix.shape, (1000, 1))
+        self.assertEqual(matrix.dtype, np.float32)
+
+    def test_columnar_types_and_ragged_rows(self):
+        csv_file = self.test_dir / "mixed.csv"
+        csv_file.write_text("id,score,label\n1,0.5,a\n2,,b\n\n3,1.5\n")
+        batch = next(iter(self.manager.stream_file(csv_file, columnar=True)))
+        self.assertEqual(batch.columns["id"].tolist(), [1, 2, 3])
+        self.assertTrue(np.isnan(batch.columns["score"][1]))
+        self.assertEqual(batch.column("label").tolist(), ["a", "b", ""])
+
+        pinned = next(iter(CSVIngestor().iter_column_batches(csv_file, {}, dtypes={"id": "float64"})))
+        self.assertEqual(pinned.columns["id"].dtype, np.float64)
+
+        # Integers wider than int64 stay exact, as strings
+        wide = build_column_batch(["id"], [["99999999999999999999"], ["1"]])
+        self.assertEqual(wide.dtype("id"), "string")
+        self.assertEqual(wide.column("id").tolist(), ["99999999999999999999", "1"])
+        self.assertEqual(build_column_batch(["id"], [["99999999999999999999"]], {"id": "float64"}).columns["id"].tolist(), [1e20])
+        with self.assertRaises(ValueError):
+            build_column_batch(["id"], [["99999999999999999999"]], {"id": "int64"})
+
+        with self.assertRaises(ValueError):
+            self.manager.stream_file(self.test_dir / "notes.txt", columnar=True)
+
+    def test_non_streaming_ingestor_yields_one_batch(self):
+        upper_file = self.test_dir / "notes.upper"
+        upper_file.write_text("hello")
+        self.manager.register(UpperIngestor())
+        stream = self.manager.stream_file(upper_file)
+        self.assertEqual(list(stream), ["HELLO"])
+        self.assertEqual(stream.metadata, {"type": "upper"})
+
+    def test_text_windows_split_utf8_safely(self):
+        text = "".join(f"zeile {i}: grüße €\n" for i in range(500)) + "no newline ✓"
+        raw = text.encode("utf-8")
+        text_file = self.test_dir / "log.txt"
+        text_file.write_bytes(raw)
+
+        metadata = {}
+        windows = list(TextIngestor(window_size=7).iter_batches(text_file, metadata))
+        self.assertEqual("".join(windows), text)
+        self.assertTrue(all(len(w.encode("utf-8")) <= 7 + 3 for w in windows))
+        self.assertEqual(metadata, {
+            "type": "text", "size": len(text), "bytes": len(raw), "line_count": 501,
+            "sha256": hashlib.sha256(raw).hexdigest(),
+        })
+        self.assertEqual(self.manager.ingest_file(text_file), {"content": text, "metadata": metadata})
+
+        text_file.write_bytes(raw[:-1])  # cut inside the final multi-byte character
+        with self.assertRaises(UnicodeDecodeError):
+            self.manager.ingest_file(text_file)
+
+    def test_text_encrypt_single_pass(self):
+        text_file = self.test_dir / "big.txt"
+        with open(text_file, "w", encoding="utf-8") as f:
+            for i in range(100_000):
+                f.write(f"{i} résumé line\n")
+        security = AegisSecurity(key_path=str(self.test_dir / "test.key"), use_keyring=False)
+        encrypted = self.test_dir / "big.txt.enc"
+
+        metadata = {}
+        tracemalloc.start()
+        TextIngestor().encrypt(text_file, encrypted, security, metadata)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.assertLess(peak, 1024 * 1024)
+        self.assertEqual(metadata["line_count"], 100_000)
+        self.assertEqual(metadata["sha256"], hashlib.sha256(text_file.read_bytes()).hexdigest())
+
+        restored = self.test_dir / "restored.txt"
+        security.decrypt_file(encrypted, restored)
+        self.assertEqual(restored.read_bytes(), text_file.read_bytes())
+
+    def test_registry_dispatch(self):
+        registry = IngestorRegistry()
+        registry.register(TextIngestor)
+        registry.register("tests.test_ingestion:UpperIngestor", suffixes=["upper", ".UP"])
+        self.assertIsInstance(registry.get(Path("a.TXT")), TextIngestor)
+        self.assertIsInstance(registry.get(Path("notes.text")), TextIngestor)  # via MIME type
+        self.assertEqual(registry.loaded(), [registry.get(Path("a.txt"))])
+        self.assertIs(registry.get(Path("b.up")), registry.get(Path("c.upper")))
+        self.assertIsNone(registry.get(Path("image.png")))
+
+        manager = IngestionManager(registry)
+        manager.register(UpperIngestor(), suffixes=[".txt"])
+        text_file = self.test_dir / "notes.txt"
+        text_file.write_text("hello")
+        self.assertEqual(manager.ingest_file(text_file)["content"], "HELLO")
+
+    def test_entry_point_ingestors_load_lazily(self):
+        ep = EntryPoint(name="upper", value="tests.test_ingestion:UpperIngestor", group="aegis_core.ingestors")
+        registry_module._entry_point_ingestors.cache_clear()
+        try:
+            with mock.patch.object(registry_module, "entry_points", return_value=[ep]) as found:
+                manager = IngestionManager()
+                IngestionManager()
+            found.assert_called_once_with(group="aegis_core.ingestors")
+        finally:
+            registry_module._entry_point_ingestors.cache_clear()
+        self.assertIn(".upper", manager.registry.suffixes)
+        self.assertIn(".parquet", manager.registry.suffixes)
+        self.assertEqual(len(manager.registry.loaded()), 0)
+
+        upper_file = self.test_dir / "a.upper"
+        upper_file.write_text("abc")
+        self.assertEqual(manager.ingest_file(upper_file)["content"], "ABC")
+
+    def test_text_ingestion_does_not_import_pdf_parser(self):
+        code = (
+            "import sys; from pathlib import Path; "
+            "from aegis_core.ingestion.handlers import IngestionManager; "
+            "from aegis_core.compliance.engine import ComplianceEngine; "
+            "IngestionManager().can_ingest(Path('a.txt')); print('pypdf' in sys.modules, 'numpy' in sys.modules)"
+        )
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(out.strip(), "False False")
+
+    def test_row_filter_parse_and_match(self):
+        row_filter = RowFilter.parse("age >= 18 and country == 'DE' or vip = true")
+        self.assertEqual(row_filter.clauses, [[("age", ">=", 18), ("country", "==", "DE")], [("vip", "==", True)]])
+        self.assertEqual(row_filter.columns, {"age", "country", "vip"})
+        self.assertTrue(row_filter.matches({"age": "20", "country": "DE"}))  # CSV text compares as a number
+        self.assertFalse(row_filter.matches({"age": 17, "country": "DE"}))
+        self.assertTrue(row_filter.matches({"vip": True}))
+        self.assertFalse(row_filter.matches({"country": "DE"}))
+        for invalid in ("age >", "age > 18 18", "age > 18 xor b < 2", "age > 18; drop"):
+            with self.assertRaises(ValueError):
+                RowFilter.parse(invalid)
+
+    def _policy(self, **rules):
+        return ConsentPolicy(data_minimization_rules=json.dumps(rules))
+
+    def test_csv_pushdown(self):
+        policy = self._policy(allowed_columns=["age", "diagnosis"], row_filter="age >= 68")
+        stream = self.manager.stream_file(self.csv_file, batch_size=100, policy=policy)
+        rows = [row for batch in stream for row in batch]
+        self.assertEqual(len(rows), 100)  # ages cycle 20..69
+        self.assertEqual(rows[0], {"age": "68", "diagnosis": "code6"})
+        self.assertEqual(stream.metadata["columns"], ["age", "diagnosis"])
+        self.assertEqual(stream.metadata["row_count"], 100)
+
+        stream = self.manager.stream_file(self.csv_file, columnar=True, policy=self._policy(row_filter="diagnosis == 'code0'", allowed_columns=["name"]))
+        batch = next(iter(stream))
+        self.assertEqual(batch.column_names, ["name"])
+        self.assertEqual(batch.column("name")[:2].tolist(), ["p0", "p7"])
+
+        with self.assertRaises(ValueError):
+            self.manager.stream_file(self.test_dir / "notes.txt", policy=policy)
+
+    def test_jsonl_pushdown(self):
+        jsonl_file = self.test_dir / "events.jsonl"
+        with open(jsonl_file, "w") as f:
+            for i in range(50):
+                f.write(json.dumps({"id": i, "email": f"u{i}@x.org", "score": i / 10, "tags": {"a": i}}) + "\n")
+            f.write("\n")
+        data = self.manager.ingest_file(jsonl_file)
+        self.assertEqual(data["metadata"], {"type": "jsonl", "row_count": 50, "columns": ["id", "email", "score", "tags"]})
+
+        stream = self.manager.stream_file(jsonl_file, batch_size=4, policy=self._policy(allowed_columns=["id", "tags"], row_filter="score > 4.5"))
+        batches = list(stream)
+        self.assertEqual([len(b) for b in batches], [4])  # scores 4.6 .. 4.9
+        rows = [row for batch in batches for row in batch]
+        self.assertEqual([row["id"] for row in rows], list(range(46, 50)))
+        self.assertEqual(rows[0], {"id": 46, "tags": {"a": 46}})
+        self.assertEqual(stream.metadata["columns"], ["id", "tags"])
+
+    def test_parquet_pushdown(self):
+        parquet_file = self.test_dir / "patients.parquet"
+        table = pa.table({
+            "name": [f"p{i}" for i in range(1000)],
+            "age": list(range(1000)),
+            "diagnosis": [None if i % 10 == 0 else f"code{i % 3}" for i in range(1000)],
+        })
+        pq.write_table(table, parquet_file, row_group_size=100)
+
+        data = self.manager.ingest_file(parquet_file)
+        self.assertEqual(data["metadata"]["row_count"], 1000)
+        self.assertEqual(data["content"][1], {"name": "p1", "age": 1, "diagnosis": "code1"})
+
+        policy = self._policy(allowed_columns=["diagnosis"], row_filter="age >= 950")
+        stream = self.manager.stream_file(parquet_file, batch_size=20, policy=policy)
+        rows = [row for batch in stream for row in batch]
+        self.assertEqual(len(rows), 50)
+        self.assertEqual(set(rows[0]), {"diagnosis"})
+        self.assertEqual(stream.metadata["source_rows"], 1000)
+
+        # Filter on a column the file does not have: nothing matches, as for row dicts
+        self.assertEqual(list(self.manager.stream_file(parquet_file, policy=self._policy(row_filter="ssn == 'x'"))), [])
+
+        stream = self.manager.stream_file(parquet_file, columnar=True, policy=self._policy(allowed_columns=["age", "diagnosis"], row_filter="age < 3"))
+        batch = next(iter(stream))
+        self.assertEqual(batch.column_names, ["age", "diagnosis"])
+        self.assertEqual(batch.columns["age"].tolist(), [0, 1, 2])
+        self.assertEqual(batch.column("diagnosis").tolist(), ["", "code1", "code2"])
+
+        # Numbers stored as text: not pushed down, filtered with the same coercion as CSV
+        text_file = self.test_dir / "text_ages.parquet"
+        pq.write_table(pa.table({"age": ["17", "18", "n/a", None, "30"]}), text_file)
+        policy = self._policy(row_filter="age >= 18")
+        rows = [row for batch in self.manager.stream_file(text_file, policy=policy) for row in batch]
+        self.assertEqual(rows, [{"age": "18"}, {"age": "30"}])
+        batches = list(self.manager.stream_file(text_file, columnar=True, policy=policy))
+        self.assertEqual(sum(batch.num_rows for batch in batches), 2)
+
+    def test_unknown_extension(self):
+        with self.assertRaises(ValueError):
+            self.manager.stream_file(self.test_dir / "image.png")
+
+    def test_pdf_parallel_pages_in_order(self):
+        pdf_file = self.test_dir / "report.pdf"
+        write_pdf(pdf_file, 40)
+        ingestor = PDFIngestor(workers=2, pages_per_task=4, parallel_threshold=8)
+        try:
+            data = ingestor.ingest(pdf_file)
+            self.assertEqual(data["content"].split("\n"), [f"Page {i}" for i in range(40)])
+            self.assertEqual(data["metadata"], {"type": "pdf", "page_count": 40})
+
+            metadata = {}
+            batches = list(ingestor.iter_batches(pdf_file, metadata, batch_size=16))
+            self.assertEqual([len(b) for b in batches], [16, 16, 8])
+            self.assertEqual(batches[2][-1], "Page 39")
+        finally:
+            ingestor.close()
+
+    def test_pdf_page_limit_and_failed_pages(self):
+        pdf_file = self.test_dir / "report.pdf"
+        write_pdf(pdf_file, 5)
+        data = PDFIngestor(workers=1, max_pages=3).ingest(pdf_file)
+        self.assertEqual(data["content"], "Page 0\nPage 1\nPage 2")
+        self.assertEqual(data["metadata"]["extracted_pages"], 3)
+
+        ingestor = PDFIngestor(workers=1)
+        calls = []
+        def flaky(page, *args, **kwargs):
+            calls.append(1)
+            if len(calls) == 2:
+                raise ValueError("broken content stream")
+            return "ok"
+        with mock.patch("pypdf.PageObject.extract_text", flaky):
+            data = ingestor.ingest(pdf_file)
+        self.assertEqual(data["content"], "ok\n\nok\nok\nok")
+        self.assertEqual(data["metadata"]["failed_pages"], [{"page": 1, "error": "ValueError: broken content stream"}])
+
+    def test_pdf_timeout_keeps_partial_result(self):
+        pdf_file = self.test_dir / "report.pdf"
+        write_pdf(pdf_file, 5)
+        data = PDFIngestor(workers=1, timeout=0).ingest(pdf_file)
+        self.assertTrue(data["metadata"]["timed_out"])
+        self.assertEqual(data["metadata"]["extracted_pages"], 0)
+
+    def test_pdf_timeout_kills_hung_workers(self):
+        pdf_file = self.test_dir / "report.pdf"
+        write_pdf(pdf_file, 16)
+        ingestor = PDFIngestor(workers=2, pages_per_task=4, parallel_threshold=8, timeout=0.5)
+        try:
+            # Workers fork from this process, so they inherit the hanging extract_text
+            with mock.patch("pypdf.PageObject.extract_text", lambda *args, **kwargs: time.sleep(60)):
+                data = ingestor.ingest(pdf_file)
+                hung = ingestor._pool
+            self.assertTrue(data["metadata"]["timed_out"])
+            self.assertIsNone(hung)
+            deadline = time.monotonic() + 5
+            while multiprocessing.active_children() and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.assertEqual(multiprocessing.active_children(), [])
+
+            ingestor.timeout = None
+            data = ingestor.ingest(pdf_file)
+            self.assertEqual(data["content"].split("\n"), [f"Page {i}" for i in range(16)])
+        finally:
+            ingestor.close()
+
+    def test_pdf_timeout_kill_reruns_other_documents_pages(self):
+        slow, fast = self.test_dir / "slow.pdf", self.test_dir / "fast.pdf"
+        write_pdf(slow, 8)
+        write_pdf(fast, 16)
+        ingestor = PDFIngestor(workers=2, pages_per_task=8, parallel_threshold=8, timeout=3)
+        results = {}
+        try:
+            with mock.patch("aegis_core.ingestion.handlers._extract_page_range", _hanging_page_range):
+                slow_thread = threading.Thread(target=lambda: results.update(slow=ingestor.ingest(slow)))
+                slow_thread.start()
+                # fast.pdf's ranges are running or queued in the shared pool when slow.pdf's timeout kills it
+                time.sleep(1.5)
+                results["fast"] = ingestor.ingest(fast)
+                slow_thread.join()
+            self.assertTrue(results["slow"]["metadata"]["timed_out"])
+            fast_metadata = results["fast"]["metadata"]
+            self.assertNotIn("failed_pages", fast_metadata)
+            self.assertNotIn("timed_out", fast_metadata)
+            self.assertEqual(results["fast"]["content"].split("\n"), [f"Page {i}" for i in range(16)])
+        finally:
+            ingestor.close()
+
+    async def _ingest_directory(self, root, out_dir, paths=None, **options):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{self.test_dir / 'ingest.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        security = AegisSecurity(key_path=str(self.test_dir / "test.key"), use_keyring=False)
+        try:
+            if paths is None:
+                counts = await self.manager.ingest_directory(
+                    root, security, out_dir, session_factory=session_factory, **options
+                )
+            else:
+                counts = await self.manager.ingest_many(paths, security, out_dir, session_factory=session_factory, **options)
+            async with session_factory() as session:
+                docs = (await session.execute(select(StoredDocument).order_by(StoredDocument.id))).scalars().all()
+        finally:
+            await engine.dispose()
+        return counts, docs, security
+
+    def test_reingest_skips_unchanged_and_dedups(self):
+        root = self.test_dir / "share"
+        root.mkdir()
+        (root / "a.txt").write_text("same content")
+        (root / "b.txt").write_text("same content")
+        (root / "c.txt").write_text("original")
+        out_dir = self.test_dir / "vault"
+
+        counts, docs, _ = asyncio.run(self._ingest_directory(root, out_dir, encrypt_workers=1, hash_algorithm="blake2b"))
+        self.assertEqual((counts["ingested"], counts["duplicate"]), (2, 1))
+        self.assertEqual(len(docs), 3)
+        linked = next(d for d in docs if d.file_path is None)
+        canonical = next(d for d in docs if d.file_hash == linked.file_hash and d.file_path is not None)
+        self.assertEqual(json.loads(linked.meta_info), {"duplicate_of": canonical.file_path})
+        self.assertEqual(canonical.file_hash, hashlib.blake2b(b"same content").hexdigest())
+        self.assertEqual(sorted(p.name for p in out_dir.iterdir()), sorted([Path(canonical.file_path).name, "c.txt.enc"]))
+
+        # Nothing changed: no file is read again
+        with mock.patch.object(AegisSecurity, "encrypt_stream") as encrypt:
+            counts, docs, _ = asyncio.run(self._ingest_directory(root, out_dir, hash_algorithm="blake2b"))
+        encrypt.assert_not_called()
+        self.assertEqual(counts["unchanged"], 3)
+
+        # Touched but identical content is re-hashed, not re-stored; modified content updates its row
+        os.utime(root / "a.txt", ns=(0, 0))
+        (root / "c.txt").write_text("modified!")
+        (root / "d.txt").write_text("original")
+        counts, docs, security = asyncio.run(self._ingest_directory(root, out_dir, hash_algorithm="blake2b"))
+        self.assertEqual((counts["unchanged"], counts["updated"], counts["ingested"]), (2, 1, 1))
+        self.assertEqual(len(docs), 4)
+        c_doc = next(d for d in docs if d.filename == "c.txt")
+        self.assertEqual(c_doc.file_hash, hashlib.blake2b(b"modified!").hexdigest())
+        restored = self.test_dir / "restored.txt"
+        security.decrypt_file(Path(c_doc.file_path), restored)
+        self.assertEqual(restored.read_text(), "modified!")
+        a_doc = next(d for d in docs if d.filename == "a.txt")
+        self.assertEqual(a_doc.source_mtime_ns, 0)
+
+        # Changing the stored copy of linked content hands the old copy to the link
+        (root / canonical.filename).write_text("rewritten")
+        counts, docs, security = asyncio.run(self._ingest_directory(root, out_dir, hash_algorithm="blake2b"))
+        self.assertEqual(counts["updated"], 1)
+        promoted = next(d for d in docs if d.id == linked.id)
+        security.decrypt_file(Path(promoted.file_path), restored)
+        self.assertEqual(restored.read_text(), "same content")
+
+    def test_duplicates_fail_with_their_canonical_file(self):
+        root = self.test_dir / "share"
+        root.mkdir()
+        # Extraction only hits the bad bytes at the end, after both copies are hashed
+        content = b"id,name\n" + b"".join(b"%d,patient\n" % i for i in range(20000)) + b"9,\xff\xfe\n"
+        (root / "a.csv").write_bytes(content)
+        (root / "b.csv").write_bytes(content)
+        out_dir = self.test_dir / "vault"
+
+        counts, docs, _ = asyncio.run(self._ingest_directory(root, out_dir, extract_workers=1))
+        self.assertEqual((counts["failed"], counts["duplicate"]), (2, 0))
+        self.assertEqual(docs, [])
+        self.assertEqual(list(out_dir.iterdir()), [])
+
+        # Nothing was recorded, so the next run reads both files again instead of calling them unchanged
+        (root / "a.csv").write_bytes(content[:-4] + b"\n")
+        (root / "b.csv").write_bytes(content[:-4] + b"\n")
+        counts, docs, _ = asyncio.run(self._ingest_directory(root, out_dir, extract_workers=1))
+        self.assertEqual((counts["ingested"], counts["duplicate"], counts["unchanged"]), (1, 1, 0))
+        linked = next(d for d in docs if d.file_path is None)
+        canonical = next(d for d in docs if d.file_path is not None)
+        self.assertTrue(Path(canonical.file_path).exists())
+        self.assertEqual(json.loads(linked.meta_info), {"duplicate_of": canonical.file_path})
+
+    def test_output_owned_by_another_row_is_kept(self):
+        (self.test_dir / "a").mkdir()
+        (self.test_dir / "b").mkdir()
+        (self.test_dir / "a" / "x.txt").write_text("from a")
+        (self.test_dir / "b" / "x.txt").write_text("from b")
+        out_dir = self.test_dir / "vault"
+
+        counts, _, _ = asyncio.run(self._ingest_directory(None, out_dir, paths=[self.test_dir / "a" / "x.txt"]))
+        self.assertEqual(counts["ingested"], 1)
+        # Same output name (no root given), different source
+        counts, docs, security = asyncio.run(self._ingest_directory(None, out_dir, paths=[self.test_dir / "b" / "x.txt"]))
+        self.assertEqual(counts["failed"], 1)
+        self.assertEqual(len(docs), 1)
+        restored = self.test_dir / "restored.txt"
+        security.decrypt_file(Path(docs[0].file_path), restored)
+        self.assertEqual(restored.read_text(), "from a")
+        self.assertEqual(sorted(p.name for p in out_dir.iterdir()), ["x.txt.enc"])
+
+    def test_database_errors_fail_their_batch(self):
+        root = self.test_dir / "share"
+        root.mkdir()
+        for i in range(5):
+            (root / f"note{i}.txt").write_text(f"note {i}")
+        out_dir = self.test_dir / "vault"
+
+        with mock.patch("aegis_core.ingestion.pipeline.IngestionPipeline._execute", side_effect=OSError("disk I/O error")):
+            counts, docs, _ = asyncio.run(asyncio.wait_for(
+                self._ingest_directory(root, out_dir, insert_batch=2, queue_size=1, extract_workers=1), 30
+            ))
+        self.assertEqual(counts["failed"], 5)
+        self.assertEqual(docs, [])
+        self.assertEqual(list(out_dir.iterdir()), [])
+
+        # A stage that dies cancels the others instead of leaving them blocked on its queue
+        def progress(result, counts):
+            raise RuntimeError("progress callback failed")
+        with self.assertRaisesRegex(RuntimeError, "progress callback failed"):
+            asyncio.run(asyncio.wait_for(
+                self._ingest_directory(root, out_dir, insert_batch=1, queue_size=1, progress=progress), 30
+            ))
+
+    def test_ingest_directory_pipeline(self):
+        root = self.test_dir / "archive"
+        (root / "2024" / "q1").mkdir(parents=True)
+        for i in range(30):
+            (root / "2024" / "q1" / f"note{i}.txt").write_text(f"note {i}")
+        shutil.copy(self.csv_file, root / "2024" / "patients.csv")
+        (root / "2024" / "broken.csv").write_bytes(b"\xff\xfe\x00bad")
+        (root / "scan.png").write_bytes(b"png")
+
+        progress = []
+        out_dir = self.test_dir / "vault"
+        counts, docs, security = asyncio.run(self._ingest_directory(
+            root, out_dir, extract_workers=2, encrypt_workers=2, queue_size=4, insert_batch=8,
+            tags="archive", progress=lambda result, counts: progress.append(result),
+        ))
+
+        self.assertEqual(counts["ingested"], 31)
+        self.assertEqual(counts["unsupported"], 1)
+        self.assertEqual(counts["failed"], 1)
+        self.assertEqual(len(progress), 33)
+        failed = [r for r in progress if not r.ok and r.error != "unsupported"]
+        self.assertEqual(failed[0].source.name, "broken.csv")
+        self.assertFalse((out_dir / "2024" / "broken.csv.enc").exists())
+
+        self.assertEqual(len(docs), 31)
+        doc = next(d for d in docs if d.filename == "patients.csv")
+        self.assertEqual(doc.file_path, str(out_dir / "2024" / "patients.csv.enc"))
+        self.assertEqual(doc.file_hash, hashlib.sha256(self.csv_file.read_bytes()).hexdigest())
+        self.assertEqual(doc.tags, "archive")
+        self.assertEqual(json.loads(doc.meta_info)["row_count"], 2500)
+
+        restored = self.test_dir / "restored.csv"
+        security.decrypt_file(Path(doc.file_path), restored)
+        self.assertEqual(restored.read_bytes(), self.csv_file.read_bytes())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,70 +1,69 @@
 import asyncio
-import json
 import os
-from sqlalchemy import select
-from aegis_core.database.connection import get_db, init_db
-from aegis_core.database.models import ConsentPolicy, AuditLog
+from datetime import datetime
+from sqlalchemy.engine import make_url
+from aegis_core.compliance.report import compliance_summary
+from aegis_core.database.connection import database, get_db
 
 async def generate_report():
     print("Generating Compliance Dashboard...")
-    if not os.path.exists("aegis.db"):
-        print("Error: aegis.db not found. Run tests or ingest data first.")
+    settings = database.settings
+    if settings.is_sqlite and not settings.is_sqlite_memory and not os.path.exists(make_url(settings.url).database):
+        print(f"Error: {make_url(settings.url).database} not found. Run tests or ingest data first.")
         return
 
     async with get_db() as db:
-        # 1. Policies Stats
-        res = await db.execute(select(ConsentPolicy))
-        policies = res.scalars().all()
+        summary = await compliance_summary(db)
+    await database.dispose()
 
-        active_policies = [p for p in policies if not p.revoked]
-        gdpr_policies = [p for p in policies if "GDPR" in p.regulation_mapping]
+    policies = summary["policies"]
+    allowed_count = summary["verdicts"].get("ALLOWED", 0)
+    denied_count = summary["verdicts"].get("DENIED", 0)
+    last_24h = summary["last_24h"]
+    denials = summary["recent_denials"]
 
-        print("\n--- CONSENT POLICY COVERAGE ---")
-        print(f"Total Policies: {len(policies)}")
-        print(f"Active Policies: {len(active_policies)}")
-        print(f"GDPR-Mapped Policies: {len(gdpr_policies)}")
+    # 1. Policies Stats
+    print("\n--- CONSENT POLICY COVERAGE ---")
+    print(f"Total Policies: {policies['total']}")
+    print(f"Active Policies: {policies['active']}")
+    print(f"GDPR-Mapped Policies: {policies['gdpr_mapped']}")
 
-        # 2. Audit Logs Stats
-        res = await db.execute(select(AuditLog))
-        logs = res.scalars().all()
+    # 2. Audit Logs Stats
+    print("\n--- AUDIT TRAIL SUMMARY ---")
+    print(f"Total Access Attempts: {summary['attempts']}")
+    print(f"Access Allowed: {allowed_count}")
+    print(f"Access Denied: {denied_count}")
+    print(f"Last 24h: {last_24h.get('ALLOWED', 0)} allowed, {last_24h.get('DENIED', 0)} denied")
 
-        allowed_count = len([l for l in logs if l.verdict == "ALLOWED"])
-        denied_count = len([l for l in logs if l.verdict == "DENIED"])
+    print("\n--- RECENT VIOLATIONS ---")
+    if not denials:
+        print("No recent violations found.")
+    for d in denials:
+        print(f"- [{d['timestamp']}] {d['actor_id']} attempted {d['action_type']} on {d['target_resource']}")
 
-        print("\n--- AUDIT TRAIL SUMMARY ---")
-        print(f"Total Access Attempts: {len(logs)}")
-        print(f"Access Allowed: {allowed_count}")
-        print(f"Access Denied: {denied_count}")
-
-        print("\n--- RECENT VIOLATIONS ---")
-        denials = [l for l in logs if l.verdict == "DENIED"][-5:]
-        if not denials:
-            print("No recent violations found.")
-        for d in denials:
-            print(f"- [{d.timestamp}] {d.actor_id} attempted {d.action_type} on {d.target_resource}")
-
-        # 3. Generate Markdown Report
-        report_content = f"""# Compliance Dashboard
-Generated on: {asyncio.get_event_loop().time()}
+    # 3. Generate Markdown Report
+    report_content = f"""# Compliance Dashboard
+Generated on: {datetime.utcnow().isoformat(timespec='seconds')} UTC
 
 ## Consent Policy Coverage
-- **Total Policies**: {len(policies)}
-- **Active Policies**: {len(active_policies)}
-- **GDPR-Mapped Policies**: {len(gdpr_policies)}
+- **Total Policies**: {policies['total']}
+- **Active Policies**: {policies['active']}
+- **GDPR-Mapped Policies**: {policies['gdpr_mapped']}
 
 ## Audit Trail Summary
-- **Total Access Attempts**: {len(logs)}
+- **Total Access Attempts**: {summary['attempts']}
 - **Access Allowed**: {allowed_count}
 - **Access Denied**: {denied_count}
+- **Last 24 Hours**: {last_24h.get('ALLOWED', 0)} allowed, {last_24h.get('DENIED', 0)} denied
 
 ## Recent Violations
 """
-        for d in denials:
-            report_content += f"- [{d.timestamp}] {d.actor_id} attempted {d.action_type} on {d.target_resource}\n"
+    for d in denials:
+        report_content += f"- [{d['timestamp']}] {d['actor_id']} attempted {d['action_type']} on {d['target_resource']}\n"
 
-        with open("COMPLIANCE_DASHBOARD.md", "w") as f:
-            f.write(report_content)
-        print("\nReport saved to COMPLIANCE_DASHBOARD.md")
+    with open("COMPLIANCE_DASHBOARD.md", "w") as f:
+        f.write(report_content)
+    print("\nReport saved to COMPLIANCE_DASHBOARD.md")
 
 if __name__ == "__main__":
     asyncio.run(generate_report())
@@ -0,0 +1,21 @@
+import argparse
+import asyncio
+from aegis_core.compliance.archive import DEFAULT_HOT_DAYS, AuditArchive
+from aegis_core.database.connection import database
+
+async def seal(args):
+    archive = AuditArchive(args.archive_dir, hot_days=args.hot_days, retention_days=args.retention_days)
+    entries = await archive.seal(database.session_factory)
+    await database.dispose()
+
+    sealed = [e for e in entries if e["type"] == "seal"]
+    expired = [e for e in entries if e["type"] == "expire"]
+    print(f"Sealed {sum(e['rows'] for e in sealed)} records into {len(sealed)} segments, expired {len(expired)} segments.")
+    print(f"Archive chain verified ({archive.verify()} entries).")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seal audit records older than the hot window into hash-chained segments.")
+    parser.add_argument("--archive-dir", default="audit_archive")
+    parser.add_argument("--hot-days", type=int, default=DEFAULT_HOT_DAYS)
+    parser.add_argument("--retention-days", type=int, default=None, help="Drop sealed segments older than this (default: keep)")
+    asyncio.run(seal(parser.parse_args()))